@@ -1,8 +1,11 @@
-import os
-from openai import AsyncOpenAI, AsyncAzureOpenAI
+import time
+from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam
+from agents.clients import get_azure_openai_client, llm_rate_limiter
+from executor.config import DeltaCallback
 from executor.tools import AgentTools
 from utils.logger import get_logger
+from utils.metrics import metrics
 from dotenv import load_dotenv
 from typing import override
 
@@ -13,13 +16,11 @@ logger = get_logger("[Azure AI Agent]")
 
 class AzureAIAgentTools(AgentTools):
     az_ai_client: AsyncOpenAI
+    # Deployment the requests are sent to, also part of the LLM cache keys
+    model_name = "gpt-4o"
 
     def __init__(self) -> None:
-        self.az_ai_client = AsyncAzureOpenAI(
-            api_key=os.environ.get("AZURE_OPENAI_API_KEY"),
-            azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT", ""),
-            api_version=os.environ.get("AZURE_OPENAI_API_VERSION"),
-        )
+        self.az_ai_client = get_azure_openai_client()
 
     @override
     async def invoke_llm[
@@ -31,12 +32,76 @@ class AzureAIAgentTools(AgentTools):
         temperature=0.0,
     ) -> T:
 
-        response = await self.az_ai_client.beta.chat.completions.parse(
-            model="gpt-4o",
-            messages=messages,
-            response_format=response_type,
-            temperature=temperature,
-        )
+        async with llm_rate_limiter.limit():
+            start = time.perf_counter()
+            try:
+                response = await self.az_ai_client.beta.chat.completions.parse(
+                    model=self.model_name,
+                    messages=messages,
+                    response_format=response_type,
+                    temperature=temperature,
+                )
+            except Exception:
+                metrics.increment("llm.errors")
+                raise
+            finally:
+                metrics.observe("llm.request_seconds", time.perf_counter() - start)
+        parsed_content = response.choices[0].message.parsed
+
+        logger.info(f"Generated Response: {response.choices[0].message.content}")
+
+        if parsed_content:
+            return parsed_content
+
+        raise Exception("LLM response is empty")
+
+    @override
+    async def invoke_llm_stream[
+        T
+    ](
+        self,
+        response_type: type[T],
+        messages: list[ChatCompletionMessageParam],
+        field: str,
+        on_delta: DeltaCallback,
+        temperature=0.0,
+    ) -> T:
+        # Structured output is parsed incrementally, so each delta event carries a
+        # partial snapshot of the response object
+        streamed = ""
+
+        async with llm_rate_limiter.limit():
+            start = time.perf_counter()
+            try:
+                async with self.az_ai_client.beta.chat.completions.stream(
+                    model=self.model_name,
+                    messages=messages,
+                    response_format=response_type,
+                    temperature=temperature,
+                ) as stream:
+                    async for event in stream:
+                        if event.type != "content.delta" or not isinstance(
+                            event.parsed, dict
+                        ):
+                            continue
+
+                        value = event.parsed.get(field)
+                        if not isinstance(value, str) or len(value) <= len(streamed):
+                            continue
+
+                        if not streamed:
+                            metrics.observe(
+                                "llm.first_token_seconds", time.perf_counter() - start
+                            )
+                        await on_delta(value[len(streamed) :])
+                        streamed = value
+
+                    response = await stream.get_final_completion()
+            except Exception:
+                metrics.increment("llm.errors")
+                raise
+            finally:
+                metrics.observe("llm.request_seconds", time.perf_counter() - start)
         parsed_content = response.choices[0].message.parsed
 
         logger.info(f"Generated Response: {response.choices[0].message.content}")
@@ -0,0 +1,121 @@
+import asyncio
+from typing import Any, Optional, cast, override
+
+from openai.types.chat import ChatCompletionMessageParam
+from pydantic import BaseModel
+
+from executor.config import DeltaCallback
+from executor.tools import AgentTools
+from utils.llm_cache import LLMCacheBackend, get_llm_cache_backend, get_llm_cache_key
+from utils.logger import get_logger
+
+logger = get_logger("[LLM CACHE]")
+
+
+class CachingAgentTools(AgentTools):
+    """
+    Serves deterministic (temperature 0) LLM calls of the wrapped tools from a content
+    addressed cache. Calls with a non-zero temperature always reach the LLM. The
+    cache is read and written from a thread, so the event loop never waits on it.
+    """
+
+    tools: AgentTools
+    cache: LLMCacheBackend
+
+    def __init__(self, tools: AgentTools, cache: LLMCacheBackend) -> None:
+        self.tools = tools
+        self.cache = cache
+        self.model_name = tools.model_name
+
+    @classmethod
+    def wrap(
+        cls, tools: AgentTools, cache: Optional[LLMCacheBackend] = None
+    ) -> AgentTools:
+        """
+        Wrap the tools with the configured cache backend, if caching is enabled
+        """
+        cache = cache or get_llm_cache_backend()
+        if not cache:
+            return tools
+        return cls(tools, cache)
+
+    def get_key(
+        self,
+        response_type: type[BaseModel],
+        messages: list[ChatCompletionMessageParam],
+        temperature: float,
+    ) -> str:
+        return get_llm_cache_key(
+            self.model_name,
+            response_type.model_json_schema(),
+            cast(list[Any], messages),
+            temperature,
+        )
+
+    def get_cached_response[
+        T
+    ](self, response_type: type[T], key: str) -> Optional[T]:
+        model_type = cast(type[BaseModel], response_type)
+        try:
+            cached = self.cache.get(key)
+            if cached:
+                logger.info(f"Cache hit for {model_type.__name__}")
+                return cast(T, model_type.model_validate_json(cached))
+        except Exception as e:
+            logger.error(f"Error while reading from the llm cache: {e}")
+        return None
+
+    def save_response(self, key: str, response: Any) -> None:
+        try:
+            self.cache.set(key, cast(BaseModel, response).model_dump_json())
+        except Exception as e:
+            logger.error(f"Error while saving to the llm cache: {e}")
+
+    @override
+    async def invoke_llm[
+        T
+    ](
+        self,
+        response_type: type[T],
+        messages: list[ChatCompletionMessageParam],
+        temperature=0.0,
+    ) -> T:
+        if temperature != 0:
+            return await self.tools.invoke_llm(response_type, messages, temperature)
+
+        key = self.get_key(cast(type[BaseModel], response_type), messages, temperature)
+        cached = await asyncio.to_thread(self.get_cached_response, response_type, key)
+        if cached is not None:
+            return cached
+
+        response = await self.tools.invoke_llm(response_type, messages, temperature)
+        await asyncio.to_thread(self.save_response, key, response)
+        return response
+
+    @override
+    async def invoke_llm_stream[
+        T
+    ](
+        self,
+        response_type: type[T],
+        messages: list[ChatCompletionMessageParam],
+        field: str,
+        on_delta: DeltaCallback,
+        temperature=0.0,
+    ) -> T:
+        if temperature != 0:
+            return await self.tools.invoke_llm_stream(
+                response_type, messages, field, on_delta, temperature
+            )
+
+        key = self.get_key(cast(type[BaseModel], response_type), messages, temperature)
+        cached = await asyncio.to_thread(self.get_cached_response, response_type, key)
+        if cached is not None:
+            await on_delta(getattr(cached, field))
+            return cached
+
+        response = await self.tools.invoke_llm_stream(
+            response_type, messages, field, on_delta, temperature
+        )
+        await asyncio.to_thread(self.save_response, key, response)
+        return response
@@ -0,0 +1,65 @@
+import functools
+import os
+from os import environ
+from typing import Any, cast
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncAzureOpenAI
+
+from utils.rate_limit import RateLimiter
+
+load_dotenv()
+
+LLM_HTTP_MAX_CONNECTIONS = int(environ.get("LLM_HTTP_MAX_CONNECTIONS", 100))
+LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    environ.get("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+)
+LLM_HTTP_KEEPALIVE_EXPIRY = float(environ.get("LLM_HTTP_KEEPALIVE_EXPIRY", 30))
+LLM_HTTP_TIMEOUT = float(environ.get("LLM_HTTP_TIMEOUT", 60))
+LLM_HTTP2 = environ.get("LLM_HTTP2", "true").lower() == "true"
+
+# Limits across all requests of the process
+LLM_MAX_CONCURRENCY = int(environ.get("LLM_MAX_CONCURRENCY", 32))
+# Requests per second, 0 disables rate limiting
+LLM_RATE_LIMIT = float(environ.get("LLM_RATE_LIMIT", 0))
+LLM_RATE_LIMIT_BURST = float(environ.get("LLM_RATE_LIMIT_BURST", 0))
+
+
+@functools.cache
+def get_azure_openai_client() -> AsyncAzureOpenAI:
+    """
+    Process wide Azure OpenAI client, so that requests share the connection pool
+    instead of paying for a new TLS connection each time
+    """
+    http_client = httpx.AsyncClient(
+        http2=LLM_HTTP2,
+        timeout=LLM_HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+    return AsyncAzureOpenAI(
+        api_key=os.environ.get("AZURE_OPENAI_API_KEY"),
+        azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT", ""),
+        api_version=os.environ.get("AZURE_OPENAI_API_VERSION"),
+        # Recent openai versions annotate their own httpx fork, but still accept
+        # an httpx client
+        http_client=cast(Any, http_client),
+    )
+
+
+llm_rate_limiter = RateLimiter(
+    "llm",
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    rate=LLM_RATE_LIMIT,
+    burst=LLM_RATE_LIMIT_BURST or None,
+)
+
+
+async def close_clients() -> None:
+    if get_azure_openai_client.cache_info().currsize:
+        await get_azure_openai_client().close()
+        get_azure_openai_client.cache_clear()
@@ -0,0 +1,34 @@
+from os import environ
+
+from agents.cached import CachingAgentTools
+from executor.tools import AgentTools
+
+# Possible values: azure, replay, record
+AGENT_TOOLS_BACKEND = environ.get("AGENT_TOOLS_BACKEND", "azure")
+
+
+def get_agent_tools() -> AgentTools:
+    """
+    Returns the AgentTools implementation configured through AGENT_TOOLS_BACKEND,
+    wrapped with the LLM response cache if it is enabled. The recorder is never
+    wrapped, a cached response would not reach it and be missing from the fixtures.
+    """
+    tools: AgentTools
+    match AGENT_TOOLS_BACKEND:
+        case "azure":
+            from agents.azure_openai import AzureAIAgentTools
+
+            tools = AzureAIAgentTools()
+        case "replay":
+            from agents.replay import ReplayAgentTools
+
+            tools = ReplayAgentTools()
+        case "record":
+            from agents.azure_openai import AzureAIAgentTools
+            from agents.replay import RecordingAgentTools
+
+            return RecordingAgentTools(AzureAIAgentTools())
+        case _:
+            raise ValueError(f"Invalid agent tools backend: {AGENT_TOOLS_BACKEND}")
+
+    return CachingAgentTools.wrap(tools)
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+from dataclasses import dataclass
+from os import environ
+from typing import Any, Literal, Optional, cast, override
+
+from openai.types.chat import ChatCompletionMessageParam
+from pydantic import BaseModel
+
+from agents.clients import llm_rate_limiter
+from executor.config import DeltaCallback
+from executor.tools import AgentTools
+from utils.logger import get_logger
+
+logger = get_logger("[REPLAY AGENT]")
+
+REPLAY_FIXTURES_PATH = environ.get(
+    "REPLAY_FIXTURES_PATH", "agents/fixtures/example.replay.json"
+)
+# One of "fixed:<seconds>", "uniform:<min>,<max>" or "lognormal:<mu>,<sigma>"
+REPLAY_LATENCY = environ.get("REPLAY_LATENCY", "fixed:0")
+REPLAY_FAILURE_RATE = float(environ.get("REPLAY_FAILURE_RATE", 0))
+REPLAY_SEED = environ.get("REPLAY_SEED")
+
+# Key of the response served for any prompt of a tool without a recorded response
+WILDCARD_PROMPT = "*"
+
+
+class LLMInjectedFailure(Exception):
+    """
+    Simulated failure of an LLM call
+    """
+
+
+class FixtureNotFoundError(Exception):
+    """
+    No recorded response exists for an LLM call
+    """
+
+
+@dataclass
+class LatencyDistribution:
+    """
+    Distribution of the simulated latency of an LLM call, in seconds
+    """
+
+    kind: Literal["fixed", "uniform", "lognormal"]
+    params: tuple[float, ...]
+
+    @staticmethod
+    def parse(spec: str) -> "LatencyDistribution":
+        kind, _, params = spec.partition(":")
+        values = tuple(float(param) for param in params.split(",") if param)
+
+        match kind, len(values):
+            case "fixed", 1:
+                return LatencyDistribution("fixed", values)
+            case "uniform", 2:
+                return LatencyDistribution("uniform", values)
+            case "lognormal", 2:
+                return LatencyDistribution("lognormal", values)
+            case _:
+                raise ValueError(f"Invalid latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        match self.kind:
+            case "fixed":
+                return self.params[0]
+            case "uniform":
+                return rng.uniform(*self.params)
+            case "lognormal":
+                return rng.lognormvariate(*self.params)
+
+
+def get_prompt_hash(messages: list[ChatCompletionMessageParam]) -> str:
+    content = json.dumps(messages, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+def get_fixture_key(response_type: type, prompt_hash: str) -> str:
+    """
+    Fixtures are keyed by the response type of the tool along with the prompt hash
+    """
+    return f"{response_type.__name__}:{prompt_hash}"
+
+
+def load_fixtures(path: str) -> dict[str, dict[str, Any]]:
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class ReplayAgentTools(AgentTools):
+    """
+    Serves recorded LLM responses from a fixture file, so the agentic loop can be
+    run and benchmarked without a live LLM endpoint. Latency and failures are
+    simulated with a seeded random generator to keep runs reproducible.
+    """
+
+    fixtures: dict[str, dict[str, Any]]
+    latency: LatencyDistribution
+    failure_rate: float
+
+    def __init__(
+        self,
+        fixtures: Optional[dict[str, dict[str, Any]]] = None,
+        latency: Optional[LatencyDistribution] = None,
+        failure_rate: float = REPLAY_FAILURE_RATE,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.model_name = "replay"
+        self.fixtures = (
+            fixtures if fixtures is not None else load_fixtures(REPLAY_FIXTURES_PATH)
+        )
+        self.latency = latency or LatencyDistribution.parse(REPLAY_LATENCY)
+        self.failure_rate = failure_rate
+        if seed is None and REPLAY_SEED:
+            seed = int(REPLAY_SEED)
+        self.rng = random.Random(seed)
+
+    def get_fixture(
+        self, response_type: type, messages: list[ChatCompletionMessageParam]
+    ) -> dict[str, Any]:
+        key = get_fixture_key(response_type, get_prompt_hash(messages))
+        fixture = self.fixtures.get(key)
+        if fixture is None:
+            fixture = self.fixtures.get(get_fixture_key(response_type, WILDCARD_PROMPT))
+        if fixture is None:
+            raise FixtureNotFoundError(f"No recorded response for {key}")
+        return fixture
+
+    @override
+    async def invoke_llm[
+        T
+    ](
+        self,
+        response_type: type[T],
+        messages: list[ChatCompletionMessageParam],
+        temperature=0.0,
+    ) -> T:
+        fixture = self.get_fixture(response_type, messages)
+
+        # Go through the same limiter as live calls, so load tests include throttling
+        async with llm_rate_limiter.limit():
+            await asyncio.sleep(self.latency.sample(self.rng))
+
+            if self.rng.random() < self.failure_rate:
+                raise LLMInjectedFailure(
+                    f"Injected failure for {response_type.__name__} call"
+                )
+
+        return cast(T, cast(type[BaseModel], response_type).model_validate(fixture))
+
+
+class RecordingAgentTools(AgentTools):
+    """
+    Records the responses of the wrapped tools into a fixture file that can be
+    replayed with ReplayAgentTools
+    """
+
+    tools: AgentTools
+    path: str
+
+    def __init__(self, tools: AgentTools, path: str = REPLAY_FIXTURES_PATH) -> None:
+        self.tools = tools
+        self.path = path
+        self.model_name = tools.model_name
+        self.fixtures = load_fixtures(path)
+
+    @override
+    async def invoke_llm[
+        T
+    ](
+        self,
+        response_type: type[T],
+        messages: list[ChatCompletionMessageParam],
+        temperature=0.0,
+    ) -> T:
+        response = await self.tools.invoke_llm(response_type, messages, temperature)
+        self.record(response_type, messages, response)
+        return response
+
+    @override
+    async def invoke_llm_stream[
+        T
+    ](
+        self,
+        response_type: type[T],
+        messages: list[ChatCompletionMessageParam],
+        field: str,
+        on_delta: DeltaCallback,
+        temperature=0.0,
+    ) -> T:
+        response = await self.tools.invoke_llm_stream(
+            response_type, messages, field, on_delta, temperature
+        )
+        self.record(response_type, messages, response)
+        return response
+
+    def record(
+        self,
+        response_type: type,
+        messages: list[ChatCompletionMessageParam],
+        response: Any,
+    ) -> None:
+        key = get_fixture_key(response_type, get_prompt_hash(messages))
+        self.fixtures[key] = cast(BaseModel, response).model_dump(mode="json")
+        self.save()
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.fixtures, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+        logger.debug(f"Saved {len(self.fixtures)} recorded responses to {self.path}")
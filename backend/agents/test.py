@@ -0,0 +1,205 @@
+import os
+import random
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from executor.models import NLQIntent, QueryType, RelevantTables
+from executor.tools import AgentTools
+from utils.llm_cache import DiskLLMCacheBackend, get_llm_cache_key
+from .cached import CachingAgentTools
+from .replay import (
+    FixtureNotFoundError,
+    LatencyDistribution,
+    LLMInjectedFailure,
+    ReplayAgentTools,
+    get_prompt_hash,
+)
+
+MESSAGES: list[ChatCompletionMessageParam] = [
+    {"role": "user", "content": "How many workers?"}
+]
+
+
+class CountingAgentTools(AgentTools):
+    model_name = "test-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def invoke_llm(self, response_type, messages, temperature=0.0):
+        self.calls += 1
+        return QueryType(query_type="REPORT_GENERATION")
+
+
+class StreamingAgentTools(AgentTools):
+    model_name = "test-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def invoke_llm(self, response_type, messages, temperature=0.0):
+        self.calls += 1
+        return NLQIntent(intent="Count the workers")
+
+    async def invoke_llm_stream(
+        self, response_type, messages, field, on_delta, temperature=0.0
+    ):
+        self.calls += 1
+        await on_delta("Count ")
+        await on_delta("the workers")
+        return NLQIntent(intent="Count the workers")
+
+
+class DeltaCollector:
+    def __init__(self):
+        self.deltas = []
+
+    async def __call__(self, delta):
+        self.deltas.append(delta)
+
+
+class TestLLMCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = DiskLLMCacheBackend(self.tmp_dir.name, ttl=60, max_entries=2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cache_key_depends_on_call(self):
+        messages = [{"role": "user", "content": "Hi"}]
+        schema = {"properties": {"query_type": {"type": "string"}}}
+
+        key = get_llm_cache_key("gpt-4o", schema, messages, 0.0)
+        self.assertEqual(key, get_llm_cache_key("gpt-4o", schema, messages, 0.0))
+        self.assertNotEqual(key, get_llm_cache_key("gpt-4", schema, messages, 0.0))
+        self.assertNotEqual(key, get_llm_cache_key("gpt-4o", {}, messages, 0.0))
+        self.assertNotEqual(key, get_llm_cache_key("gpt-4o", schema, [], 0.0))
+
+    def test_disk_cache_expires_entries(self):
+        self.cache.set("a", "value")
+        self.assertEqual(self.cache.get("a"), "value")
+
+        stale = time.time() - 120
+        os.utime(os.path.join(self.tmp_dir.name, "a.json"), (stale, stale))
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.num_entries, 0)
+
+    def test_disk_cache_evicts_oldest_entries(self):
+        for i, key in enumerate(["a", "b", "c"]):
+            self.cache.set(key, key)
+            mtime = time.time() - 10 + i
+            os.utime(os.path.join(self.tmp_dir.name, f"{key}.json"), (mtime, mtime))
+        self.cache.evict()
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("c"), "c")
+
+    def test_disk_cache_scans_only_beyond_limit(self):
+        cache = DiskLLMCacheBackend(self.tmp_dir.name, ttl=60, max_entries=10)
+        with patch.object(cache, "evict", wraps=cache.evict) as evict:
+            for i in range(10):
+                cache.set(str(i), "value")
+            # Overwriting an entry doesn't add one
+            cache.set("0", "value")
+            evict.assert_not_called()
+
+            cache.set("10", "value")
+            evict.assert_called_once()
+
+        self.assertEqual(cache.num_entries, 9)
+        self.assertEqual(len(os.listdir(self.tmp_dir.name)), 9)
+
+
+
+class TestCachingAgentTools(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = DiskLLMCacheBackend(self.tmp_dir.name, ttl=60, max_entries=10)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def test_deterministic_calls_are_cached(self):
+        tools = CountingAgentTools()
+        cached_tools = CachingAgentTools(tools, self.cache)
+
+        first = await cached_tools.invoke_llm(QueryType, MESSAGES)  # type: ignore
+        second = await cached_tools.invoke_llm(QueryType, MESSAGES)  # type: ignore
+        self.assertEqual(first, second)
+        self.assertEqual(tools.calls, 1)
+
+    async def test_non_zero_temperature_bypasses_cache(self):
+        tools = CountingAgentTools()
+        cached_tools = CachingAgentTools(tools, self.cache)
+
+        await cached_tools.invoke_llm(QueryType, MESSAGES, temperature=0.5)  # type: ignore
+        await cached_tools.invoke_llm(QueryType, MESSAGES, temperature=0.5)  # type: ignore
+        self.assertEqual(tools.calls, 2)
+
+    async def test_streamed_calls_are_cached(self):
+        tools = StreamingAgentTools()
+        cached_tools = CachingAgentTools(tools, self.cache)
+
+        deltas = DeltaCollector()
+        intent = await cached_tools.analaze_nlq_intent("How many workers?", [], deltas)
+        self.assertEqual(intent, "Count the workers")
+        self.assertEqual(deltas.deltas, ["Count ", "the workers"])
+
+        deltas = DeltaCollector()
+        await cached_tools.analaze_nlq_intent("How many workers?", [], deltas)
+        self.assertEqual(deltas.deltas, ["Count the workers"])
+        self.assertEqual(tools.calls, 1)
+
+    async def test_default_streaming_emits_complete_value(self):
+        deltas = DeltaCollector()
+        response = await CountingAgentTools().invoke_llm_stream(
+            QueryType, MESSAGES, "query_type", deltas  # type: ignore
+        )
+        self.assertEqual(deltas.deltas, [response.query_type])
+
+
+class TestReplayAgentTools(unittest.IsolatedAsyncioTestCase):
+
+    def make_tools(self, **kwargs) -> ReplayAgentTools:
+        fixtures = {
+            f"RelevantTables:{get_prompt_hash(MESSAGES)}": {"tables": ["worker"]},
+            "RelevantTables:*": {"tables": ["project"]},
+        }
+        return ReplayAgentTools(
+            fixtures, LatencyDistribution.parse("fixed:0"), seed=1, **kwargs
+        )
+
+    async def test_recorded_prompt_is_replayed(self):
+        tools = self.make_tools()
+        response = await tools.invoke_llm(RelevantTables, MESSAGES)  # type: ignore
+        self.assertEqual(response.tables, ["worker"])
+
+    async def test_wildcard_fixture_is_used_for_unknown_prompts(self):
+        tools = self.make_tools()
+        response = await tools.invoke_llm(RelevantTables, [])
+        self.assertEqual(response.tables, ["project"])
+
+        with self.assertRaises(FixtureNotFoundError):
+            await tools.invoke_llm(QueryType, MESSAGES)  # type: ignore
+
+    async def test_failure_injection(self):
+        tools = self.make_tools(failure_rate=1.0)
+        with self.assertRaises(LLMInjectedFailure):
+            await tools.invoke_llm(RelevantTables, MESSAGES)  # type: ignore
+
+    def test_latency_distributions_are_deterministic(self):
+        distribution = LatencyDistribution.parse("lognormal:-1,0.5")
+        first = [distribution.sample(random.Random(7)) for _ in range(3)]
+        second = [distribution.sample(random.Random(7)) for _ in range(3)]
+        self.assertEqual(first, second)
+
+        self.assertEqual(LatencyDistribution.parse("fixed:0.2").sample(random.Random()), 0.2)
+        with self.assertRaises(ValueError):
+            LatencyDistribution.parse("uniform:1")
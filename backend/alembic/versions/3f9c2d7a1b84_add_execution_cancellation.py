@@ -0,0 +1,37 @@
+"""Add execution cancellation
+
+Revision ID: 3f9c2d7a1b84
+Revises: 64ad6e0d4f51
+Create Date: 2026-10-19 09:05:12.417302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2d7a1b84'
+down_revision: Union[str, None] = '64ad6e0d4f51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('execution_logs', sa.Column('task_id', sa.String(), nullable=True))
+    op.add_column('execution_logs', sa.Column('backend_pid', sa.Integer(), nullable=True))
+    op.alter_column('execution_logs', 'status',
+               existing_type=sa.Enum('SUCCESS', 'FAILED', 'PENDING', 'RUNNING', native_enum=False),
+               type_=sa.Enum('SUCCESS', 'FAILED', 'PENDING', 'RUNNING', 'CANCELLED', native_enum=False),
+               existing_nullable=False)
+
+
+def downgrade() -> None:
+    op.execute("UPDATE execution_logs SET status = 'FAILED' WHERE status = 'CANCELLED'")
+    op.alter_column('execution_logs', 'status',
+               existing_type=sa.Enum('SUCCESS', 'FAILED', 'PENDING', 'RUNNING', 'CANCELLED', native_enum=False),
+               type_=sa.Enum('SUCCESS', 'FAILED', 'PENDING', 'RUNNING', native_enum=False),
+               existing_nullable=False)
+    op.drop_column('execution_logs', 'backend_pid')
+    op.drop_column('execution_logs', 'task_id')
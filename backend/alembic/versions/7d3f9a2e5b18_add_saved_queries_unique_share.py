@@ -0,0 +1,39 @@
+"""Add saved queries unique share constraint
+
+Revision ID: 7d3f9a2e5b18
+Revises: e2a7d4b9c613
+Create Date: 2026-10-19 13:41:19.602317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3f9a2e5b18'
+down_revision: Union[str, None] = 'e2a7d4b9c613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep the first of the duplicate shares of a query with a user
+    op.execute(
+        'DELETE FROM saved_queries duplicate USING saved_queries original '
+        'WHERE duplicate.sqid = original.sqid AND duplicate.user_id = original.user_id '
+        'AND duplicate.id > original.id'
+    )
+
+    # Built without locking the table, then promoted to a constraint
+    with op.get_context().autocommit_block():
+        op.create_index('uq_saved_queries_sqid_user_id', 'saved_queries', ['sqid', 'user_id'], unique=True, postgresql_concurrently=True, if_not_exists=True)
+    op.execute(
+        'ALTER TABLE saved_queries ADD CONSTRAINT uq_saved_queries_sqid_user_id '
+        'UNIQUE USING INDEX uq_saved_queries_sqid_user_id'
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_saved_queries_sqid_user_id', 'saved_queries', type_='unique')
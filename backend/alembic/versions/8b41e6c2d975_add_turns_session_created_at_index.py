@@ -0,0 +1,29 @@
+"""Add turns session created_at index
+
+Revision ID: 8b41e6c2d975
+Revises: 3f9c2d7a1b84
+Create Date: 2026-10-19 10:12:37.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b41e6c2d975'
+down_revision: Union[str, None] = '3f9c2d7a1b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Built without locking the table against the turns stored meanwhile
+    with op.get_context().autocommit_block():
+        op.create_index('ix_turns_session_id_created_at', 'turns', ['session_id', 'created_at'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_turns_session_id_created_at', table_name='turns', postgresql_concurrently=True, if_exists=True)
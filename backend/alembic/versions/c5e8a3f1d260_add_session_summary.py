@@ -0,0 +1,28 @@
+"""Add session summary
+
+Revision ID: c5e8a3f1d260
+Revises: 8b41e6c2d975
+Create Date: 2026-10-19 11:02:48.316540
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e8a3f1d260'
+down_revision: Union[str, None] = '8b41e6c2d975'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('sessions', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('sessions', sa.Column('summary_turn_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('sessions', 'summary_turn_id')
+    op.drop_column('sessions', 'summary')
@@ -0,0 +1,37 @@
+"""Add saved queries listing and search indexes
+
+Revision ID: e2a7d4b9c613
+Revises: c5e8a3f1d260
+Create Date: 2026-10-19 12:24:05.518902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7d4b9c613'
+down_revision: Union[str, None] = 'c5e8a3f1d260'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # Built without locking the table against the queries saved meanwhile
+    with op.get_context().autocommit_block():
+        op.create_index('ix_saved_queries_user_id_id', 'saved_queries', ['user_id', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_saved_queries_user_id', table_name='saved_queries', postgresql_concurrently=True, if_exists=True)
+        op.create_index('ix_saved_queries_name_trgm', 'saved_queries', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_saved_queries_description_trgm', 'saved_queries', ['description'], unique=False, postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'}, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_saved_queries_description_trgm', table_name='saved_queries', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_saved_queries_name_trgm', table_name='saved_queries', postgresql_concurrently=True, if_exists=True)
+        op.create_index('ix_saved_queries_user_id', 'saved_queries', ['user_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_saved_queries_user_id_id', table_name='saved_queries', postgresql_concurrently=True, if_exists=True)
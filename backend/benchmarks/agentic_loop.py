@@ -0,0 +1,153 @@
+"""
+Critical path benchmark for the planning stages of the agentic loop.
+
+Uses a fake AgentTools with fixed LLM latencies per response type, and compares
+awaiting the query type, intent, catalog and table selection one after the other
+against the concurrent stage graph used by the agentic loop.
+
+Usage (from the backend directory, with the backend environment configured):
+    python -m benchmarks.agentic_loop --runs 5
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+from typing import Any, cast
+
+# The benchmark measures the LLM stages, so the NLQ cache must not short-circuit them
+os.environ["NLQ_CACHE_ENABLED"] = "false"
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from db.models import Turn
+from dependencies.auth import AuthenticatedUserInfo
+from executor.catalog import Catalog
+from executor.config import AgentConfig
+from executor.conversation import ConversationContext
+from executor.loop import plan_agent_run
+from executor.models import NLQIntent, QueryType, RelevantCatalog, RelevantTables
+from executor.stages import StageGraph
+from executor.tools import AgentTools
+
+LATENCIES = {
+    QueryType: 0.8,
+    NLQIntent: 1.2,
+    RelevantCatalog: 1.0,
+    RelevantTables: 1.5,
+}
+
+
+class FakeAgentTools(AgentTools):
+    def __init__(self, scale: float) -> None:
+        self.scale = scale
+
+    async def invoke_llm[
+        T
+    ](
+        self,
+        response_type: type[T],
+        messages: list[ChatCompletionMessageParam],
+        temperature=0.0,
+    ) -> T:
+        await asyncio.sleep(LATENCIES[cast(Any, response_type)] * self.scale)
+
+        responses: dict[Any, Any] = {
+            QueryType: QueryType(query_type="REPORT_GENERATION"),
+            NLQIntent: NLQIntent(intent="Count the workers per project"),
+            RelevantCatalog: RelevantCatalog(
+                requires_multiple_catalogs=False, database_name="workers_db"
+            ),
+            RelevantTables: RelevantTables(tables=["worker"]),
+        }
+        return responses[response_type]
+
+
+def make_catalog(name: str) -> Catalog:
+    return Catalog(
+        name=name,
+        description=f"The {name} database",
+        provider="postgres",
+        schema={
+            "worker": {
+                "description": "Workers on the platform",
+                "columns": [{"name": "id", "type": "BIGINT", "constraints": ""}],
+                "permissions": [],
+            }
+        },
+    )
+
+
+async def run_sequential(
+    tools: AgentTools, nlq: str, catalogs, conversation: ConversationContext
+) -> None:
+    await tools.analyze_query_type(nlq, conversation.turns)
+    await tools.analaze_nlq_intent(nlq, conversation.turns)
+    catalog_name = await tools.get_relevant_catalog(nlq, catalogs)
+    catalog = next(catalog for catalog in catalogs if catalog.name == catalog_name)
+    await tools.get_relevant_tables(nlq, catalog)
+
+
+async def run_stage_graph(
+    tools: AgentTools, nlq: str, catalogs, conversation: ConversationContext, config
+) -> StageGraph:
+    stages = StageGraph()
+    await plan_agent_run(nlq, catalogs, tools, config, conversation, stages)
+    await stages.gather("catalog", "tables")
+    return stages
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiplier for all LLM latencies"
+    )
+    args = parser.parse_args()
+
+    tools = FakeAgentTools(args.scale)
+    nlq = "How many workers are there in each project?"
+    catalogs = [make_catalog("workers_db"), make_catalog("payments_db")]
+
+    previous_turn = SimpleNamespace(
+        nlq="Show all workers",
+        execution_log=SimpleNamespace(
+            query=SimpleNamespace(sqlquery="SELECT worker.id FROM worker")
+        ),
+    )
+    conversation = ConversationContext(turns=[cast(Turn, previous_turn)])
+    config = AgentConfig(
+        user_info=AuthenticatedUserInfo(
+            user=cast(Any, None), user_id="bench", role="ADMIN"
+        )
+    )
+
+    sequential_times = []
+    graph_times = []
+    stages = None
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        await run_sequential(tools, nlq, catalogs, conversation)
+        sequential_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        stages = await run_stage_graph(tools, nlq, catalogs, conversation, config)
+        graph_times.append(time.perf_counter() - start)
+
+    sequential = sum(sequential_times) / len(sequential_times)
+    graph = sum(graph_times) / len(graph_times)
+
+    latencies = ", ".join(
+        f"{response_type.__name__} {latency * args.scale:.2f}s"
+        for response_type, latency in LATENCIES.items()
+    )
+    print(f"LLM latencies: {latencies}")
+    print(f"Sequential planning: {sequential:.2f}s")
+    print(f"Stage graph planning: {graph:.2f}s ({sequential / graph:.2f}x faster)")
+    if stages:
+        print(f"Last run stage timings: {stages.get_timing_summary()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
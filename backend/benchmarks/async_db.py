@@ -0,0 +1,109 @@
+"""
+Concurrency of a request handler querying the app database on the event loop, with
+the blocking Session (as before) versus the AsyncSession with asyncpg.
+
+Both run the query of /execution_result/{execution_id} for concurrent simulated
+requests, while a probe measures how late the event loop wakes it up, i.e. how long
+every other request on the server would have been stalled.
+
+Usage (from the backend directory, against a migrated app database):
+    python -m benchmarks.async_db --execution-id 1 --requests 500 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable
+
+from db import async_queries
+from db.db_queries import get_exeuction_log_result
+from dependencies.db import db
+
+# Seconds between two wake ups of the event loop probe
+PROBE_INTERVAL = 0.005
+
+
+def get_percentile(values: list[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percentile / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def probe_event_loop(lags: list[float]) -> None:
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def blocking_request(execution_id: int) -> None:
+    db_session = db.get_session()
+    try:
+        get_exeuction_log_result(db_session, execution_id)
+    finally:
+        db_session.close()
+
+
+async def async_request(execution_id: int) -> None:
+    async with db.get_async_session() as db_session:
+        await async_queries.get_exeuction_log_result(db_session, execution_id)
+
+
+async def measure(
+    request: Callable[[int], Awaitable[None]],
+    execution_id: int,
+    requests: int,
+    concurrency: int,
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    durations: list[float] = []
+    lags: list[float] = []
+
+    async def run_one() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await request(execution_id)
+            durations.append(time.perf_counter() - start)
+
+    # Warm up the connection pool
+    await asyncio.gather(*(request(execution_id) for _ in range(concurrency)))
+
+    probe = asyncio.create_task(probe_event_loop(lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(run_one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    probe.cancel()
+
+    print(f"  Throughput: {requests / elapsed:.1f} req/s over {elapsed:.2f}s")
+    print(
+        f"  Latency: mean {statistics.mean(durations) * 1000:.1f}ms, "
+        f"p95 {get_percentile(durations, 95) * 1000:.1f}ms"
+    )
+    print(
+        f"  Event loop lag: p95 {get_percentile(lags, 95) * 1000:.1f}ms, "
+        f"max {max(lags, default=0) * 1000:.1f}ms ({len(lags)} probes)"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--execution-id", type=int, required=True)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    for name, request in [
+        ("Session on the event loop", blocking_request),
+        ("AsyncSession (asyncpg)", async_request),
+    ]:
+        print(name)
+        await measure(request, args.execution_id, args.requests, args.concurrency)
+
+    await db.dispose_async_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""
+End to end load test of the /chat endpoint.
+
+Start the server with the replay backend so that no live LLM endpoint is needed, e.g.
+    AGENT_TOOLS_BACKEND=replay LLM_CACHE_BACKEND=none \\
+    REPLAY_LATENCY=lognormal:-0.5,0.4 REPLAY_FAILURE_RATE=0.01 REPLAY_SEED=42 \\
+    uvicorn server:app
+
+and then run (from the backend directory):
+    python -m benchmarks.chat_load --token <access token> --requests 200 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import aiohttp
+
+
+@dataclass
+class ChatRequestTiming:
+    time_to_first_chunk: Optional[float]
+    duration: float
+    ok: bool
+
+
+def get_percentile(values: list[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percentile / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def send_chat_request(
+    http: aiohttp.ClientSession, url: str, query: str
+) -> ChatRequestTiming:
+    start = time.perf_counter()
+    time_to_first_chunk = None
+    try:
+        async with http.post(url, json={"query": query}) as response:
+            async for _ in response.content.iter_any():
+                if time_to_first_chunk is None:
+                    time_to_first_chunk = time.perf_counter() - start
+            ok = response.status == 200
+    except aiohttp.ClientError:
+        ok = False
+
+    return ChatRequestTiming(time_to_first_chunk, time.perf_counter() - start, ok)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000/chat")
+    parser.add_argument("--token", required=True, help="Bearer token of the user")
+    parser.add_argument("--query", default="List the workers on the platform")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    headers = {"Authorization": f"Bearer {args.token}"}
+    timeout = aiohttp.ClientTimeout(total=None)
+
+    async with aiohttp.ClientSession(headers=headers, timeout=timeout) as http:
+
+        async def run_one() -> ChatRequestTiming:
+            async with semaphore:
+                return await send_chat_request(http, args.url, args.query)
+
+        start = time.perf_counter()
+        timings = await asyncio.gather(*(run_one() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    durations = [timing.duration for timing in timings if timing.ok]
+    first_chunks = [
+        timing.time_to_first_chunk
+        for timing in timings
+        if timing.ok and timing.time_to_first_chunk is not None
+    ]
+    failures = sum(1 for timing in timings if not timing.ok)
+
+    print(f"Requests: {args.requests} (concurrency {args.concurrency})")
+    print(f"Failed requests: {failures}")
+    print(f"Throughput: {len(durations) / elapsed:.2f} req/s over {elapsed:.2f}s")
+    if durations:
+        print(
+            f"Latency: mean {statistics.mean(durations):.3f}s, "
+            f"p50 {get_percentile(durations, 50):.3f}s, "
+            f"p95 {get_percentile(durations, 95):.3f}s, "
+            f"p99 {get_percentile(durations, 99):.3f}s"
+        )
+    if first_chunks:
+        print(
+            f"Time to first chunk: p50 {get_percentile(first_chunks, 50):.3f}s, "
+            f"p95 {get_percentile(first_chunks, 95):.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
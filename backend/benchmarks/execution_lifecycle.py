@@ -0,0 +1,122 @@
+"""
+App database round trips of the lifecycle of a query execution in the worker, with
+the previous sequence of queries and with the UPDATE ... RETURNING transitions.
+
+Runs against the app database of DATABASE_URI, which must be migrated. The rows it
+creates belong to a "benchmark" user.
+
+Usage (from the backend directory):
+    python -m benchmarks.execution_lifecycle --executions 100
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from db.db_queries import (
+    create_execution_entry,
+    get_execution_log,
+    get_or_create_query,
+    get_or_create_user,
+    save_execution_result,
+    set_execution_backend_pid,
+    set_execution_status,
+    transition_execution_status,
+)
+from dependencies.db import db, get_db_session
+
+RESULT = [{"id": index, "name": f"worker {index}"} for index in range(100)]
+
+
+@dataclass
+class Counts:
+    statements: int = 0
+    commits: int = 0
+
+
+def run_previous_lifecycle(db_session: Session, execution_id: int) -> None:
+    set_execution_status(db_session, execution_id, "RUNNING")
+    execution_log = get_execution_log(db_session, execution_id)
+    assert execution_log
+    db_session.commit()
+    execution_log.query.sqlquery
+    set_execution_backend_pid(db_session, execution_id, 1)
+    save_execution_result(db_session, execution_id, RESULT)
+    set_execution_status(db_session, execution_id, "SUCCESS")
+    execution_log = get_execution_log(db_session, execution_id)
+    assert execution_log
+    execution_log.notify_to
+
+
+def run_lifecycle(db_session: Session, execution_id: int) -> None:
+    execution_log = transition_execution_status(db_session, execution_id, "RUNNING")
+    assert execution_log
+    execution_log.query.sqlquery
+    set_execution_backend_pid(db_session, execution_id, 1)
+    execution_log = transition_execution_status(
+        db_session, execution_id, "SUCCESS", result=RESULT
+    )
+    assert execution_log
+    execution_log.notify_to
+
+
+def measure(
+    lifecycle: Callable[[Session, int], None],
+    executions: int,
+    **session_options,
+) -> tuple[Counts, float]:
+    counts = Counts()
+
+    def count_statement(*_):
+        counts.statements += 1
+
+    def count_commit(*_):
+        counts.commits += 1
+
+    with get_db_session() as db_session:
+        user = get_or_create_user(db_session, "benchmark")
+        query = get_or_create_query(db_session, "SELECT 1", user.user_id, "benchmark")
+        execution_ids = [
+            create_execution_entry(db_session, user.user_id, query.sqid).id
+            for _ in range(executions)
+        ]
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    event.listen(db.engine, "commit", count_commit)
+    try:
+        start = time.perf_counter()
+        with get_db_session(**session_options) as db_session:
+            for execution_id in execution_ids:
+                lifecycle(db_session, execution_id)
+        duration = time.perf_counter() - start
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+        event.remove(db.engine, "commit", count_commit)
+
+    return counts, duration
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--executions", type=int, default=100)
+    args = parser.parse_args()
+
+    for name, lifecycle, session_options in [
+        ("previous", run_previous_lifecycle, {}),
+        ("update returning", run_lifecycle, {"expire_on_commit": False}),
+    ]:
+        counts, duration = measure(lifecycle, args.executions, **session_options)
+        print(
+            f"{name:<18}"
+            f" {counts.statements / args.executions:>6.1f} statements/task"
+            f" {counts.commits / args.executions:>6.1f} commits/task"
+            f" {duration / args.executions * 1000:>8.2f} ms/task"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Recall and latency benchmark for the table retrieval index.
+
+Builds a synthetic catalog with a configurable number of tables, asks questions whose
+target tables are known, and reports recall@k along with index build and search latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.table_retrieval --tables 500 --queries 200
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from executor.catalog import Catalog
+from utils.table_index import TableIndex
+
+ENTITIES = [
+    ("worker", "people who complete tasks on the platform"),
+    ("project", "client projects that group tasks"),
+    ("task", "units of work assigned to workers"),
+    ("payment", "payouts made for completed work"),
+    ("language", "languages supported for recordings"),
+    ("recording", "audio recordings submitted for tasks"),
+    ("review", "quality reviews of submitted work"),
+    ("device", "phones used to complete tasks"),
+    ("district", "administrative districts where workers live"),
+    ("invoice", "invoices raised to clients"),
+    ("client", "organisations that commission projects"),
+    ("training", "training sessions attended by workers"),
+]
+
+QUALIFIERS = [
+    "daily", "weekly", "monthly", "archived", "pending", "approved", "rejected",
+    "regional", "pilot", "legacy", "audit", "summary", "staging", "historical",
+]
+
+ATTRIBUTES = [
+    "status", "created_at", "updated_at", "amount", "score", "duration", "count",
+    "region", "phone_number", "full_name", "email", "rating", "currency", "category",
+]
+
+
+def build_synthetic_catalog(num_tables: int, rng: random.Random) -> Catalog:
+    tables: dict[str, dict] = {}
+
+    while len(tables) < num_tables:
+        entity, description = rng.choice(ENTITIES)
+        qualifier = rng.choice(QUALIFIERS)
+        table_name = f"{qualifier}_{entity}_{len(tables)}"
+        attributes = rng.sample(ATTRIBUTES, 4)
+
+        tables[table_name] = {
+            "description": f"{qualifier.capitalize()} records of {description}",
+            "columns": [
+                {"name": "id", "type": "BIGINT", "constraints": "PRIMARY KEY"},
+                *[
+                    {"name": attribute, "type": "TEXT", "constraints": ""}
+                    for attribute in attributes
+                ],
+            ],
+            "permissions": [],
+        }
+
+    return Catalog(
+        name="benchmark_db",
+        description="Synthetic catalog",
+        provider="postgres",
+        schema=tables,
+    )
+
+
+def build_questions(
+    catalog: Catalog, num_queries: int, rng: random.Random
+) -> list[tuple[str, str]]:
+    questions = []
+    table_names = list(catalog.schema.keys())
+
+    for _ in range(num_queries):
+        table_name = rng.choice(table_names)
+        table_info = catalog.schema[table_name]
+        qualifier, entity, _ = table_name.split("_")
+        column = rng.choice(table_info["columns"][1:])["name"].replace("_", " ")
+
+        # Users rarely name the table exactly, so the qualifier is often left out
+        subject = f"{qualifier} {entity}s" if rng.random() < 0.5 else f"{entity}s"
+        questions.append((f"Show the {column} of all {subject}", table_name))
+
+    return questions
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tables", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5, 10, 20, 50])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    catalog = build_synthetic_catalog(args.tables, rng)
+    questions = build_questions(catalog, args.queries, rng)
+
+    index = TableIndex()
+    start = time.perf_counter()
+    index.sync([catalog])
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    index.sync([catalog])
+    resync_ms = (time.perf_counter() - start) * 1000
+
+    max_k = max(args.top_k)
+    hits = {k: 0 for k in args.top_k}
+    latencies_ms = []
+
+    for question, expected_table in questions:
+        start = time.perf_counter()
+        results = index.search(question, catalog.name, max_k)
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+
+        ranked = [result.table for result in results]
+        for k in args.top_k:
+            if expected_table in ranked[:k]:
+                hits[k] += 1
+
+    print(f"Tables: {args.tables}, Questions: {args.queries}")
+    print(f"Index build: {build_ms:.1f}ms, unchanged resync: {resync_ms:.1f}ms")
+    print(
+        f"Search latency: mean {statistics.mean(latencies_ms):.2f}ms, "
+        f"p95 {percentile(latencies_ms, 0.95):.2f}ms"
+    )
+    for k in args.top_k:
+        print(f"Recall@{k}: {hits[k] / len(questions):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Size and encoding time of the execute_query_op task message, sending the complete
+catalog (as before) versus only its name and configuration version.
+
+Usage (from the backend directory, with a catalogs.json):
+    python -m benchmarks.task_payload --iterations 1000
+"""
+
+import argparse
+import json
+import pickle
+import time
+from typing import Any, Callable
+
+from utils.parse_catalog import parsed_catalogs
+
+
+def measure(encode: Callable[[], bytes], iterations: int) -> tuple[int, float]:
+    size = len(encode())
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode()
+    return size, (time.perf_counter() - start) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    for catalog in parsed_catalogs.catalogs:
+        full_kwargs: dict[str, Any] = {
+            "execution_log_id": 1,
+            "catalog_json": catalog.__dict__,
+        }
+        lean_kwargs: dict[str, Any] = {
+            "execution_log_id": 1,
+            "catalog_name": catalog.name,
+            "catalog_version": parsed_catalogs.version,
+            "role": "ADMIN",
+            "origin": "interactive",
+            "enqueued_at": time.time(),
+        }
+
+        print(f"Catalog '{catalog.name}' ({len(catalog.schema)} tables)")
+        for name, encode in [
+            ("full catalog, pickle", lambda: pickle.dumps(full_kwargs)),
+            ("full catalog, json", lambda: json.dumps(full_kwargs).encode()),
+            ("catalog name, json", lambda: json.dumps(lean_kwargs).encode()),
+        ]:
+            size, seconds = measure(encode, args.iterations)
+            print(f"  {name:<22} {size:>10} bytes {seconds * 1e6:>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
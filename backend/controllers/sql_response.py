@@ -1,25 +1,38 @@
 from dataclasses import dataclass
+from datetime import datetime
+from db import async_queries
+from db.catalog_utils import cancel_backend
 from db.db_queries import *
-from db.models import SavedQuery, User, UserSession
+from db.models import ExecutionLog, SavedQuery, User, UserSession
 from dependencies.auth import AuthenticatedUserInfo
-from executor.config import AgentConfig
+from executor.config import AgentConfig, TokenStage
+from executor.conversation import schedule_conversation_summary
 from executor.core import NLQExecutor
 from executor.loop import (
     AgenticLoopFailure,
     AgenticLoopQueryResult,
     AgenticLoopQuestionAnsweringResult,
 )
+from executor.events import AgentEventBus
 from executor.status import AgentStatus
-from agents.azure_openai import AzureAIAgentTools
+from queues.typed_tasks import revoke_execute_query_ops
+from agents.factory import get_agent_tools
 from utils.logger import get_logger
+from utils.metrics import metrics
+from utils.pagination import decode_cursor, encode_cursor
 from utils.parse_catalog import parsed_catalogs
+from utils.sse import SSEEventBuffer, SSEStream, parse_event_id, resume_sse_stream
 from typing import AsyncIterator, List, Literal, Optional
+from os import environ
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import json
 import asyncio
 
 logger = get_logger("NLQ-Server")
 
+# Maximum number of rows sent in a single TABLE_ROWS event
+RESULT_STREAM_CHUNK_ROWS = int(environ.get("RESULT_STREAM_CHUNK_ROWS", 500))
+
 
 @dataclass
 class NLQUpdateEvent:
@@ -27,10 +40,18 @@ class NLQUpdateEvent:
     status: str
 
 
+@dataclass
+class NLQTokenEvent:
+    kind: Literal["TOKEN"]
+    stage: TokenStage
+    delta: str
+    session_id: str
+
+
 @dataclass
 class NLQResponseEvent:
     kind: Literal["RESPONSE"]
-    type: Literal["TEXT", "TABLE", "ERROR"]
+    type: Literal["TEXT", "ERROR"]
     payload: str | List[dict]
     session_id: str
     query: Optional[str] = None
@@ -39,6 +60,27 @@ class NLQResponseEvent:
     turn_id: Optional[int] = None
 
 
+@dataclass
+class NLQTableEvent:
+    """
+    Table results are streamed as a TABLE_START event with the column order and the
+    ids of the query, followed by TABLE_ROWS events of at most
+    RESULT_STREAM_CHUNK_ROWS rows and a final TABLE_END event
+    """
+
+    kind: Literal["RESPONSE"]
+    type: Literal["TABLE_START", "TABLE_ROWS", "TABLE_END"]
+    session_id: str
+    columns: Optional[ColumnOrder] = None
+    rows: Optional[QueryResults] = None
+    row_count: Optional[int] = None
+    truncated: Optional[bool] = None
+    query: Optional[str] = None
+    sql_query_id: Optional[str] = None
+    execution_id: Optional[int] = None
+    turn_id: Optional[int] = None
+
+
 class ExecuteQueryRequest(BaseModel):
     params: Optional[SqlQueryParams] = None
 
@@ -49,8 +91,43 @@ async def nlq_sse_wrapper(
     session: UserSession,
     db_session: Session,
 ) -> AsyncIterator[str]:
-    async for event in do_nlq(user_info, query, session, db_session):
-        yield json.dumps(event.__dict__)
+    stream = SSEStream(
+        do_nlq(user_info, query, session, db_session),
+        owner=user_info.user_id,
+        error_event=lambda _: NLQResponseEvent(
+            kind="RESPONSE",
+            type="ERROR",
+            payload="Something went wrong while answering the question",
+            session_id=str(session.session_id),
+        ),
+    )
+    async for frame in stream.write():
+        yield frame
+
+
+async def resume_nlq_stream(
+    last_event_id: str, user_id: str
+) -> Optional[AsyncIterator[str]]:
+    """
+    Resume a stream after the event with the given id, if its events are still
+    buffered and it belongs to the user
+    """
+    parsed_event_id = parse_event_id(last_event_id)
+    if not parsed_event_id:
+        return None
+
+    stream_id, last_seq = parsed_event_id
+    try:
+        owner = await asyncio.to_thread(SSEEventBuffer(stream_id).get_owner)
+    except Exception as e:
+        logger.error(f"Error while resuming stream {stream_id}: {e}")
+        return None
+
+    if owner != user_id:
+        return None
+
+    logger.info(f"Resuming stream {stream_id} after event {last_seq}")
+    return resume_sse_stream(stream_id, last_seq)
 
 
 async def do_nlq(
@@ -58,21 +135,39 @@ async def do_nlq(
     nlq: str,
     session: UserSession,
     db_session: Session,
-) -> AsyncIterator[NLQUpdateEvent | NLQResponseEvent]:
+) -> AsyncIterator[
+    NLQUpdateEvent | NLQTokenEvent | NLQResponseEvent | NLQTableEvent
+]:
     # Log info
     logger.info(f"Generating sql response for query : {nlq}")
 
-    events = asyncio.Queue[NLQUpdateEvent]()
-
-    def update_callback(status: AgentStatus):
-        # Push the status to the event queue without awaiting
-        asyncio.create_task(
-            events.put(NLQUpdateEvent(kind="UPDATE", status=status.value))
+    events = AgentEventBus[NLQUpdateEvent | NLQTokenEvent]()
+    submitted_execution_ids: list[int] = []
+
+    async def update_callback(status: AgentStatus):
+        # The end of the run is signalled by closing the event bus
+        if status in (AgentStatus.TASK_COMPLETED, AgentStatus.TASK_FAILED):
+            return
+        await events.publish(NLQUpdateEvent(kind="UPDATE", status=status.value))
+
+    async def token_callback(stage: TokenStage, delta: str):
+        await events.publish(
+            NLQTokenEvent(
+                kind="TOKEN",
+                stage=stage,
+                delta=delta,
+                session_id=str(session.session_id),
+            )
         )
 
-    config = AgentConfig(update_callback=update_callback, user_info=user_info)
+    config = AgentConfig(
+        update_callback=update_callback,
+        token_callback=token_callback,
+        execution_callback=submitted_execution_ids.append,
+        user_info=user_info,
+    )
 
-    agent = AzureAIAgentTools()
+    agent = get_agent_tools()
 
     nlq_executor = (
         NLQExecutor(db_session)
@@ -82,23 +177,25 @@ async def do_nlq(
         .with_session(session)
     )
 
+    metrics.increment("chat.requests")
     agentic_loop_future = asyncio.create_task(nlq_executor.execute(nlq))
-
-    while True:
-        event = await events.get()
-        if (
-            event.status == AgentStatus.TASK_COMPLETED.value
-            or event.status == AgentStatus.TASK_FAILED.value
-        ):
-            logger.info(
-                f"Task completed with status: {event.status}. Exiting event loop"
-            )
-            break
-
-        yield event
-
-    logger.info("Waiting for the nlq executor to return")
-    result = await agentic_loop_future
+    agentic_loop_future.add_done_callback(lambda _: events.close())
+
+    try:
+        async for event in events:
+            yield event
+
+        logger.info("Waiting for the nlq executor to return")
+        result = await agentic_loop_future
+    finally:
+        # The consumer went away (e.g. the client disconnected) before the agent
+        # finished, stop spending LLM calls and database time on the request
+        if not agentic_loop_future.done():
+            logger.warning("NLQ abandoned, cancelling the agent and its queries")
+            metrics.increment("chat.abandoned")
+            agentic_loop_future.cancel()
+            cancel_query_executions(db_session, submitted_execution_ids)
+            db_session.close()
 
     # Store chat in sql table with session id
     # create_session_and_query(user_id, query, ai_response)
@@ -110,15 +207,11 @@ async def do_nlq(
             database_used=result.db_name,
             execution_log_id=result.execution_log.id,
         )
-        yield NLQResponseEvent(
-            kind="RESPONSE",
-            type="TABLE",
-            payload=result.result,
-            session_id=str(session.session_id),
-            query=result.query,
-            sql_query_id=result.execution_log.query_id,
-            turn_id=turn.turn_id,
-        )
+        schedule_conversation_summary(agent, session.session_id)
+        async for table_event in stream_table_events(
+            db_session, result, str(session.session_id), turn.turn_id
+        ):
+            yield table_event
 
     if isinstance(result, AgenticLoopQuestionAnsweringResult):
         yield NLQResponseEvent(
@@ -137,30 +230,199 @@ async def do_nlq(
         )
 
     db_session.close()
+    metrics.increment("chat.completed")
     logger.info("NLQ Completed")
 
 
-def chat_history(
-    db_session: Session, session_id: str, user_id: str
-) -> List[ChatHistoryResponse]:
+def cancel_query_execution(db_session: Session, execution_log: ExecutionLog) -> bool:
+    """
+    Cancel a pending or running query execution. The execution is marked CANCELLED
+    first, so the worker doesn't overwrite the status when the query is interrupted.
+    Then the celery task is revoked and the query running on the catalog is
+    cancelled.
+
+    Returns:
+        False if the execution had already finished
+    """
+    if not transition_execution_status(db_session, execution_log.id, "CANCELLED"):
+        return False
+
+    metrics.increment("execution.cancelled")
+
+    if execution_log.task_id:
+        try:
+            revoke_execute_query_ops([execution_log.task_id])
+        except Exception as e:
+            logger.error(f"Failed to revoke execution {execution_log.id}: {e}")
+
+    if execution_log.backend_pid:
+        catalog = next(
+            (
+                catalog
+                for catalog in parsed_catalogs.catalogs
+                if catalog.name == execution_log.query.database_used
+            ),
+            None,
+        )
+        try:
+            if catalog:
+                cancel_backend(catalog, execution_log.backend_pid)
+        except Exception as e:
+            logger.error(f"Failed to cancel query of execution {execution_log.id}: {e}")
+
+    logger.info(f"Execution with id '{execution_log.id}' CANCELLED")
+    return True
+
+
+def cancel_query_executions(db_session: Session, execution_ids: list[int]) -> None:
+    for execution_id in execution_ids:
+        try:
+            execution_log = get_execution_log(db_session, execution_id)
+            if execution_log:
+                cancel_query_execution(db_session, execution_log)
+        except Exception as e:
+            logger.error(f"Failed to cancel execution {execution_id}: {e}")
+
+
+async def stream_table_events(
+    db_session: Session,
+    result: AgenticLoopQueryResult,
+    session_id: str,
+    turn_id: int,
+) -> AsyncIterator[NLQTableEvent]:
+    """
+    Stream the result of a query in chunks, so the client renders the first rows
+    without parsing a single large event. The rows are those the agent already
+    holds; the saved result only provides the column order and whether rows were
+    dropped to stay within the execution limits.
+    """
+    execution_id = result.execution_log.id
+    result_info = await asyncio.to_thread(
+        get_execution_result_info, db_session, execution_id
+    )
+
+    row_count = len(result.result)
+    columns = list(result.result[0].keys()) if result.result else []
+    truncated = None
+    if result_info:
+        columns = result_info.column_order
+        truncated = result_info.truncated
+
+    yield NLQTableEvent(
+        kind="RESPONSE",
+        type="TABLE_START",
+        session_id=session_id,
+        columns=columns,
+        row_count=row_count,
+        truncated=truncated,
+        query=result.query,
+        sql_query_id=result.execution_log.query_id,
+        execution_id=execution_id,
+        turn_id=turn_id,
+    )
+
+    for start in range(0, row_count, RESULT_STREAM_CHUNK_ROWS):
+        yield NLQTableEvent(
+            kind="RESPONSE",
+            type="TABLE_ROWS",
+            session_id=session_id,
+            rows=result.result[start : start + RESULT_STREAM_CHUNK_ROWS],
+        )
+
+    yield NLQTableEvent(
+        kind="RESPONSE", type="TABLE_END", session_id=session_id, row_count=row_count
+    )
+
+
+async def chat_history(
+    db_session: AsyncSession,
+    session_id: str,
+    user_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> tuple[List[ChatHistoryResponse], Optional[str]]:
+    """
+    The chat history of a session of the user, complete or, with a limit, one page
+    of its most recent turns and the cursor of the page of older turns if any
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
     # Log info
     logger.info(
         f"History for session_id: {session_id} is requested! for user {user_id}"
     )
     # check if session exist of the user
-    session = get_session_for_user(
+    session = await async_queries.get_session_for_user(
         db_session=db_session, user_id=user_id, session_id=session_id
     )
     if not session:
-        return []
+        return [], None
     logger.info(f"History for user_id: {user_id} is requested!")
-    return get_chat_history(db_session, session_id)
 
+    if limit is None:
+        return await async_queries.get_chat_history(db_session, session_id), None
 
-def get_session_history(user_id: str, db: Session) -> List[UserSessionsResponse]:
+    before = None
+    if cursor:
+        before = parse_chat_history_cursor(cursor)
+        if not before:
+            raise ValueError(f"Invalid chat history cursor: {cursor}")
+
+    history, next_before = await async_queries.get_chat_history_page(
+        db_session, session_id, limit, before
+    )
+    return history, encode_cursor(*next_before) if next_before else None
+
+
+def parse_chat_history_cursor(cursor: str) -> Optional[tuple[datetime, int]]:
+    values = decode_cursor(cursor)
+    if not values or len(values) != 2:
+        return None
+    try:
+        return datetime.fromisoformat(values[0]), int(values[1])
+    except (TypeError, ValueError):
+        return None
+
+
+async def get_session_history(
+    user_id: str, db: AsyncSession, limit: int, cursor: Optional[str] = None
+) -> tuple[List[UserSessionsResponse], Optional[str]]:
+    """
+    A page of the sessions of the user, and the cursor of the next page if any
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
     # Log info
     logger.info(f"History requested for user {user_id}")
-    return get_history_sessions(db_session=db, user_id=user_id)
+
+    before = None
+    if cursor:
+        before = parse_history_cursor(cursor)
+        if not before:
+            raise ValueError(f"Invalid history cursor: {cursor}")
+
+    # One more session than requested tells whether there is a next page
+    sessions = await async_queries.get_history_sessions(
+        db_session=db, user_id=user_id, limit=limit + 1, before=before
+    )
+    if len(sessions) <= limit:
+        return sessions, None
+
+    sessions = sessions[:limit]
+    last_session = sessions[-1]
+    return sessions, encode_cursor(last_session.last_active_at, last_session.session_id)
+
+
+def parse_history_cursor(cursor: str) -> Optional[tuple[datetime, str]]:
+    values = decode_cursor(cursor)
+    if not values or len(values) != 2:
+        return None
+    try:
+        return datetime.fromisoformat(values[0]), str(values[1])
+    except (TypeError, ValueError):
+        return None
 
 
 def save_fav(db: Session, user_id: str, turn_id: int, sql_query_id: str):
@@ -171,12 +433,51 @@ def save_fav(db: Session, user_id: str, turn_id: int, sql_query_id: str):
     return save_user_fav_query(db, user_id, turn_id, sql_query_id)
 
 
-def get_saved_queries_user(
-    db: Session, user_id: str, filter: Optional[str]
-) -> List[SavedQueriesResponse]:
+async def get_saved_queries_user(
+    db: AsyncSession,
+    user_id: str,
+    filter: Optional[str],
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+) -> tuple[List[SavedQueriesResponse], Optional[str]]:
+    """
+    The saved queries of the user, most recent first, and the cursor of the next
+    page if any. Without a limit, all of them are returned.
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
     # Log info
     logger.info(f"Get saved queries for user: {user_id} is requested!")
-    return get_saved_queries(db, user_id, filter_type=filter)
+
+    before = None
+    if cursor:
+        before = parse_saved_queries_cursor(cursor)
+        if before is None:
+            raise ValueError(f"Invalid saved queries cursor: {cursor}")
+
+    # One more saved query than requested tells whether there is a next page
+    saved_queries = await async_queries.get_saved_queries(
+        db,
+        user_id,
+        filter_type=filter,
+        limit=limit + 1 if limit else None,
+        before=before,
+        search=search,
+    )
+    if not limit or len(saved_queries) <= limit:
+        return saved_queries, None
+
+    saved_queries = saved_queries[:limit]
+    return saved_queries, encode_cursor(saved_queries[-1].id)
+
+
+def parse_saved_queries_cursor(cursor: str) -> Optional[int]:
+    values = decode_cursor(cursor)
+    if not values or len(values) != 1 or not isinstance(values[0], int):
+        return None
+    return values[0]
 
 
 def save_query_for_user(
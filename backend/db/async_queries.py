@@ -0,0 +1,324 @@
+"""
+Queries of the request handlers that run on the event loop, with an AsyncSession.
+Relationships can't be lazy loaded by an AsyncSession, so the queries load what
+the handlers use upfront. The queries shared with the blocking handlers run their
+synchronous versions through `AsyncSession.run_sync`, so both stay the same.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from sqlalchemy import Row, Select, asc, desc, func, literal, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import db_queries
+from db.db_queries import (
+    ChatHistoryResponse,
+    ExecutionLogResult,
+    Roles,
+    SavedQueriesResponse,
+    UserSessionsResponse,
+)
+from db.models import (
+    ExecutionLog,
+    SavedQuery,
+    SqlQuery,
+    Turn,
+    UserSession,
+    get_uuid_str,
+)
+from utils.logger import get_logger
+
+logger = get_logger("[DATABASE_QUERIES]")
+
+
+async def create_session(
+    db_session: AsyncSession, user_id: str
+) -> Optional[UserSession]:
+    """Create a new session for a user."""
+    return await db_session.run_sync(db_queries.create_session, user_id)
+
+
+async def get_session_for_user(
+    db_session: AsyncSession, user_id: str, session_id: str
+) -> Optional[UserSession]:
+    """
+    Check if session id is for the user; if not, return None
+    """
+    return await db_session.run_sync(
+        db_queries.get_session_for_user, user_id, session_id
+    )
+
+
+def select_chat_history(
+    session_id: str,
+    limit: Optional[int] = None,
+    before: Optional[tuple[datetime, int]] = None,
+) -> Select:
+    """
+    The columns of the turns of a session that the chat history shows, in a single
+    query. With a limit, the most recent turns (before `before`) come first.
+    """
+    stmt = (
+        select(
+            Turn.turn_id,
+            Turn.nlq,
+            Turn.created_at,
+            ExecutionLog.id.label("execution_id"),
+            SqlQuery.sqlquery,
+            SqlQuery.sqid,
+        )
+        .outerjoin(ExecutionLog, ExecutionLog.id == Turn.execution_log_id)
+        .outerjoin(SqlQuery, SqlQuery.sqid == ExecutionLog.query_id)
+        .where(Turn.session_id == session_id)
+    )
+
+    if limit is None:
+        return stmt.order_by(asc(Turn.created_at), asc(Turn.turn_id))
+
+    if before:
+        created_at, turn_id = before
+        stmt = stmt.where(
+            tuple_(Turn.created_at, Turn.turn_id)
+            < tuple_(literal(created_at), literal(turn_id))
+        )
+    return stmt.order_by(desc(Turn.created_at), desc(Turn.turn_id)).limit(limit)
+
+
+def build_chat_history(
+    session_id: str, turns: Sequence[Row]
+) -> List[ChatHistoryResponse]:
+    chat_history = []
+    for turn in turns:
+        # User Turn Message
+        chat_history.append(
+            ChatHistoryResponse(
+                id=get_uuid_str(),
+                turn_id=turn.turn_id,
+                message=turn.nlq,
+                role=Roles.USER,
+                timestamp=turn.created_at,
+                type="text",
+                session_id=str(session_id),
+                query=None,
+                execution_id=None,
+            )
+        )
+
+        # Bot Turn Message
+        chat_history.append(
+            ChatHistoryResponse(
+                id=get_uuid_str(),
+                turn_id=turn.turn_id,
+                role=Roles.BOT,
+                timestamp=turn.created_at,
+                execution_id=turn.execution_id,
+                query=turn.sqlquery,
+                type="execution",
+                session_id=str(session_id),
+                sql_query_id=turn.sqid,
+            )
+        )
+    return chat_history
+
+
+async def get_chat_history(
+    db_session: AsyncSession, session_id: str
+) -> List[ChatHistoryResponse]:
+    """
+    Get chat history for a session.
+    """
+    try:
+        turns = (await db_session.execute(select_chat_history(session_id))).all()
+        return build_chat_history(session_id, turns)
+    except Exception as e:
+        logger.error(f"Error getting chat history: {e}")
+        await db_session.rollback()
+        return []
+
+
+async def get_chat_history_page(
+    db_session: AsyncSession,
+    session_id: str,
+    limit: int,
+    before: Optional[tuple[datetime, int]] = None,
+) -> tuple[List[ChatHistoryResponse], Optional[tuple[datetime, int]]]:
+    """
+    Get the `limit` most recent turns of a session before `before`, for sessions too
+    long to load at once
+
+    Returns:
+        The chat history of the turns in order, and the `created_at` and `turn_id`
+        of its first turn if older turns remain
+    """
+    try:
+        # One more turn than requested tells whether older turns remain
+        turns = (
+            await db_session.execute(
+                select_chat_history(session_id, limit + 1, before)
+            )
+        ).all()
+
+        next_before = None
+        if len(turns) > limit:
+            turns = turns[:limit]
+            next_before = (turns[-1].created_at, turns[-1].turn_id)
+
+        return build_chat_history(session_id, turns[::-1]), next_before
+    except Exception as e:
+        logger.error(f"Error getting chat history: {e}")
+        await db_session.rollback()
+        return [], None
+
+
+async def get_history_sessions(
+    db_session: AsyncSession,
+    user_id: str,
+    limit: int,
+    before: Optional[tuple[datetime, str]] = None,
+) -> List[UserSessionsResponse]:
+    """
+    Get the sessions of a user along with their first NLQ turn, most recently
+    active first, in a single query.
+
+    Args:
+        limit (int): Maximum number of sessions
+        before (tuple): `last_active_at` and `session_id` of the last session of
+            the previous page
+    """
+    try:
+        # The first turn of each session, with the time of its last turn
+        first_turns = (
+            select(
+                Turn.session_id,
+                Turn.nlq,
+                func.max(Turn.created_at)
+                .over(partition_by=Turn.session_id)
+                .label("last_active_at"),
+            )
+            .join(UserSession, UserSession.session_id == Turn.session_id)
+            .where(UserSession.user_id == user_id)
+            .distinct(Turn.session_id)
+            .order_by(Turn.session_id, Turn.created_at)
+            .subquery()
+        )
+
+        stmt = (
+            select(first_turns)
+            .order_by(
+                desc(first_turns.c.last_active_at), desc(first_turns.c.session_id)
+            )
+            .limit(limit)
+        )
+        if before:
+            last_active_at, session_id = before
+            stmt = stmt.where(
+                tuple_(first_turns.c.last_active_at, first_turns.c.session_id)
+                < tuple_(literal(last_active_at), literal(session_id))
+            )
+
+        rows = await db_session.execute(stmt)
+        return [
+            UserSessionsResponse(
+                session_id=row.session_id,
+                nlq=f"{row.nlq}",
+                last_active_at=row.last_active_at,
+            )
+            for row in rows
+        ]
+    except Exception as e:
+        logger.error(f"Error getting history sessions: {e}")
+        await db_session.rollback()
+        return []
+
+
+def select_saved_queries(
+    user_id: str,
+    filter_type: Optional[str] = "saved",
+    limit: Optional[int] = None,
+    before: Optional[int] = None,
+    search: Optional[str] = None,
+) -> Select:
+    """
+    The columns of the saved queries of a user (or, with filter_type "all", of the
+    other users) that the list shows, most recent first
+
+    Args:
+        limit (int): Maximum number of saved queries, all of them if None
+        before (int): id of the last saved query of the previous page
+        search (str): Text the name or description must contain, case insensitive
+    """
+    stmt = select(
+        SavedQuery.id,
+        SavedQuery.sqid,
+        SavedQuery.name,
+        SavedQuery.description,
+        SavedQuery.user_id,
+        SavedQuery.saved_by,
+    )
+    if filter_type != "all":
+        stmt = stmt.where(SavedQuery.user_id == user_id)
+    else:
+        stmt = stmt.where(SavedQuery.user_id != user_id)
+
+    if search:
+        # The wildcards of LIKE in the search are matched literally
+        stmt = stmt.where(
+            or_(
+                SavedQuery.name.icontains(search, autoescape=True),
+                SavedQuery.description.icontains(search, autoescape=True),
+            )
+        )
+
+    if before is not None:
+        stmt = stmt.where(SavedQuery.id < before)
+
+    stmt = stmt.order_by(desc(SavedQuery.id))
+    return stmt if limit is None else stmt.limit(limit)
+
+
+async def get_saved_queries(
+    db_session: AsyncSession,
+    user_id: str,
+    filter_type: Optional[str] = "saved",
+    limit: Optional[int] = None,
+    before: Optional[int] = None,
+    search: Optional[str] = None,
+) -> List[SavedQueriesResponse]:
+    """
+    Get the saved queries for a user, most recent first. See `select_saved_queries`.
+    """
+    try:
+        rows = await db_session.execute(
+            select_saved_queries(user_id, filter_type, limit, before, search)
+        )
+        return [
+            SavedQueriesResponse(
+                id=row.id,
+                sql_query_id=row.sqid,
+                name=row.name,
+                description=row.description,
+                saved_for=row.user_id,
+                saved_by=row.saved_by,
+            )
+            for row in rows
+        ]
+    except Exception as e:
+        logger.error(f"Error getting saved queries: {e}")
+        await db_session.rollback()
+        return []
+
+
+async def get_exeuction_log_result(
+    db_session: AsyncSession, execution_log_id: int
+) -> Optional[ExecutionLogResult]:
+    """
+    Get the execution result for a query.
+
+    Args:
+        db_session (AsyncSession): SQLAlchemy AsyncSession
+        execution_log_id (int): Execution Log ID
+    """
+    return await db_session.run_sync(
+        db_queries.get_exeuction_log_result, execution_log_id
+    )
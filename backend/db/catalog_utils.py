@@ -1,4 +1,4 @@
-from sqlalchemy import Engine, create_engine
+from sqlalchemy import Connection, Engine, create_engine, text
 from urllib.parse import quote
 from executor.catalog import Catalog
 
@@ -18,3 +18,26 @@ def get_engine(catalog: Catalog) -> Engine:
 
     else:
         raise NotImplementedError("Only postgres is supported at the moment")
+
+
+def get_backend_pid(connection: Connection) -> int:
+    """
+    Process id of the server backend serving the connection
+    """
+    return connection.execute(text("SELECT pg_backend_pid()")).scalar_one()
+
+
+def cancel_backend(catalog: Catalog, backend_pid: int) -> bool:
+    """
+    Cancel the query currently running on a server backend of the catalog
+    """
+    engine = get_engine(catalog)
+    try:
+        with engine.connect() as connection:
+            return bool(
+                connection.execute(
+                    text("SELECT pg_cancel_backend(:pid)"), {"pid": backend_pid}
+                ).scalar()
+            )
+    finally:
+        engine.dispose()
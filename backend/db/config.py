@@ -1,27 +1,62 @@
 # config.py
 import os
 from dotenv import load_dotenv
+from sqlalchemy import make_url
 
 load_dotenv()
 
 DATABASE_URI = os.environ["DATABASE_URI"].replace('%', '%%')
 
 
+def get_async_database_uri(database_uri: str) -> str:
+    """
+    URI of the same database for the asyncpg driver
+    """
+    url = make_url(database_uri).set(drivername="postgresql+asyncpg")
+
+    # asyncpg takes the libpq sslmode as ssl
+    if "sslmode" in url.query:
+        sslmode = url.query["sslmode"]
+        # Given more than once, libpq uses the last value
+        if isinstance(sslmode, tuple):
+            sslmode = sslmode[-1]
+        url = url.difference_update_query(["sslmode"])
+        url = url.update_query_dict({"ssl": sslmode})
+    return url.render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URI = os.environ.get("ASYNC_DATABASE_URI") or get_async_database_uri(
+    os.environ["DATABASE_URI"]
+)
+
+# Connections of each server process for the blocking handlers and threads
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 20))
+DB_POOL_OVERFLOW = int(os.environ.get("DB_POOL_OVERFLOW", 10))
+# Connections of each server process for the async handlers, on top of the above
+ASYNC_DB_POOL_SIZE = int(os.environ.get("ASYNC_DB_POOL_SIZE", 10))
+ASYNC_DB_POOL_OVERFLOW = int(os.environ.get("ASYNC_DB_POOL_OVERFLOW", 10))
+
+
 class Config:
     # Database configuration
     SQLALCHEMY_DATABASE_URI = DATABASE_URI
+    SQLALCHEMY_ASYNC_DATABASE_URI = ASYNC_DATABASE_URI
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False  # Set to True to see SQL queries in console
 
     # Connection pool settings
     SQLALCHEMY_ENGINE_OPTIONS = {
-        "pool_size": 100,  # Maximum number of database connections in the pool
+        "pool_size": DB_POOL_SIZE,  # Maximum number of database connections in the pool
         "pool_timeout": 30,  # Seconds to wait before timing out
         "pool_recycle": 1800,  # Recycle connections after 30 minutes
-        "max_overflow": 20,  # Allow up to 20 connections beyond pool_size
+        "max_overflow": DB_POOL_OVERFLOW,  # Connections allowed beyond pool_size
         "echo": False,  # Enable SQL query logging
         "pool_pre_ping": True,  # Enable connection health checks
     }
 
-    # Query timeout settings
-    SQLALCHEMY_QUERY_TIMEOUT = 60 * 60  # Global query timeout in seconds
+    # The async engine has its own pool, which adds to the connections above
+    SQLALCHEMY_ASYNC_ENGINE_OPTIONS = {
+        **SQLALCHEMY_ENGINE_OPTIONS,
+        "pool_size": ASYNC_DB_POOL_SIZE,
+        "max_overflow": ASYNC_DB_POOL_OVERFLOW,
+    }
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, asc
+from sqlalchemy import desc, func, select, update
+from sqlalchemy.dialects.postgresql import insert
 from db.models import (
     ExecutionLog,
     ExecutionResult,
@@ -108,6 +109,39 @@ def store_turn(
         raise e
 
 
+def insert_saved_query(
+    db_session: Session,
+    user_id: str,
+    sqid: str,
+    name: str,
+    description: Optional[str] = None,
+    turn_id: Optional[int] = None,
+    saved_by: Optional[str] = None,
+) -> SavedQuery:
+    """
+    Save a query for a user. If the user already saved the query, e.g. the same
+    SQL answered another question, the existing saved query is returned instead.
+    The caller commits.
+    """
+    db_session.execute(
+        insert(SavedQuery)
+        .values(
+            user_id=user_id,
+            sqid=sqid,
+            name=name,
+            description=description,
+            turn_id=turn_id,
+            saved_by=saved_by,
+        )
+        .on_conflict_do_nothing(index_elements=["sqid", "user_id"])
+    )
+    return db_session.scalars(
+        select(SavedQuery).where(
+            SavedQuery.sqid == sqid, SavedQuery.user_id == user_id
+        )
+    ).one()
+
+
 def save_user_fav_query(
     db_session: Session,
     user_id: str,
@@ -126,14 +160,14 @@ def save_user_fav_query(
         else:
             name = "Unnamed Query"
 
-        saved_query = SavedQuery(
+        saved_query = insert_saved_query(
+            db_session,
             user_id=user_id,
             turn_id=turn_id,
             sqid=sql_query_id,
             name=name,
             description=description,
         )
-        db_session.add(saved_query)
         db_session.commit()
         return saved_query
     except Exception as e:
@@ -226,100 +260,82 @@ def get_session_for_user(
         return None
 
 
-def get_chat_history(db_session: Session, session_id: str) -> List[ChatHistoryResponse]:
+def get_recent_turns(db_session: Session, session_id: str, limit: int) -> List[Turn]:
     """
-    Get chat history for a session.
+    Get the `limit` most recent turns of a session in order, along with their
+    execution log and query, in a single query. The prompts read the SQL of every
+    turn, which would otherwise be lazy loaded turn by turn.
     """
-    try:
-        turns = (
-            db_session.query(Turn)
-            .filter_by(session_id=session_id)
-            .order_by(asc(Turn.created_at))
-            .all()
-        )
-
-        chat_history = []
-        for turn in turns:
-            if turn.execution_log:
-                execution_id = turn.execution_log.id
-                query = turn.execution_log.query.sqlquery
-            else:
-                execution_id = None
-                query = None
-
-            # User Turn Message
-            chat_history.append(
-                ChatHistoryResponse(
-                    id=get_uuid_str(),
-                    turn_id=turn.turn_id,
-                    message=turn.nlq,
-                    role=Roles.USER,
-                    timestamp=turn.created_at,
-                    type="text",
-                    session_id=str(session_id),
-                    query=None,
-                    execution_id=None,
-                )
-            )
+    turns = db_session.scalars(
+        select(Turn)
+        .options(joinedload(Turn.execution_log).joinedload(ExecutionLog.query))
+        .where(Turn.session_id == session_id)
+        .order_by(desc(Turn.created_at), desc(Turn.turn_id))
+        .limit(limit)
+    )
+    return list(turns)[::-1]
 
-            # Bot Turn Message
-            chat_history.append(
-                ChatHistoryResponse(
-                    id=get_uuid_str(),
-                    turn_id=turn.turn_id,
-                    role=Roles.BOT,
-                    timestamp=turn.created_at,
-                    execution_id=execution_id,
-                    query=query,
-                    type="execution",
-                    session_id=str(session_id),
-                    sql_query_id=(
-                        turn.execution_log.query.sqid if turn.execution_log else None
-                    ),
-                )
-            )
-        return chat_history
-    except Exception as e:
-        logger.error(f"Error getting chat history: {e}")
-        db_session.rollback()
-        return []
 
+def get_turns_to_summarize(
+    db_session: Session,
+    session_id: str,
+    window: int,
+    after_turn_id: Optional[int] = None,
+) -> List[Turn]:
+    """
+    Get the turns of a session older than its `window` most recent turns, and
+    newer than `after_turn_id`, the last turn already in the session summary
+    """
+    # Creation time of the oldest turn in the window, NULL while the session is
+    # shorter than the window
+    window_start = (
+        select(Turn.created_at)
+        .where(Turn.session_id == session_id)
+        .order_by(desc(Turn.created_at), desc(Turn.turn_id))
+        .offset(window - 1)
+        .limit(1)
+        .scalar_subquery()
+    )
 
-class UserSessionsResponse(BaseModel):
-    session_id: str
-    nlq: str
+    stmt = (
+        select(Turn)
+        .options(joinedload(Turn.execution_log).joinedload(ExecutionLog.query))
+        .where(Turn.session_id == session_id, Turn.created_at < window_start)
+        .order_by(Turn.created_at, Turn.turn_id)
+    )
+    if after_turn_id is not None:
+        stmt = stmt.where(Turn.turn_id > after_turn_id)
+    return list(db_session.scalars(stmt))
 
 
-# Get the list of session by user and first turn nlq
-def get_history_sessions(
-    db_session: Session, user_id: str
-) -> List[UserSessionsResponse]:
+def set_session_summary(
+    db_session: Session, session_id: str, summary: str, summary_turn_id: int
+) -> bool:
     """
-    Get all sessions for a user, along with first NLQ turn for each session.
+    Store the summary of a session up to `summary_turn_id`, unless a summary of
+    more recent turns was stored meanwhile
     """
     try:
-        sessions = db_session.query(UserSession).filter_by(user_id=user_id).all()
-        sessions_list = []
-        if not sessions:
-            return sessions_list
-        for session in sessions:
-            first_turn = (
-                db_session.query(Turn)
-                .filter_by(session_id=session.session_id)
-                .order_by(Turn.created_at)
-                .first()
+        result = db_session.execute(
+            update(UserSession)
+            .where(
+                UserSession.session_id == session_id,
+                func.coalesce(UserSession.summary_turn_id, 0) < summary_turn_id,
             )
-            if first_turn:
-                sessions_list.append(
-                    UserSessionsResponse(
-                        session_id=session.session_id, nlq=f"{first_turn.nlq}"
-                    )
-                )
-        return sessions_list
+            .values(summary=summary, summary_turn_id=summary_turn_id)
+        )
+        db_session.commit()
+        return cast(Any, result).rowcount > 0
     except Exception as e:
-        logger.error(f"Error getting history sessions: {e}")
+        logger.error(f"Error storing the session summary: {e}")
         db_session.rollback()
-        return []
+        return False
+
+
+class UserSessionsResponse(BaseModel):
+    session_id: str
+    nlq: str
+    last_active_at: datetime
 
 
 class SavedQueriesResponse(BaseModel):
@@ -331,43 +347,6 @@ class SavedQueriesResponse(BaseModel):
     saved_by: Optional[str]
 
 
-def get_saved_queries(
-    db_session: Session, user_id: str, filter_type: Optional[str] = "saved"
-) -> List[SavedQueriesResponse]:
-    """
-    Get all saved queries for a user.
-    """
-    try:
-        if filter_type != "all":
-            saved_queries = (
-                db_session.query(SavedQuery).filter_by(user_id=user_id).all()
-            )
-        else:
-            saved_queries = (
-                db_session.query(SavedQuery).filter(SavedQuery.user_id != user_id).all()
-            )
-        saved_queries_list = []
-        if not saved_queries:
-            return saved_queries_list
-
-        for saved_query in saved_queries:
-            saved_queries_list.append(
-                SavedQueriesResponse(
-                    id=saved_query.id,
-                    sql_query_id=saved_query.sqid,
-                    name=saved_query.name,
-                    description=saved_query.description,
-                    saved_for=saved_query.user_id,
-                    saved_by=saved_query.saved_by,
-                )
-            )
-        return saved_queries_list
-    except Exception as e:
-        logger.error(f"Error getting saved queries: {e}")
-        db_session.rollback()
-        return []
-
-
 def get_saved_query_by_id(
     db_session: Session, sqid: str, user_id: str
 ) -> Optional[SavedQuery]:
@@ -420,6 +399,10 @@ def set_execution_status(
         if not execution_log:
             return None
 
+        # A cancelled execution keeps its status, even if the worker reports back
+        if execution_log.status == "CANCELLED":
+            return execution_log
+
         execution_log.status = status
         if status == "SUCCESS":
             execution_log.completed_at = datetime.now()
@@ -432,6 +415,102 @@ def set_execution_status(
         raise e
 
 
+# Statuses of an execution that has not finished yet
+ACTIVE_EXECUTION_STATUSES: tuple[ExecutionStatus, ...] = ("PENDING", "RUNNING")
+
+
+def transition_execution_status(
+    db_session: Session,
+    execution_id: int,
+    status: ExecutionStatus,
+    result: Optional[QueryResults] = None,
+) -> Optional[ExecutionLog]:
+    """
+    Move an execution that has not finished yet to `status`, with a single
+    UPDATE ... RETURNING. The result, if given, is inserted in the same
+    transaction.
+
+    Returns:
+        The updated execution log, or None if the execution had already finished
+        or was cancelled
+    """
+    try:
+        values: dict[Any, Any] = {ExecutionLog.status: status}
+        if status == "SUCCESS":
+            values[ExecutionLog.completed_at] = datetime.now()
+
+        execution_log = db_session.execute(
+            update(ExecutionLog)
+            .where(
+                ExecutionLog.id == execution_id,
+                ExecutionLog.status.in_(ACTIVE_EXECUTION_STATUSES),
+            )
+            .values(values)
+            .returning(ExecutionLog)
+        ).scalar_one_or_none()
+
+        if execution_log and result is not None:
+            db_session.add(build_execution_result(execution_id, result))
+
+        db_session.commit()
+        return execution_log
+    except Exception as e:
+        logger.error(f"Error moving execution {execution_id} to {status}: {e}")
+        db_session.rollback()
+        raise e
+
+
+def set_execution_task_id(
+    db_session: Session, execution_id: int, task_id: str
+) -> None:
+    """
+    Record the celery task executing a query, so that it can be revoked
+    """
+    try:
+        db_session.query(ExecutionLog).filter_by(id=execution_id).update(
+            {ExecutionLog.task_id: task_id}
+        )
+        db_session.commit()
+    except Exception as e:
+        logger.error(f"Error setting execution task id: {e}")
+        db_session.rollback()
+        raise e
+
+
+def set_execution_backend_pid(
+    db_session: Session, execution_id: int, backend_pid: int
+) -> None:
+    """
+    Record the catalog connection executing a query, so that it can be cancelled
+    """
+    try:
+        db_session.query(ExecutionLog).filter_by(id=execution_id).update(
+            {ExecutionLog.backend_pid: backend_pid}
+        )
+        db_session.commit()
+    except Exception as e:
+        logger.error(f"Error setting execution backend pid: {e}")
+        db_session.rollback()
+        raise e
+
+
+def set_execution_logs(
+    db_session: Session, execution_id: int, logs: dict[str, Any]
+) -> None:
+    """
+    Record details of the execution, like the truncation of its result
+    """
+    try:
+        db_session.query(ExecutionLog).filter_by(id=execution_id).update(
+            {ExecutionLog.logs: logs}
+        )
+        db_session.commit()
+    except Exception as e:
+        logger.error(f"Error setting execution logs: {e}")
+        db_session.rollback()
+        raise e
+
+
 def get_execution_log(db_session: Session, execution_id: int) -> Optional[ExecutionLog]:
     """
     Get the execution log for a query.
@@ -540,10 +619,7 @@ def save_execution_result(
     Save the execution result for a query.
     """
     try:
-        result = convert_rows_to_serializable(result)
-        column_order = cast(ColumnOrder, list(result[0].keys()) if result else [])
-        execution_result = ExecutionResult(execution_id=execution_id,
-                                           result=result, column_order=column_order)
+        execution_result = build_execution_result(execution_id, result)
         db_session.add(execution_result)
         db_session.commit()
         return execution_result
@@ -553,6 +629,56 @@ def save_execution_result(
         raise e
 
 
+def build_execution_result(
+    execution_id: int, result: QueryResults
+) -> ExecutionResult:
+    result = convert_rows_to_serializable(result)
+    column_order = cast(ColumnOrder, list(result[0].keys()) if result else [])
+    return ExecutionResult(
+        execution_id=execution_id, result=result, column_order=column_order
+    )
+
+
+class ExecutionResultInfo(BaseModel):
+    id: int
+    column_order: ColumnOrder
+    # Whether rows were dropped to stay within the execution limits
+    truncated: bool = False
+
+
+def get_execution_result_info(
+    db_session: Session, execution_id: int
+) -> Optional[ExecutionResultInfo]:
+    """
+    Get the column order of the saved result of an execution and whether it was
+    truncated, without loading the rows
+    """
+    try:
+        row = db_session.execute(
+            select(
+                ExecutionResult.id,
+                ExecutionResult.column_order,
+                ExecutionLog.logs["truncated"].as_boolean(),
+            )
+            .join(ExecutionLog, ExecutionLog.id == ExecutionResult.execution_id)
+            .where(ExecutionResult.execution_id == execution_id)
+            .order_by(desc(ExecutionResult.id))
+            .limit(1)
+        ).first()
+
+        if not row:
+            return None
+
+        return ExecutionResultInfo(
+            id=row[0], column_order=row[1], truncated=bool(row[2])
+        )
+
+    except Exception as e:
+        logger.error(f"Error getting execution result info: {e}")
+        db_session.rollback()
+        raise e
+
+
 def check_if_sql_query_exist(db_session: Session, sqid: str) -> Optional[SqlQuery]:
     """
     Check if sql query exists in the database
@@ -596,7 +722,8 @@ def create_saved_query(
     Save the query against the user id
     """
     try:
-        saved_query = SavedQuery(
+        saved_query = insert_saved_query(
+            db_session,
             name=name,
             user_id=user_id,
             sqid=sqid,
@@ -604,7 +731,6 @@ def create_saved_query(
             saved_by=saved_by,
             description=description,
         )
-        db_session.add(saved_query)
         db_session.commit()
         return saved_query
     except Exception as e:
@@ -646,42 +772,95 @@ def get_dynamic_query_params(
         return []
 
 
+class SharedQueryResult(BaseModel):
+    sqid: str
+    # Users the query was newly shared with
+    shared_with: List[str]
+    emails_not_found: List[str]
+
+
+def share_saved_query(
+    db_session: Session,
+    sqid: str,
+    name: str,
+    description: Optional[str],
+    user_emails: list[str],
+) -> SharedQueryResult:
+    """
+    Save a query for the users with the given emails, in three statements whatever
+    the number of users. Users who already have the query are skipped, and emails
+    without a user are reported rather than failing the other users.
+    The caller commits.
+    """
+    emails = list(dict.fromkeys(email.strip() for email in user_emails if email.strip()))
+    if not emails:
+        return SharedQueryResult(sqid=sqid, shared_with=[], emails_not_found=[])
+
+    users = db_session.execute(
+        select(User.user_id, User.email).where(User.email.in_(emails))
+    ).all()
+    user_ids = list(dict.fromkeys(user.user_id for user in users))
+    found_emails = {user.email for user in users}
+
+    existing_user_ids = set(
+        db_session.scalars(
+            select(SavedQuery.user_id).where(
+                SavedQuery.sqid == sqid, SavedQuery.user_id.in_(user_ids)
+            )
+        )
+    )
+    new_user_ids = [user_id for user_id in user_ids if user_id not in existing_user_ids]
+
+    if new_user_ids:
+        # A concurrent share of the query with the same user is skipped as well
+        db_session.execute(
+            insert(SavedQuery)
+            .values(
+                [
+                    {
+                        "user_id": user_id,
+                        "sqid": sqid,
+                        "name": name,
+                        "description": description,
+                    }
+                    for user_id in new_user_ids
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=["sqid", "user_id"])
+        )
+
+    return SharedQueryResult(
+        sqid=sqid,
+        shared_with=new_user_ids,
+        emails_not_found=[email for email in emails if email not in found_emails],
+    )
+
+
 def share_query_to_users(
     db_session: Session, query_id: str, user_emails: list[str]
-) -> Optional[SavedQuery]:
+) -> SharedQueryResult:
     try:
         saved_query = db_session.query(SavedQuery).filter_by(sqid=query_id).first()
         if not saved_query:
             raise Exception("Query not found")
 
-        name = saved_query.name
-        description = saved_query.description
-
-        for email in user_emails:
-            users = db_session.query(User).filter_by(
-                email=email).all()
-            if not users:
-                raise Exception("User not found")
-            for user in users:
-                exists = db_session.query(SavedQuery).filter_by(
-                    sqid=query_id, user_id=user.user_id).first()
-                if not exists:
-                    db_session.add(SavedQuery(
-                        user_id = user.user_id,
-                        sqid = query_id,
-                        name = name,
-                        description = description,
-                    ))
-
+        result = share_saved_query(
+            db_session,
+            query_id,
+            saved_query.name,
+            saved_query.description,
+            user_emails,
+        )
         db_session.commit()
-        return saved_query
+        return result
     except Exception as e:
         logger.error(f"Error adding saved queries: {e}")
+        db_session.rollback()
         raise
 
 def add_new_query(
     db_session: Session, query_data: Any, params_data: Any, user_id: str
-) -> str:
+) -> SharedQueryResult:
     try:
         sql_query = SqlQuery(
             sqlquery=query_data['query'],
@@ -711,23 +890,19 @@ def add_new_query(
             sqid=sql_query.sqid
         )
         db_session.add(saved_query)
-
-        for email in query_data['user_emails']:
-            user_ids = [row[0] for row in db_session.query(User.user_id)
-                .filter_by(email=email).all()]
-            if not user_ids:
-                raise AddQueryError("Users not found")
-            for user_id in user_ids:
-                saved_query = SavedQuery(
-                    user_id=user_id,
-                    name=query_data['query_name'],
-                    description=query_data['query_description'],
-                    sqid=sql_query.sqid
-                )
-                db_session.add(saved_query)
+        # The query and the saved query of the user come before the shares
+        db_session.flush()
+
+        result = share_saved_query(
+            db_session,
+            sql_query.sqid,
+            query_data['query_name'],
+            query_data['query_description'],
+            query_data['user_emails'],
+        )
 
         db_session.commit()
-        return sql_query.sqid
+        return result
 
     except AddQueryError as e:
         db_session.rollback()
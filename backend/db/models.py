@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 from typing import Any, List, Literal, Optional
-from sqlalchemy import ForeignKey, String, Text, func
+from sqlalchemy import ForeignKey, Index, String, Text, UniqueConstraint, func
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
@@ -72,6 +72,10 @@ class UserSession(Base):
     last_updated_at: Mapped[Optional[datetime]] = mapped_column(
         default=None, onupdate=func.now()
     )
+    # Rolling summary of the turns older than the conversation window, and the
+    # last turn it covers
+    summary: Mapped[Optional[str]] = mapped_column(Text, default=None)
+    summary_turn_id: Mapped[Optional[int]] = mapped_column(default=None)
 
     # Relationships
     user: Mapped["User"] = relationship(back_populates="sessions", init=False)
@@ -84,6 +88,10 @@ class Turn(Base):
     """Turn model representing individual turns in a session"""
 
     __tablename__ = "turns"
+    __table_args__ = (
+        # Turns are read per session in order, e.g. for the first turn of a session
+        Index("ix_turns_session_id_created_at", "session_id", "created_at"),
+    )
 
     nlq: Mapped[str] = mapped_column()
     execution_log_id: Mapped[int] = mapped_column(
@@ -93,7 +101,7 @@ class Turn(Base):
 
     # Fields with Default values
     session_id: Mapped[str] = mapped_column(
-        ForeignKey("sessions.session_id"), default_factory=get_uuid_str, index=True
+        ForeignKey("sessions.session_id"), default_factory=get_uuid_str
     )
     turn_id: Mapped[int] = mapped_column(
         primary_key=True, autoincrement=True, default=None
@@ -129,11 +137,31 @@ class SavedQuery(Base):
     """Saved Queries model for users to store queries"""
 
     __tablename__ = "saved_queries"
+    __table_args__ = (
+        # A query is saved at most once per user
+        UniqueConstraint("sqid", "user_id", name="uq_saved_queries_sqid_user_id"),
+        # Saved queries are listed per user, most recent first
+        Index("ix_saved_queries_user_id_id", "user_id", "id"),
+        # Substring search on the name and description
+        Index(
+            "ix_saved_queries_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_saved_queries_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+    )
+
     # Fields without defaults
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, init=False)
     name: Mapped[str] = mapped_column()
     sqid: Mapped[str] = mapped_column(ForeignKey("sql_queries.sqid"), index=True)
-    user_id: Mapped[str] = mapped_column(ForeignKey("users.user_id"), index=True)
+    user_id: Mapped[str] = mapped_column(ForeignKey("users.user_id"))
     created_at: Mapped[datetime] = mapped_column(insert_default=func.now(), init=False)
 
     # Relationships
@@ -165,7 +193,7 @@ class SavedQuery(Base):
         }
 
 
-ExecutionStatus = Literal["SUCCESS", "FAILED", "PENDING", "RUNNING"]
+ExecutionStatus = Literal["SUCCESS", "FAILED", "PENDING", "RUNNING", "CANCELLED"]
 
 
 class ExecutionLog(Base):
@@ -183,6 +211,9 @@ class ExecutionLog(Base):
     # Fields with Default values
     notify_to: Mapped[list[str]] = mapped_column(default_factory=list)
     logs: Mapped[Optional[dict[str, Any]]] = mapped_column(default=None, init=False)
+    # Celery task running the query, and the catalog connection it runs on
+    task_id: Mapped[Optional[str]] = mapped_column(default=None, init=False)
+    backend_pid: Mapped[Optional[int]] = mapped_column(default=None, init=False)
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, init=False)
     created_at: Mapped[datetime] = mapped_column(insert_default=func.now(), init=False)
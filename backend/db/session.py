@@ -1,4 +1,11 @@
-from sqlalchemy import create_engine
+from typing import Any, Optional
+from sqlalchemy import QueuePool, create_engine
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from db.config import Config
 from sqlalchemy.orm import sessionmaker
 
@@ -6,14 +13,64 @@ from sqlalchemy.orm import sessionmaker
 class Database:
 
     def __init__(self, config: Config):
+        self.config = config
+        self.create_engine(config.SQLALCHEMY_ENGINE_OPTIONS)
+
+        # Created on first use, only the server runs an event loop
+        self.async_engine: Optional[AsyncEngine] = None
+        self.AsyncSessionLocal: Optional[async_sessionmaker[AsyncSession]] = None
+
+    def create_engine(self, engine_options: dict[str, Any]):
         self.engine = create_engine(
-            config.SQLALCHEMY_DATABASE_URI, **config.SQLALCHEMY_ENGINE_OPTIONS
+            self.config.SQLALCHEMY_DATABASE_URI, **engine_options
         )
 
         self.SessionLocal = sessionmaker(
             bind=self.engine, autocommit=False, autoflush=False
         )
 
-    def get_session(self):
-        session = self.SessionLocal()
+    def resize_pool(self, pool_size: int, max_overflow: int):
+        """
+        Replace the engine by one with a pool of the given size, e.g. the number of
+        tasks a worker process runs at once
+        """
+        self.engine.dispose()
+        self.create_engine(
+            {
+                **self.config.SQLALCHEMY_ENGINE_OPTIONS,
+                "pool_size": pool_size,
+                "max_overflow": max_overflow,
+            }
+        )
+
+    def get_pool_status(self) -> dict[str, int]:
+        pool = self.engine.pool
+        if not isinstance(pool, QueuePool):
+            return {}
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+        }
+
+    def get_session(self, **options):
+        session = self.SessionLocal(**options)
         return session
+
+    def get_async_session(self, **options) -> AsyncSession:
+        if self.AsyncSessionLocal is None:
+            self.async_engine = create_async_engine(
+                self.config.SQLALCHEMY_ASYNC_DATABASE_URI,
+                **self.config.SQLALCHEMY_ASYNC_ENGINE_OPTIONS,
+            )
+            # Lazy loads are not possible once the handler awaits, so the loaded
+            # objects stay usable after a commit
+            self.AsyncSessionLocal = async_sessionmaker(
+                bind=self.async_engine, autoflush=False, expire_on_commit=False
+            )
+        return self.AsyncSessionLocal(**options)
+
+    async def dispose_async_engine(self):
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
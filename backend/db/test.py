@@ -0,0 +1,318 @@
+import unittest
+from datetime import datetime, timedelta
+from typing import Any, cast
+
+from sqlalchemy import Engine, create_engine, event, func, insert, literal_column, select
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from .async_queries import (
+    build_chat_history,
+    get_chat_history_page,
+    get_session_for_user,
+    select_chat_history,
+    select_saved_queries,
+)
+from .db_queries import (
+    create_saved_query,
+    get_recent_turns,
+    share_query_to_users,
+    get_turns_to_summarize,
+    set_session_summary,
+)
+from .models import (
+    Base,
+    ExecutionLog,
+    SavedQuery,
+    SqlQuery,
+    Turn,
+    User,
+    UserSession,
+)
+
+TURNS = 20
+SESSION_ID = "session"
+
+
+# The tables are created on SQLite, which stores the Postgres types as text
+@compiles(JSONB, "sqlite")
+@compiles(ARRAY, "sqlite")
+def compile_as_text(*_, **__):
+    return "TEXT"
+
+
+class AsyncSessionAdapter:
+    """
+    Runs the queries of an AsyncSession on a Session, as there is no async SQLite
+    driver here
+    """
+
+    def __init__(self, db_session: Session):
+        self.db_session = db_session
+
+    async def execute(self, stmt):
+        return self.db_session.execute(stmt)
+
+    async def rollback(self):
+        self.db_session.rollback()
+
+    async def run_sync(self, fn, *args):
+        return fn(self.db_session, *args)
+
+
+class StatementCounter:
+
+    def __init__(self, engine: Engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *_):
+        self.count += 1
+
+
+class TestChatHistoryQueries(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(
+            self.engine,
+            tables=[
+                Base.metadata.tables[name]
+                for name in [
+                    "users",
+                    "sessions",
+                    "sql_queries",
+                    "execution_logs",
+                    "turns",
+                    "saved_queries",
+                ]
+            ],
+        )
+        self.addCleanup(self.engine.dispose)
+
+        started_at = datetime(2026, 10, 19, 9, 0)
+        with Session(self.engine) as db_session:
+            db_session.add(UserSession(user_id="user", session_id=SESSION_ID))
+            for index in range(TURNS):
+                db_session.add(
+                    SqlQuery(
+                        sqlquery=f"SELECT {index}",
+                        database_used="karya_db",
+                        sqid=f"query-{index}",
+                    )
+                )
+                # SQLite can't bind the list of the notify_to ARRAY
+                db_session.execute(
+                    insert(ExecutionLog).values(
+                        id=index + 1,
+                        status="SUCCESS",
+                        query_id=f"query-{index}",
+                        executed_by="user",
+                        query_params={},
+                        notify_to=literal_column("''"),
+                        created_at=started_at,
+                    )
+                )
+                db_session.add(
+                    Turn(
+                        nlq=f"Question {index}",
+                        execution_log_id=index + 1,
+                        database_used="karya_db",
+                        session_id=SESSION_ID,
+                        created_at=started_at + timedelta(minutes=index),
+                    )
+                )
+            db_session.commit()
+
+        self.statements = StatementCounter(self.engine)
+
+    def test_chat_history_single_query(self):
+        with Session(self.engine) as db_session:
+            turns = db_session.execute(select_chat_history(SESSION_ID)).all()
+            history = build_chat_history(SESSION_ID, turns)
+
+        self.assertEqual(self.statements.count, 1)
+        self.assertEqual(len(history), 2 * TURNS)
+        self.assertEqual(history[0].message, "Question 0")
+        self.assertEqual(history[-1].query, f"SELECT {TURNS - 1}")
+        self.assertEqual(history[-1].sql_query_id, f"query-{TURNS - 1}")
+
+    async def test_chat_history_pages(self):
+        pages = []
+        before = None
+        with Session(self.engine) as db_session:
+            while True:
+                history, before = await get_chat_history_page(
+                    AsyncSessionAdapter(db_session), SESSION_ID, 8, before  # type: ignore
+                )
+                pages.append([message.message for message in history[::2]])
+                if not before:
+                    break
+
+        self.assertEqual(self.statements.count, 3)
+        self.assertEqual([len(page) for page in pages], [8, 8, 4])
+        self.assertEqual(pages[0][0], f"Question {TURNS - 8}")
+        self.assertEqual(pages[-1][0], "Question 0")
+
+    async def test_session_for_user(self):
+        with Session(self.engine) as db_session:
+            async_session = cast(Any, AsyncSessionAdapter(db_session))
+            session = await get_session_for_user(async_session, "user", SESSION_ID)
+            self.assertIsNotNone(session)
+            self.assertIsNone(
+                await get_session_for_user(async_session, "other", SESSION_ID)
+            )
+
+    def test_recent_turns_single_query(self):
+        with Session(self.engine) as db_session:
+            turns = get_recent_turns(db_session, SESSION_ID, 5)
+            queries = [turn.execution_log.query.sqlquery for turn in turns]
+
+        self.assertEqual(self.statements.count, 1)
+        self.assertEqual(
+            queries, [f"SELECT {index}" for index in range(TURNS - 5, TURNS)]
+        )
+
+    def test_turns_to_summarize(self):
+        with Session(self.engine) as db_session:
+            turns = get_turns_to_summarize(db_session, SESSION_ID, 5)
+            self.assertEqual(
+                [turn.nlq for turn in turns],
+                [f"Question {index}" for index in range(TURNS - 5)],
+            )
+
+            self.assertTrue(
+                set_session_summary(db_session, SESSION_ID, "Summary", turns[-1].turn_id)
+            )
+            # An older summary doesn't replace a newer one
+            self.assertFalse(
+                set_session_summary(db_session, SESSION_ID, "Older", turns[0].turn_id)
+            )
+
+            session = db_session.get(UserSession, SESSION_ID)
+            assert session
+            self.assertEqual(session.summary, "Summary")
+            self.assertEqual(
+                get_turns_to_summarize(
+                    db_session, SESSION_ID, 5, session.summary_turn_id
+                ),
+                [],
+            )
+            self.assertEqual(get_turns_to_summarize(db_session, SESSION_ID, TURNS), [])
+
+
+class TestSavedQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(
+            self.engine,
+            tables=[
+                Base.metadata.tables[name]
+                for name in ["users", "sql_queries", "saved_queries"]
+            ],
+        )
+        self.addCleanup(self.engine.dispose)
+
+        names = ["Workers per project", "Payments_2025", "Payments 2025", "Churn"]
+        with Session(self.engine) as db_session:
+            for index, name in enumerate(names):
+                db_session.add(
+                    SqlQuery(
+                        sqlquery=f"SELECT {index}",
+                        database_used="karya_db",
+                        sqid=f"query-{index}",
+                    )
+                )
+                db_session.add(
+                    SavedQuery(
+                        name=name,
+                        sqid=f"query-{index}",
+                        user_id="user",
+                        description="Monthly report" if index == 3 else None,
+                    )
+                )
+            db_session.add(
+                SavedQuery(name="Shared", sqid="query-0", user_id="other")
+            )
+            db_session.commit()
+
+    def get_names(self, **kwargs) -> list[str]:
+        with Session(self.engine) as db_session:
+            rows = db_session.execute(select_saved_queries("user", **kwargs))
+            return [row.name for row in rows]
+
+    def test_most_recent_first(self):
+        self.assertEqual(
+            self.get_names(),
+            ["Churn", "Payments 2025", "Payments_2025", "Workers per project"],
+        )
+        self.assertEqual(self.get_names(filter_type="all"), ["Shared"])
+
+    def test_pages(self):
+        self.assertEqual(self.get_names(limit=2), ["Churn", "Payments 2025"])
+        self.assertEqual(
+            self.get_names(limit=2, before=3), ["Payments_2025", "Workers per project"]
+        )
+
+    def test_search(self):
+        self.assertEqual(
+            self.get_names(search="payments"), ["Payments 2025", "Payments_2025"]
+        )
+        # LIKE wildcards in the search are matched literally
+        self.assertEqual(self.get_names(search="s_2"), ["Payments_2025"])
+        self.assertEqual(self.get_names(search="monthly"), ["Churn"])
+
+    def test_repeated_save_returns_saved_query(self):
+        with Session(self.engine) as db_session:
+            saved_query = create_saved_query(
+                db_session,
+                name="Payments again",
+                user_id="user",
+                sqid="query-1",
+                turn_id=None,
+                saved_by="user",
+                description=None,
+            )
+
+            assert saved_query is not None
+            self.assertEqual(saved_query.name, "Payments_2025")
+        self.assertEqual(len(self.get_names()), 4)
+
+    def test_share_in_bulk(self):
+        with Session(self.engine) as db_session:
+            for index in range(100):
+                db_session.add(
+                    User(name=None, user_id=f"member-{index}", email=f"{index}@karya.in")
+                )
+            db_session.add(User(name=None, user_id="other", email="other@karya.in"))
+            db_session.commit()
+
+            emails = [f"{index}@karya.in" for index in range(100)]
+            statements = StatementCounter(self.engine)
+            result = share_query_to_users(
+                db_session,
+                "query-0",
+                [*emails, "other@karya.in", "missing@karya.in", "0@karya.in"],
+            )
+
+            # The saved query, the users, the existing shares and the insert
+            self.assertEqual(statements.count, 4)
+            self.assertEqual(len(result.shared_with), 100)
+            self.assertNotIn("other", result.shared_with)
+            self.assertEqual(result.emails_not_found, ["missing@karya.in"])
+
+            # Sharing again adds nothing
+            result = share_query_to_users(db_session, "query-0", emails[:10])
+            self.assertEqual(result.shared_with, [])
+            self.assertEqual(
+                db_session.scalar(
+                    select(func.count()).where(SavedQuery.sqid == "query-0")
+                ),
+                102,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
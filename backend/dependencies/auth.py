@@ -1,15 +1,16 @@
+import asyncio
 from dataclasses import dataclass, field
 import os
-from typing import Annotated, List, Optional
+from typing import Annotated, List, Optional, cast
 from fastapi import Cookie, HTTPException, Header, Depends
 from google.generativeai.client import Any
-from sqlalchemy.orm import Session
 from db.db_queries import get_or_create_user
 from db.models import User
 from rbac.check_permissions import ColumnScope
 from dependencies.db import get_db_session
 from utils.auth import get_auth_provider
-from utils.parse_catalog import roles_validator
+from utils.auth_cache import AuthCache
+from utils.parse_catalog import is_valid_role
 
 
 auth_handler = get_auth_provider()
@@ -30,9 +31,24 @@ class AuthenticatedUserInfo:
     scopes: dict[str, List[ColumnScope]] = field(default_factory=dict)
 
 
-async def verify_token(
+def get_request_token(
     cookie_token: Annotated[str | None, Cookie(alias=access_token_cookie)] = None,
     authorization: Annotated[str | None, Header()] = None,
+) -> Optional[str]:
+    """
+    The access token of the request, from the cookie or the bearer authorization
+    header
+    """
+    if access_token_cookie and cookie_token:
+        return cookie_token
+    if authorization:
+        # Extract the bearer token from the authorization header
+        return authorization.split(" ")[-1]
+    return None
+
+
+async def verify_token(
+    token: Annotated[Optional[str], Depends(get_request_token)],
 ):
     """
     Verifies the user token and returns the user details.
@@ -46,18 +62,12 @@ async def verify_token(
     Raises:
         HTTPException: If the token is invalid or missing (with status code 401).
     """
-    try:
-        token: str
-        if access_token_cookie and cookie_token:
-            token = cookie_token
-        elif authorization:
-            # Extract the bearer token from the authorization header
-            token = authorization.split(" ")[1]
-        else:
-            raise HTTPException(
-                status_code=401, detail="Unauthorized access. No token provided."
-            )
+    if not token:
+        raise HTTPException(
+            status_code=401, detail="Unauthorized access. No token provided."
+        )
 
+    try:
         payload = auth_handler.validate_token(token)
 
         if not payload:
@@ -72,15 +82,43 @@ async def verify_token(
         )
 
 
+# Users recently known to exist in the app database, so that they aren't upserted
+# again for every new token. Bounded and expiring like the tokens.
+known_users_cache = AuthCache[bool]()
+
+user_info_cache = AuthCache[AuthenticatedUserInfo]()
+
+
+def upsert_user(user_id: str, name: Optional[str], email: Optional[str]) -> User:
+    db = get_db_session()
+    try:
+        return get_or_create_user(db, user_id, name, email)
+    finally:
+        db.close()
+
+
+async def get_user(user_id: str, name: Optional[str], email: Optional[str]) -> User:
+    """
+    The user of a token, created in the app database unless the user was seen
+    recently by this process
+    """
+    if known_users_cache.get(user_id):
+        return User(user_id=user_id, name=name, email=email)
+
+    user = await asyncio.to_thread(upsert_user, user_id, name, email)
+    known_users_cache.set(user_id, True)
+    return user
+
+
 async def get_authenticated_user_info(
-    db: Annotated[Session, Depends(get_db_session)],
-    auth_result: Annotated[TokenVerificationResult, Depends(verify_token)],
+    token: Annotated[Optional[str], Depends(get_request_token)],
 ) -> AuthenticatedUserInfo:
     """
-    Dependency that extracts user_id from the token verification result.
+    Dependency that extracts user_id from the token verification result. The user
+    resolved from a token is cached until the token expires.
 
     Args:
-        auth_result: The token verification result from verify_token
+        token: The access token of the request
 
     Returns:
         AuthenticatedUserInfo: The user information extracted from the token.
@@ -88,8 +126,13 @@ async def get_authenticated_user_info(
     Raises:
         HTTPException: If the token is invalid (code: 401) or user information is missing (code: 403).
     """
+    if token:
+        user_info = user_info_cache.get(token)
+        if user_info:
+            return user_info
+
+    auth_result = await verify_token(token)
     if not auth_result.is_valid or not auth_result.payload:
-        db.close()
         raise HTTPException(status_code=403, detail="Could not validate credentials")
 
     payload = auth_result.payload
@@ -99,24 +142,19 @@ async def get_authenticated_user_info(
     email = payload.get("email")
     name = payload.get("name")
     if not user_id:
-        db.close()
         raise HTTPException(
             status_code=403, detail="Invalid token: Missing user identification"
         )
 
-    user = get_or_create_user(db, user_id, name, email)
-
     # Extract the role field from the token and ensure it is a valid supported field
-    try:
-        role = payload[auth_handler.nlq_role_field]
-        roles_validator.validate(role)
-    except Exception as e:
+    role = payload.get(auth_handler.nlq_role_field)
+    if not isinstance(role, str) or not is_valid_role(role):
         raise HTTPException(
             status_code=403,
-            detail=f"Invalid Token: Missing or Invalid Role in token payload - {e}",
+            detail=f"Invalid Token: Missing or Invalid Role in token payload - {role!r}",
         )
-    finally:
-        db.close()
+
+    user = await get_user(user_id, name, email)
 
     scopes_json = payload.get("scopes", {})
     common_scopes = payload.get("common_scopes", [])
@@ -126,9 +164,14 @@ async def get_authenticated_user_info(
         scopes_json[table_name] = [ColumnScope(**scope) for scope in column_scopes]
         scopes_json[table_name].append(*common_scopes)
 
-    if not user_id:
-        raise HTTPException(
-            status_code=403, detail="Invalid token: Missing user identification"
-        )
-
-    return AuthenticatedUserInfo(user=user, user_id=user_id, role=role, scopes=scopes)
+    user_info = AuthenticatedUserInfo(
+        user=user, user_id=user_id, role=role, scopes=scopes
+    )
+
+    expires_at = payload.get("exp")
+    user_info_cache.set(
+        cast(str, token),
+        user_info,
+        float(expires_at) if isinstance(expires_at, (int, float)) else None,
+    )
+    return user_info
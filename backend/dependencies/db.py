@@ -1,5 +1,6 @@
-from typing import Optional, cast
+from typing import AsyncIterator, Optional, cast
 from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from db.config import Config
 from db.session import Database
@@ -9,8 +10,18 @@ db = Database(config)
 
 
 # Dependency to get database session
-def get_db_session():
-    return db.get_session()
+def get_db_session(**options):
+    return db.get_session(**options)
+
+
+async def get_async_db_session() -> AsyncIterator[AsyncSession]:
+    """
+    Session for handlers that must not block the event loop on the database. It
+    is closed once the handler has returned, so it must not be used by the body of
+    a streaming response.
+    """
+    async with db.get_async_session() as db_session:
+        yield db_session
 
 
 def get_db_session_from_request(request: Request):
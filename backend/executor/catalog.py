@@ -1,5 +1,43 @@
+from os import environ
 from typing import Literal, Dict, Any, Optional
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
+
+# Limits applied to catalogs that don't configure their own
+DEFAULT_STATEMENT_TIMEOUT = float(environ.get("QUERY_STATEMENT_TIMEOUT", 60 * 60))
+DEFAULT_MAX_ROWS = int(environ.get("QUERY_MAX_ROWS", 0)) or None
+DEFAULT_MAX_RESULT_BYTES = int(environ.get("QUERY_MAX_RESULT_BYTES", 0)) or None
+
+
+@dataclass
+class ExecutionLimits:
+    """
+    Limits on a single query execution. `statement_timeout` is in seconds. A limit
+    of None is not enforced. The plan limits are checked against the estimates of
+    the planner before a generated query is executed.
+    """
+
+    statement_timeout: Optional[float] = DEFAULT_STATEMENT_TIMEOUT
+    max_rows: Optional[int] = DEFAULT_MAX_ROWS
+    max_result_bytes: Optional[int] = DEFAULT_MAX_RESULT_BYTES
+    max_plan_cost: Optional[float] = None
+    max_plan_rows: Optional[int] = None
+    max_unfiltered_scan_rows: Optional[int] = None
+
+    def has_cost_limits(self) -> bool:
+        return any(
+            limit is not None
+            for limit in (
+                self.max_plan_cost,
+                self.max_plan_rows,
+                self.max_unfiltered_scan_rows,
+            )
+        )
+
+    def with_overrides(self, overrides: Dict[str, Any]) -> "ExecutionLimits":
+        values = {
+            f.name: overrides.get(f.name, getattr(self, f.name)) for f in fields(self)
+        }
+        return ExecutionLimits(**values)
 
 
 @dataclass
@@ -16,3 +54,17 @@ class Catalog:
     annotations: Dict[str, Dict[str, str]] = field(default_factory=dict)
     ephemeral: bool = field(default=False)
     connection_params: Dict[str, Any] = field(default_factory=dict)
+    # Execution limits of the catalog, with per role overrides under "roles"
+    limits: Dict[str, Any] = field(default_factory=dict)
+    # Maximum number of queries running at once, in "total" and per execution origin
+    concurrency: Dict[str, int] = field(default_factory=dict)
+
+    def get_execution_limits(self, role: Optional[str] = None) -> ExecutionLimits:
+        """
+        Limits for queries executed by a role. Role limits take precedence over the
+        limits of the catalog, which take precedence over the defaults.
+        """
+        limits = ExecutionLimits().with_overrides(self.limits)
+        if role:
+            limits = limits.with_overrides(self.limits.get("roles", {}).get(role, {}))
+        return limits
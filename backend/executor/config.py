@@ -1,10 +1,34 @@
 from dataclasses import dataclass, field
-from typing import Callable, Optional
+from typing import Awaitable, Callable, Literal, Optional
 
 from executor.status import AgentStatus
 from dependencies.auth import AuthenticatedUserInfo
 
+# Steps of the agent whose LLM output is streamed to the user as it is generated
+TokenStage = Literal["INTENT", "ANSWER"]
+
+# Receives the partial output of the LLM as it is generated
+DeltaCallback = Callable[[str], Awaitable[None]]
+
+
 @dataclass
 class AgentConfig:
     user_info: AuthenticatedUserInfo
-    update_callback: Optional[Callable[[AgentStatus], None]] = field(default=None)
+    update_callback: Optional[Callable[[AgentStatus], Awaitable[None]]] = field(
+        default=None
+    )
+    token_callback: Optional[Callable[[TokenStage, str], Awaitable[None]]] = field(
+        default=None
+    )
+    # Called with the id of the execution log of every query submitted by the agent
+    execution_callback: Optional[Callable[[int], None]] = field(default=None)
+
+    def get_token_callback(self, stage: TokenStage) -> Optional[DeltaCallback]:
+        """
+        Callback receiving the partial output of the LLM for the given stage, if
+        token streaming is enabled
+        """
+        token_callback = self.token_callback
+        if not token_callback:
+            return None
+        return lambda delta: token_callback(stage, delta)
@@ -0,0 +1,159 @@
+"""
+The part of a session the agent prompts see. Long sessions would otherwise replay
+every turn, with its SQL, in the prompts of each new question, so only the most
+recent turns are loaded, and the older ones are folded into a rolling summary of
+the session.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from os import environ
+from typing import List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from db.db_queries import get_recent_turns, get_turns_to_summarize, set_session_summary
+from db.models import Turn, UserSession
+from dependencies.db import get_db_session
+from executor.tools import AgentTools
+from utils.logger import get_logger
+
+# Most recent turns of a session sent to the prompts
+CONVERSATION_WINDOW_TURNS = int(environ.get("CONVERSATION_WINDOW_TURNS", 10))
+# Estimated tokens of the turns sent to the prompts (0 disables the budget)
+CONVERSATION_WINDOW_TOKENS = int(environ.get("CONVERSATION_WINDOW_TOKENS", 4000))
+# Summarize the turns that left the window with the LLM
+CONVERSATION_SUMMARY_ENABLED = (
+    environ.get("CONVERSATION_SUMMARY_ENABLED", "false").lower() == "true"
+)
+# Turns that must have left the window before they are summarized, in one LLM call
+CONVERSATION_SUMMARY_BATCH_TURNS = max(
+    1, int(environ.get("CONVERSATION_SUMMARY_BATCH_TURNS", 5))
+)
+
+logger = get_logger("[CONVERSATION]")
+
+# Keeps a reference to the running summary updates, which nothing awaits
+_summary_updates: Set[asyncio.Task] = set()
+
+
+@dataclass
+class ConversationContext:
+    # Turns in the window, oldest first
+    turns: List[Turn] = field(default_factory=list)
+    # Summary of the turns before the window
+    summary: Optional[str] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return len(self.turns) == 0
+
+    @property
+    def last_turn(self) -> Optional[Turn]:
+        return self.turns[-1] if self.turns else None
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Rough token count of a text, about four characters per token
+    """
+    return len(text or "") // 4 + 1
+
+
+def estimate_turn_tokens(turn: Turn) -> int:
+    sql = turn.execution_log.query.sqlquery if turn.execution_log else None
+    return estimate_tokens(turn.nlq) + estimate_tokens(sql)
+
+
+def fit_token_budget(turns: List[Turn], max_tokens: int) -> List[Turn]:
+    """
+    The most recent turns that fit in `max_tokens`. The last turn is always kept,
+    the follow up questions refer to it.
+    """
+    if max_tokens <= 0 or not turns:
+        return turns
+
+    tokens = 0
+    start = len(turns)
+    while start > 0:
+        tokens += estimate_turn_tokens(turns[start - 1])
+        if tokens > max_tokens and start < len(turns):
+            break
+        start -= 1
+    return turns[start:]
+
+
+def load_conversation(
+    db_session: Session,
+    session: UserSession,
+    max_turns: int = CONVERSATION_WINDOW_TURNS,
+    max_tokens: int = CONVERSATION_WINDOW_TOKENS,
+) -> ConversationContext:
+    """
+    Load the most recent turns of a session, along with their SQL, in a single
+    query, and keep those within the token budget
+    """
+    turns = get_recent_turns(db_session, session.session_id, max_turns)
+    return ConversationContext(
+        turns=fit_token_budget(turns, max_tokens),
+        summary=session.summary if CONVERSATION_SUMMARY_ENABLED else None,
+    )
+
+
+def get_summary_batch(
+    db_session: Session, session_id: str, window: int, batch_turns: int
+) -> tuple[Optional[str], List[Turn]]:
+    """
+    Get the summary of a session and the turns that left the window since, if
+    there are at least `batch_turns` of them
+    """
+    session = db_session.get(UserSession, session_id)
+    if not session:
+        return None, []
+
+    turns = get_turns_to_summarize(
+        db_session, session_id, window, session.summary_turn_id
+    )
+    if len(turns) < batch_turns:
+        return session.summary, []
+    return session.summary, turns
+
+
+async def update_conversation_summary(
+    tools: AgentTools,
+    session_id: str,
+    window: int = CONVERSATION_WINDOW_TURNS,
+    batch_turns: int = CONVERSATION_SUMMARY_BATCH_TURNS,
+) -> None:
+    """
+    Fold the turns that left the window since the last update into the summary of
+    the session, once there are `batch_turns` of them
+    """
+    db_session = get_db_session()
+    try:
+        summary, turns = await asyncio.to_thread(
+            get_summary_batch, db_session, session_id, window, batch_turns
+        )
+        if not turns:
+            return
+
+        summary = await tools.summarize_conversation(summary, turns)
+        await asyncio.to_thread(
+            set_session_summary, db_session, session_id, summary, turns[-1].turn_id
+        )
+    except Exception as e:
+        logger.error(f"Failed to update the summary of session {session_id}: {e}")
+    finally:
+        db_session.close()
+
+
+def schedule_conversation_summary(tools: AgentTools, session_id: str) -> None:
+    """
+    Update the summary of a session in the background, after its response was sent
+    """
+    if not CONVERSATION_SUMMARY_ENABLED:
+        return
+
+    task = asyncio.create_task(update_conversation_summary(tools, session_id))
+    _summary_updates.add(task)
+    task.add_done_callback(_summary_updates.discard)
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 
 from db.models import UserSession
 from executor.config import AgentConfig
+from executor.conversation import load_conversation
 from executor.tools import AgentTools
 
 from executor.catalog import Catalog
@@ -57,10 +58,14 @@ class NLQExecutor:
         if not self.nlq:
             self.nlq = nlq
 
+        # The prompts read the recent turns and their SQL
+        conversation = load_conversation(self.db_session, self.session)
+
         return await agentic_loop(
             self.nlq,
             self.catalogs,
             self.tools,
             self.config,
             session=self.session,
+            conversation=conversation,
         )
@@ -0,0 +1,48 @@
+import asyncio
+from os import environ
+from typing import AsyncIterator, cast
+
+# Maximum number of events of an agent run waiting to be consumed
+AGENT_EVENT_BUS_SIZE = int(environ.get("AGENT_EVENT_BUS_SIZE", 64))
+
+_CLOSED = object()
+
+
+class AgentEventBus[T]:
+    """
+    Ordered and bounded delivery of the events of an agent run to a single consumer.
+    Publishing waits while the bus is full, so a slow consumer slows down the agent
+    instead of events piling up in memory. The events in the bus when it is closed
+    are delivered, but the event of a publisher still waiting for room at that
+    point may be dropped, as are the events published after the close.
+    """
+
+    def __init__(self, maxsize: int = AGENT_EVENT_BUS_SIZE) -> None:
+        self._queue: asyncio.Queue[T | object] = asyncio.Queue(maxsize)
+        self.closed = False
+
+    async def publish(self, event: T) -> None:
+        if self.closed:
+            return
+        await self._queue.put(event)
+
+    def close(self) -> None:
+        """
+        Stop the consumer once the published events have been delivered
+        """
+        if self.closed:
+            return
+
+        self.closed = True
+        try:
+            self._queue.put_nowait(_CLOSED)
+        except asyncio.QueueFull:
+            # The consumer stops once it has drained the queue
+            pass
+
+    async def __aiter__(self) -> AsyncIterator[T]:
+        while not (self.closed and self._queue.empty()):
+            event = await self._queue.get()
+            if event is _CLOSED:
+                return
+            yield cast(T, event)
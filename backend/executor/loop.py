@@ -1,8 +1,10 @@
+import asyncio
 from dataclasses import dataclass
 from typing import Any, List, Optional, Union, cast
 from db.models import ExecutionLog, UserSession
 from executor import catalog
 from executor.config import AgentConfig
+from executor.conversation import ConversationContext
 from executor.errors import UnRecoverableError
 from executor.models import QueryTypeLiteral
 from rbac.check_permissions import PrivilageCheckResult
@@ -10,12 +12,18 @@ from utils.query_pipeline import QueryExecutionPipeline, QueryExecutionResult, Q
 from utils.parse_catalog import parsed_catalogs
 from executor.catalog import Catalog
 from executor.state import AgentState, QueryResults
+from executor.stages import StageGraph
 from executor.status import AgentStatus
 from executor.tools import AgentTools
 from utils.logger import get_logger
-import time
 
-from utils.cache import get_cached_categorical_values, get_or_execute_query_result
+from utils.cache import get_cached_categorical_values, wait_for_query_result
+from utils.nlq_cache import (
+    CachedNLQResult,
+    get_cached_nlq_result,
+    invalidate_nlq_result,
+    save_nlq_result,
+)
 
 TURN_LIMIT = 3
 MAX_HEALING_ATTEMPTS = 5
@@ -42,6 +50,59 @@ class AgenticLoopFailure(Exception):
     reason: str
 
 
+def load_relevant_tables(state: AgentState, relevant_table_names: List[str]) -> None:
+    """
+    Populate the schemas of the relevant tables, along with the cached values of
+    categorical tables, on the agent state
+    """
+    assert state.relevant_catalog, "Relevant catalog not set"
+
+    relevant_tables = {}
+    categorical_tables = {}
+    json_schema = parsed_catalogs.json_schema
+
+    relevant_tables_schemas = filter(
+        lambda x: x[0] in relevant_table_names,
+        state.relevant_catalog.schema.items(),
+    )
+
+    for table_name, table_info in relevant_tables_schemas:
+        if table_info.get("is_categorical"):
+            categorical_info = get_cached_categorical_values(
+                state.relevant_catalog, table_name
+            )
+            categorical_tables[table_name] = categorical_info
+
+        for column in table_info["columns"]:
+            column = cast(dict[str, Any], column)
+            json_schema_id = column.get("json_schema_id")
+
+            if json_schema_id and json_schema_id in json_schema:
+                column["schema"] = json_schema[json_schema_id]
+
+        relevant_tables[table_name] = table_info
+    state.relevant_tables = relevant_tables
+    state.categorical_tables = categorical_tables
+
+
+def apply_cached_nlq_result(
+    state: AgentState, cached: CachedNLQResult, catalogs: List[Catalog]
+) -> bool:
+    """
+    Restore the outcome of a previous run on the agent state, so that only privilege
+    checks and execution remain. Returns False if the cached catalog no longer exists.
+    """
+    catalog = next((catalog for catalog in catalogs if catalog.name == cached.catalog), None)
+    if not catalog:
+        return False
+
+    state.intent = cached.intent
+    state.relevant_catalog = catalog
+    load_relevant_tables(state, cached.tables)
+    state.query = cached.sql
+    return True
+
+
 async def execute_query_with_healing(
     state: AgentState,
     query: str,
@@ -56,6 +117,7 @@ async def execute_query_with_healing(
         user_id=user_id,
         active_role=config.user_info.role,
         scopes=config.user_info.scopes,
+        on_execution_submitted=config.execution_callback,
     )
 
     query_to_execute = query
@@ -66,7 +128,7 @@ async def execute_query_with_healing(
         while healing_attempts <= MAX_HEALING_ATTEMPTS:
             try:
                 logger.debug(f"Executing query: {query_to_execute}")
-                execution_result = get_or_execute_query_result(
+                execution_result = await wait_for_query_result(
                     sql_query=query_to_execute,
                     catalog=state.relevant_catalog,
                     execute_query=query_pipeline.check_and_execute,
@@ -80,6 +142,7 @@ async def execute_query_with_healing(
 
                 if isinstance(execution_result, QueryExecutionSuccessResult):
                     logger.debug(f"Query execution succeeded: {execution_result}")
+                    state.query = query_to_execute
                     return execution_result
 
                 # If the query execution failed unrecoverably, raise an error
@@ -135,74 +198,194 @@ async def execute_query_with_healing(
     raise UnRecoverableError("Failed to execute this query")
 
 
+@dataclass
+class AgentPlan:
+    nlq_type: QueryTypeLiteral
+    state: AgentState
+    cached_result: Optional[CachedNLQResult] = None
+
+
+def get_catalog_by_name(catalogs: List[Catalog], name: str) -> Catalog:
+    catalog = next((catalog for catalog in catalogs if catalog.name == name), None)
+    if not catalog:
+        raise Exception(f"Catalog '{name}' not found")
+    return catalog
+
+
+async def plan_agent_run(
+    nlq: str,
+    catalogs: List[Catalog],
+    tools: AgentTools,
+    config: AgentConfig,
+    conversation: ConversationContext,
+    stages: StageGraph,
+) -> AgentPlan:
+    """
+    Run the independent analysis stages of the agent concurrently. Catalog and table
+    selection only depend on the question, so they are started speculatively alongside
+    the query type and intent analysis, and cancelled when the query type doesn't
+    need them.
+    """
+    state = AgentState(
+        nlq=nlq,
+        intent="",
+        query_type="REPORT_GENERATION",
+        active_role=config.user_info.role,
+    )
+    plan = AgentPlan(nlq_type="REPORT_GENERATION", state=state)
+
+    is_first_turn = conversation.is_empty
+
+    # Questions are cached without their conversation, so only the first turn of a
+    # session, which is always a report generation, is served from the cache
+    cached_result = None
+    if is_first_turn:
+        cached_result = get_cached_nlq_result(
+            nlq,
+            config.user_info.role,
+            config.user_info.scopes,
+            parsed_catalogs.version,
+        )
+
+    if cached_result:
+        if apply_cached_nlq_result(state, cached_result, catalogs):
+            plan.cached_result = cached_result
+            return plan
+
+    if not is_first_turn:
+        stages.add(
+            "query_type",
+            lambda: tools.analyze_query_type(
+                nlq, conversation.turns, conversation.summary
+            ),
+        )
+
+    stages.add(
+        "intent",
+        lambda: tools.analaze_nlq_intent(
+            nlq,
+            conversation.turns,
+            on_delta=config.get_token_callback("INTENT"),
+            summary=conversation.summary,
+        ),
+    )
+
+    # Speculative stages
+    if len(catalogs) > 1:
+        stages.add("catalog", lambda: tools.get_relevant_catalog(nlq, catalogs))
+        stages.add(
+            "tables",
+            lambda catalog_name: tools.get_relevant_tables(
+                nlq, get_catalog_by_name(catalogs, catalog_name)
+            ),
+            "catalog",
+        )
+    elif len(catalogs) == 1:
+        stages.add("tables", lambda: tools.get_relevant_tables(nlq, catalogs[0]))
+
+    if stages.has("query_type"):
+        plan.nlq_type = await stages.result("query_type")
+
+    if plan.nlq_type == "CASUAL_CONVERSATION":
+        stages.cancel_all()
+        return plan
+
+    if plan.nlq_type == "QUESTION_ANSWERING":
+        stages.cancel("catalog", "tables")
+
+    state.intent = await stages.result("intent")
+    return plan
+
+
 async def agentic_loop(
     nlq: str,
     catalogs: List[Catalog],
     tools: AgentTools,
     config: AgentConfig,
     session: UserSession,
+    conversation: ConversationContext,
+) -> Union[
+    AgenticLoopQueryResult, AgenticLoopQuestionAnsweringResult, AgenticLoopFailure
+]:
+    stages = StageGraph()
+    try:
+        return await run_agentic_loop(
+            nlq, catalogs, tools, config, session, conversation, stages
+        )
+    finally:
+        stages.cancel_all()
+        logger.info(f"Stage timings: {stages.get_timing_summary()}")
+
+
+async def run_agentic_loop(
+    nlq: str,
+    catalogs: List[Catalog],
+    tools: AgentTools,
+    config: AgentConfig,
+    session: UserSession,
+    conversation: ConversationContext,
+    stages: StageGraph,
 ) -> Union[
     AgenticLoopQueryResult, AgenticLoopQuestionAnsweringResult, AgenticLoopFailure
 ]:
-    def send_update(status: AgentStatus):
+    async def send_update(status: AgentStatus):
         logger.info(status.value)
         if config.update_callback:
-            config.update_callback(status)
-
-    send_update(AgentStatus.ANALYZING_INTENT)
+            await config.update_callback(status)
 
-    nlq_type: QueryTypeLiteral
-    if len(session.turns) == 0:
-        nlq_type = "REPORT_GENERATION"
-    else:
-        nlq_type = await tools.analyze_query_type(nlq, session.turns)
+    await send_update(AgentStatus.ANALYZING_INTENT)
 
-    intent = await tools.analaze_nlq_intent(nlq, session.turns)
-    state = AgentState(
-        nlq=nlq,
-        intent=intent,
-        query_type="REPORT_GENERATION",
-        active_role=config.user_info.role,
-    )
+    plan = await plan_agent_run(nlq, catalogs, tools, config, conversation, stages)
+    nlq_type = plan.nlq_type
+    state = plan.state
+    cached_result = plan.cached_result
+    intent = state.intent
 
     turns = 0
 
     if nlq_type == "CASUAL_CONVERSATION":
-        send_update(AgentStatus.TASK_FAILED)
+        await send_update(AgentStatus.TASK_FAILED)
         return AgenticLoopFailure(
             reason="Sorry, I am not trained to handle casual conversations. Please try being more specific."
         )
 
     if nlq_type == "QUESTION_ANSWERING":
-        prev_turn = session.turns[-1]
+        prev_turn = conversation.turns[-1]
         catalog = next(
             catalog for catalog in catalogs if catalog.name == prev_turn.database_used
         )
-        send_update(AgentStatus.EXECUTING_QUERIES)
+        await send_update(AgentStatus.EXECUTING_QUERIES)
         query_pipeline = QueryExecutionPipeline(
             catalog=catalog,
             user_id=session.user_id,
             active_role=config.user_info.role,
             scopes=config.user_info.scopes,
+            on_execution_submitted=config.execution_callback,
         )
-        prev_turn_result = get_or_execute_query_result(
-            sql_query=prev_turn.execution_log.query.sqlquery,
-            catalog=catalog,
-            execute_query=query_pipeline.check_and_execute,
-        )
+        with stages.timed("execute"):
+            prev_turn_result = await wait_for_query_result(
+                sql_query=prev_turn.execution_log.query.sqlquery,
+                catalog=catalog,
+                execute_query=query_pipeline.check_and_execute,
+            )
 
         # closing db session
         query_pipeline.clean()
 
         if not isinstance(prev_turn_result, QueryExecutionSuccessResult):
-            send_update(AgentStatus.TASK_FAILED)
+            await send_update(AgentStatus.TASK_FAILED)
             return AgenticLoopFailure(
                 reason="Unable to find data for the previous query"
             )
 
         try:
-            answer = await tools.answer_question(intent, prev_turn_result.result)
-            send_update(AgentStatus.TASK_COMPLETED)
+            with stages.timed("answer"):
+                answer = await tools.answer_question(
+                    intent,
+                    prev_turn_result.result,
+                    on_delta=config.get_token_callback("ANSWER"),
+                )
+            await send_update(AgentStatus.TASK_COMPLETED)
             return AgenticLoopQuestionAnsweringResult(answer=answer)
         except UnRecoverableError as e:
             return AgenticLoopFailure(reason=e.message)
@@ -224,69 +407,63 @@ async def agentic_loop(
 
             # Get the relevant catalog
             if not state.relevant_catalog:
-                send_update(AgentStatus.CATALOGING)
-                relevant_catalog_name = await tools.get_relevant_catalog(nlq, catalogs)
-                state.relevant_catalog = next(
-                    catalog
-                    for catalog in catalogs
-                    if catalog.name == relevant_catalog_name
+                await send_update(AgentStatus.CATALOGING)
+                if stages.has("catalog"):
+                    relevant_catalog_name = await stages.result("catalog")
+                else:
+                    relevant_catalog_name = await tools.get_relevant_catalog(
+                        nlq, catalogs
+                    )
+                state.relevant_catalog = get_catalog_by_name(
+                    catalogs, relevant_catalog_name
                 )
 
             state.scopes = config.user_info.scopes.get(state.relevant_catalog.name, [])
 
             if not state.relevant_tables:
                 # Get the relevant table names
-                send_update(AgentStatus.CATALOGING)
-                relevant_table_names = await tools.get_relevant_tables(
-                    nlq, state.relevant_catalog
-                )
-
-                relevant_tables = {}
-                categorical_tables = {}
-                json_schema = parsed_catalogs.json_schema
-
-                relevant_tables_schemas = filter(
-                    lambda x: x[0] in relevant_table_names,
-                    state.relevant_catalog.schema.items(),
-                )
-
-                for table_name, table_info in relevant_tables_schemas:
-                    if table_info.get("is_categorical"):
-                        categorical_info = get_cached_categorical_values(
-                            state.relevant_catalog, table_name
-                        )
-                        categorical_tables[table_name] = categorical_info
-
-                    for column in table_info["columns"]:
-                        column = cast(dict[str, Any], column)
-                        json_schema_id = column.get("json_schema_id")
-
-                        if json_schema_id and json_schema_id in json_schema:
-                            column["schema"] = json_schema[json_schema_id]
-
-                    relevant_tables[table_name] = table_info
-                state.relevant_tables = relevant_tables
-                state.categorical_tables = categorical_tables
+                await send_update(AgentStatus.CATALOGING)
+                if stages.has("tables"):
+                    relevant_table_names = await stages.result("tables")
+                else:
+                    relevant_table_names = await tools.get_relevant_tables(
+                        nlq, state.relevant_catalog
+                    )
+                load_relevant_tables(state, relevant_table_names)
 
             if not state.query:
-                send_update(AgentStatus.GENERATING_QUERIES)
+                await send_update(AgentStatus.GENERATING_QUERIES)
                 # Generate queries
-                state.query = await tools.generate_queries(state)
+                with stages.timed("generate"):
+                    state.query = await tools.generate_queries(state)
                 if not state.query:
                     raise Exception("Failed to generate queries")
 
             if not state.final_result:
-                send_update(AgentStatus.EXECUTE_REFINED_QUERY)
+                await send_update(AgentStatus.EXECUTE_REFINED_QUERY)
                 # Execute the aggregate query
-                state.final_result = await execute_query_with_healing(
-                    state=state,
-                    query=state.query,
-                    tools=tools,
-                    config=config,
-                    user_id=session.user_id,
+                with stages.timed("execute"):
+                    state.final_result = await execute_query_with_healing(
+                        state=state,
+                        query=state.query,
+                        tools=tools,
+                        config=config,
+                        user_id=session.user_id,
+                    )
+
+            if conversation.is_empty and state.relevant_tables:
+                save_nlq_result(
+                    nlq,
+                    config.user_info.role,
+                    config.user_info.scopes,
+                    parsed_catalogs.version,
+                    intent=state.intent,
+                    catalog=state.relevant_catalog.name,
+                    tables=list(state.relevant_tables.keys()),
+                    sql=state.query,
                 )
 
-            send_update(AgentStatus.TASK_COMPLETED)
+            await send_update(AgentStatus.TASK_COMPLETED)
             return AgenticLoopQueryResult(
                 result=state.final_result.result,
                 query=state.query,
@@ -296,14 +473,21 @@ async def agentic_loop(
 
         except UnRecoverableError as e:
             logger.error(f"Unrecoverable error in agentic loop: {e}")
-            send_update(AgentStatus.TASK_FAILED)
+            if cached_result:
+                invalidate_nlq_result(
+                    cached_result,
+                    config.user_info.role,
+                    config.user_info.scopes,
+                    parsed_catalogs.version,
+                )
+            await send_update(AgentStatus.TASK_FAILED)
             return AgenticLoopFailure(reason=e.message)
         except Exception as e:
             turns += 1
             logger.error(f"Error in agentic loop: {e}")
             logger.info(f"Retrying in {FAILURE_RETRY_DELAY} seconds...")
-            send_update(AgentStatus.FIXING)
-            time.sleep(FAILURE_RETRY_DELAY)
+            await send_update(AgentStatus.FIXING)
+            await asyncio.sleep(FAILURE_RETRY_DELAY)
             return AgenticLoopFailure(
                 reason="Encountered problems while fixing permissions"
             )
@@ -45,3 +45,7 @@ class QuestionAnsweringResult(BaseModel):
 
 class IsQueryRelevant(BaseModel):
     is_relevant: bool
+
+
+class ConversationSummary(BaseModel):
+    summary: str
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger("[AGENT STAGES]")
+
+
+@dataclass
+class StageTiming:
+    name: str
+    started_at: float
+    duration: Optional[float] = field(default=None)
+    cancelled: bool = field(default=False)
+
+
+class StageGraph:
+    """
+    A small dependency graph of agent stages. Each stage is started as soon as all of
+    its dependencies have completed, so independent stages (e.g. LLM calls) run
+    concurrently. Speculative stages can be cancelled once their result is known to
+    be unnecessary.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.timings: dict[str, StageTiming] = {}
+        self.created_at = time.perf_counter()
+
+    def add(
+        self, name: str, fn: Callable[..., Awaitable[Any]], *dependencies: str
+    ) -> None:
+        """
+        Schedule a stage. The results of the dependencies are passed to `fn` as
+        positional arguments, in the order they are listed.
+        """
+        assert name not in self._tasks, f"Stage '{name}' already exists"
+        dependency_tasks = [self._tasks[dependency] for dependency in dependencies]
+
+        async def run_stage():
+            dependency_results = await asyncio.gather(*dependency_tasks)
+
+            timing = StageTiming(name=name, started_at=time.perf_counter())
+            self.timings[name] = timing
+            try:
+                return await fn(*dependency_results)
+            except asyncio.CancelledError:
+                timing.cancelled = True
+                raise
+            finally:
+                timing.duration = time.perf_counter() - timing.started_at
+
+        self._tasks[name] = asyncio.create_task(run_stage(), name=name)
+
+    @contextmanager
+    def timed(self, name: str):
+        """
+        Record the timing of a step that is awaited inline rather than scheduled
+        """
+        timing = StageTiming(name=name, started_at=time.perf_counter())
+        self.timings[name] = timing
+        try:
+            yield
+        finally:
+            timing.duration = time.perf_counter() - timing.started_at
+
+    def has(self, name: str) -> bool:
+        return name in self._tasks
+
+    async def result(self, name: str) -> Any:
+        return await self._tasks[name]
+
+    async def gather(self, *names: str) -> list[Any]:
+        return await asyncio.gather(*(self._tasks[name] for name in names))
+
+    def cancel(self, *names: str) -> None:
+        for name in names:
+            task = self._tasks.get(name)
+            if not task:
+                continue
+
+            if not task.done():
+                logger.debug(f"Cancelling stage '{name}'")
+                task.cancel()
+            elif not task.cancelled():
+                # Mark the exception of discarded stages as retrieved
+                task.exception()
+
+    def cancel_all(self) -> None:
+        self.cancel(*self._tasks.keys())
+
+    def get_timing_summary(self) -> str:
+        """
+        Per stage durations, along with the total time since the graph was created
+        """
+        parts = []
+        for timing in self.timings.values():
+            duration = (
+                timing.duration
+                if timing.duration is not None
+                else time.perf_counter() - timing.started_at
+            )
+            offset = timing.started_at - self.created_at
+            status = " (cancelled)" if timing.cancelled else ""
+            parts.append(f"{timing.name}: +{offset:.2f}s {duration:.2f}s{status}")
+
+        total = time.perf_counter() - self.created_at
+        return f"total {total:.2f}s | " + ", ".join(parts)
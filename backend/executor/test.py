@@ -0,0 +1,134 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from typing import Any, cast
+from unittest.mock import patch
+
+from .conversation import fit_token_budget, get_summary_batch
+from .events import AgentEventBus
+from .stages import StageGraph
+
+
+class TestStageGraph(unittest.IsolatedAsyncioTestCase):
+
+    async def test_independent_stages_run_concurrently(self):
+        stages = StageGraph()
+
+        async def stage(value):
+            await asyncio.sleep(0.05)
+            return value
+
+        stages.add("a", lambda: stage(1))
+        stages.add("b", lambda: stage(2))
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self.assertEqual(await stages.gather("a", "b"), [1, 2])
+        self.assertLess(loop.time() - start, 0.09)
+
+    async def test_dependencies_receive_results(self):
+        stages = StageGraph()
+
+        async def double(value):
+            return value * 2
+
+        stages.add("a", lambda: double(2))
+        stages.add("b", double, "a")
+
+        self.assertEqual(await stages.result("b"), 8)
+        self.assertIn("b", stages.timings)
+
+    async def test_cancel_speculative_stages(self):
+        stages = StageGraph()
+        stages.add("slow", lambda: asyncio.sleep(10))
+        stages.add("dependent", lambda _: asyncio.sleep(0), "slow")
+        await asyncio.sleep(0)
+
+        stages.cancel_all()
+        with self.assertRaises(asyncio.CancelledError):
+            await stages.result("dependent")
+        self.assertTrue(stages.timings["slow"].cancelled)
+
+    async def test_cancel_discards_failed_stage(self):
+        stages = StageGraph()
+
+        async def fail():
+            raise ValueError("failed")
+
+        stages.add("failing", fail)
+        await asyncio.sleep(0.01)
+
+        # Does not raise, the failure is discarded along with the stage
+        stages.cancel("failing", "unknown")
+
+
+class TestAgentEventBus(unittest.IsolatedAsyncioTestCase):
+
+    async def test_events_are_delivered_in_order(self):
+        bus = AgentEventBus[int](maxsize=2)
+
+        async def agent():
+            for event in range(5):
+                await bus.publish(event)
+
+        task = asyncio.create_task(agent())
+        task.add_done_callback(lambda _: bus.close())
+        self.assertEqual([event async for event in bus], list(range(5)))
+
+    async def test_publish_waits_while_full(self):
+        bus = AgentEventBus[int](maxsize=1)
+        await bus.publish(1)
+
+        publish = asyncio.create_task(bus.publish(2))
+        await asyncio.sleep(0.01)
+        self.assertFalse(publish.done())
+
+        bus.close()
+        self.assertEqual([event async for event in bus], [1])
+        await asyncio.wait_for(publish, 1)
+
+    async def test_publish_after_close_is_dropped(self):
+        bus = AgentEventBus[int]()
+        await bus.publish(1)
+        bus.close()
+        await bus.publish(2)
+        self.assertEqual([event async for event in bus], [1])
+
+
+def make_turn(nlq: str, sql: str) -> Any:
+    return SimpleNamespace(
+        nlq=nlq, execution_log=SimpleNamespace(query=SimpleNamespace(sqlquery=sql))
+    )
+
+
+class TestConversationWindow(unittest.TestCase):
+
+    def test_turns_within_budget_are_kept(self):
+        turns = [make_turn(f"Question {index}", "SELECT 1") for index in range(5)]
+        self.assertEqual(fit_token_budget(turns, 1000), turns)
+
+    def test_oldest_turns_are_dropped(self):
+        # 100 tokens of SQL per turn
+        turns = [make_turn(f"Question {index}", "x" * 400) for index in range(5)]
+        self.assertEqual(fit_token_budget(turns, 250), turns[-2:])
+
+    def test_last_turn_is_kept_over_budget(self):
+        turns = [make_turn("Question", "x" * 4000), make_turn("Follow up", "x" * 4000)]
+        self.assertEqual(fit_token_budget(turns, 100), turns[-1:])
+
+    def test_zero_budget_disables_the_limit(self):
+        turns = [make_turn("Question", "x" * 4000) for _ in range(3)]
+        self.assertEqual(fit_token_budget(turns, 0), turns)
+
+    def test_turns_are_summarized_in_batches(self):
+        session = SimpleNamespace(summary="Summary", summary_turn_id=1)
+        db_session = cast(Any, SimpleNamespace(get=lambda *_: session))
+        turns = [make_turn(f"Question {index}", "SELECT 1") for index in range(3)]
+
+        with patch("executor.conversation.get_turns_to_summarize", return_value=turns):
+            self.assertEqual(
+                get_summary_batch(db_session, "session", 10, 4), ("Summary", [])
+            )
+            self.assertEqual(
+                get_summary_batch(db_session, "session", 10, 3), ("Summary", turns)
+            )
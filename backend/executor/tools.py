@@ -5,6 +5,7 @@ from openai.types.chat import ChatCompletionMessageParam
 from db.models import Turn
 from rbac.check_permissions import ErrorCode, PrivilageCheckResult
 
+from executor.config import DeltaCallback
 from executor.errors import UnRecoverableError
 from executor.models import (
     GeneratedQuery,
@@ -16,17 +17,25 @@ from executor.models import (
     RelevantCatalog,
     RelevantTables,
     NLQIntent,
+    ConversationSummary,
 )
 from executor.state import AgentState
 from executor.models import QueryResults
 from executor.catalog import Catalog
 from utils.query_pipeline import QueryExecutionFailureResult, QueryExecutionResult
-from utils.parse_catalog import parsed_catalogs
+from utils.query_cost import QueryCostCheckResult
+from utils.parse_catalog import get_table_index, parsed_catalogs
 from utils.rows_to_json import to_json_serializable
 from utils.table_to_markdown import get_table_markdown
+from utils.table_index import TABLE_INDEX_TOP_K
+from utils.logger import get_logger
+
+logger = get_logger("[AGENT TOOLS]")
 
 
 class AgentTools(ABC):
+    # Name of the underlying model, part of the LLM cache key
+    model_name: str = ""
 
     @abstractmethod
     async def invoke_llm[
@@ -39,9 +48,35 @@ class AgentTools(ABC):
     ) -> T:
         raise NotImplementedError
 
-    async def analaze_nlq_intent(self, nlq: str, turns: list[Turn] = []) -> str:
+    async def invoke_llm_stream[
+        T
+    ](
+        self,
+        response_type: type[T],
+        messages: list[ChatCompletionMessageParam],
+        field: str,
+        on_delta: DeltaCallback,
+        temperature=0.0,
+    ) -> T:
+        """
+        Invoke the LLM and pass the partial value of the string `field` of the response
+        to `on_delta` as it is generated. Implementations without streaming support
+        pass the complete value once.
+        """
+        response = await self.invoke_llm(response_type, messages, temperature)
+        await on_delta(getattr(response, field))
+        return response
+
+    async def analaze_nlq_intent(
+        self,
+        nlq: str,
+        turns: list[Turn] = [],
+        on_delta: Optional[DeltaCallback] = None,
+        summary: Optional[str] = None,
+    ) -> str:
         """
         Analyze the natural language query (NLQ) and return the intent of the query.
+        The summary covers the turns of the conversation older than `turns`.
         """
         system_prompt = """
         You are a SQL and Technology Expert tasked with understanding user queries and generating informative responses.
@@ -54,6 +89,11 @@ class AgentTools(ABC):
         """
 
         user_prompt = ""
+        if summary:
+            user_prompt += f"""
+            ## Earlier Conversation:
+            {summary}
+            """
         if len(turns) > 0:
             user_prompt += f"""
             ## Previous Queries:
@@ -69,17 +109,20 @@ class AgentTools(ABC):
         {nlq}
         """
 
-        response = await self.invoke_llm(
-            NLQIntent,
-            [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-        )
+        messages: list[ChatCompletionMessageParam] = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        if on_delta:
+            response = await self.invoke_llm_stream(
+                NLQIntent, messages, "intent", on_delta
+            )
+        else:
+            response = await self.invoke_llm(NLQIntent, messages)
         return response.intent
 
     async def analyze_query_type(
-        self, nlq: str, nlq_turns: list[Turn]
+        self, nlq: str, nlq_turns: list[Turn], summary: Optional[str] = None
     ) -> QueryTypeLiteral:
         """
         Analyze the natural language query (NLQ) and return the type of query.
@@ -125,6 +168,13 @@ class AgentTools(ABC):
         To help you decide the query type, you will have access to the historical interaction between the user and the assistant. You need to do the classification based on the most recent user message
         """
         old_messages: list[ChatCompletionMessageParam] = []
+        if summary:
+            old_messages.append(
+                {
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation:\n{summary}",
+                }
+            )
         for turn in nlq_turns:
             old_messages.append({"role": "user", "content": turn.nlq})
             old_messages.append(
@@ -213,11 +263,40 @@ class AgentTools(ABC):
             raise UnRecoverableError("Multiple catalogs/databases are required")
         return llm_resp.database_name
 
+    def get_candidate_tables(
+        self, nlq: str, catalog: Catalog, prev_turn: Optional[Turn] = None
+    ) -> dict[str, dict]:
+        """
+        Pre-filter the tables of a catalog using the table index, so that only the top-k
+        candidates are sent to the LLM. Small catalogs are returned as is.
+        """
+        if len(catalog.schema) <= TABLE_INDEX_TOP_K:
+            return catalog.schema
+
+        search_query = nlq
+        if prev_turn:
+            search_query = f"{prev_turn.nlq} {nlq}"
+
+        results = get_table_index().search(search_query, catalog.name, TABLE_INDEX_TOP_K)
+        if not results:
+            logger.warning(
+                f"No candidate tables found in the index for '{nlq}', using the full catalog"
+            )
+            return catalog.schema
+
+        return {
+            result.table: catalog.schema[result.table]
+            for result in results
+            if result.table in catalog.schema
+        }
+
     async def get_relevant_tables(
         self, nlq: str, catalog: Catalog, prev_turn: Optional[Turn] = None
     ) -> List[str]:
+        candidate_tables = self.get_candidate_tables(nlq, catalog, prev_turn)
+
         tables_info = []
-        for tablename, tableinfo in catalog.schema.items():
+        for tablename, tableinfo in candidate_tables.items():
             curr_table_info = {
                 "table": tablename,
                 "description": tableinfo["description"],
@@ -494,6 +573,13 @@ class AgentTools(ABC):
                     system_prompt += f"""
                     Your task is to fix the query based on the error message provided. You will be given the context of the query and the error message to help you identify the issue.
                     """
+        elif isinstance(errors.reason, QueryCostCheckResult):
+            system_prompt += f"""
+            The query was rejected because it is too expensive to execute: {errors.reason.reason}.
+            Your task is to make the query cheaper while keeping its intent. Add filters on indexed
+            columns, avoid cross joins and reading entire large tables, and aggregate the rows
+            instead of returning all of them where the intent allows it.
+            """
         else:
             system_prompt += f"""
             The error is most likely from the database driver, which means that the query is not valid SQL.
@@ -590,7 +676,12 @@ class AgentTools(ABC):
         )
         return llm_response.query
 
-    async def answer_question(self, nlq: str, data: QueryResults) -> str:
+    async def answer_question(
+        self,
+        nlq: str,
+        data: QueryResults,
+        on_delta: Optional[DeltaCallback] = None,
+    ) -> str:
         """
         Answer the question asked by the user
         """
@@ -612,12 +703,50 @@ class AgentTools(ABC):
         {nlq}
         """
 
+        messages: list[ChatCompletionMessageParam] = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        if on_delta:
+            llm_response = await self.invoke_llm_stream(
+                QuestionAnsweringResult, messages, "answer", on_delta
+            )
+        else:
+            llm_response = await self.invoke_llm(QuestionAnsweringResult, messages)
+
+        return llm_response.answer
+
+    async def summarize_conversation(
+        self, summary: Optional[str], turns: list[Turn]
+    ) -> str:
+        """
+        Fold the turns into the summary of the earlier conversation, so that the
+        prompts keep its context without replaying every turn
+        """
+        system_prompt = """
+        You maintain a concise summary of a conversation between a user and a SQL assistant.
+        Update the summary with the new turns. Keep the questions asked, the databases and tables used, and the filters, groupings and corrections the user asked for.
+        Drop small talk and anything the newer turns supersede. Respond with the updated summary only, in at most 200 words.
+        """
+
+        user_prompt = f"""
+        ## Current Summary:
+        {summary or "No summary yet"}
+
+        ## New Turns:
+        """
+        for turn in turns:
+            sql = turn.execution_log.query.sqlquery if turn.execution_log else None
+            user_prompt += f"""
+            - User: {turn.nlq}
+              SQL: {sql or "No query"}
+            """
+
         llm_response = await self.invoke_llm(
-            QuestionAnsweringResult,
+            ConversationSummary,
             [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
             ],
         )
-
-        return llm_response.answer
+        return llm_response.summary
@@ -1,8 +1,28 @@
 from celery import Celery
+from kombu import Queue
+
+from queues.routing import EXECUTION_QUEUES
 
 app = Celery(
     "database_ops", broker="redis://", backend="redis://", include=["queues.tasks"]
 )
 
+app.conf.update(
+    # Tasks only carry ids and names, see invoke_execute_query_op
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    task_queues=[Queue(queue.name) for queue in EXECUTION_QUEUES.values()],
+    task_default_queue=EXECUTION_QUEUES["interactive"].name,
+    broker_transport_options={
+        "sep": ":",
+        # Workers drain the queues in the order they are declared
+        "queue_order_strategy": "priority",
+    },
+    # Reserve one task at a time, so queued interactive tasks are not stuck behind
+    # tasks prefetched by a busy worker
+    worker_prefetch_multiplier=1,
+)
+
 if __name__ == "__main__":
     app.start()
@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+from typing import Literal
+
+# Where a query execution was requested from
+ExecutionOrigin = Literal["interactive", "saved", "scheduled"]
+
+
+@dataclass
+class ExecutionQueue:
+    name: str
+
+
+# Each origin has its own queue, and the workers drain the queues in the order they
+# are declared here, see queue_order_strategy in queues/celery.py
+EXECUTION_QUEUES: dict[ExecutionOrigin, ExecutionQueue] = {
+    # Queries of the agent, a user is waiting for them in the chat
+    "interactive": ExecutionQueue("executions.interactive"),
+    # Saved reports run from the queries page
+    "saved": ExecutionQueue("executions.saved"),
+    # Background runs, e.g. warming the results of saved queries
+    "scheduled": ExecutionQueue("executions.scheduled"),
+}
+
+
+def get_execution_queue(origin: ExecutionOrigin) -> ExecutionQueue:
+    return EXECUTION_QUEUES[origin]
@@ -0,0 +1,143 @@
+import threading
+import time
+from os import environ
+from typing import Optional, Protocol
+
+from executor.catalog import Catalog
+from queues.routing import ExecutionOrigin
+from utils.logger import get_logger
+from utils.redis import get_redis_key, redis_client
+from utils.semaphore import DistributedSemaphore
+
+# Seconds after which the slot of a crashed worker is released. The running queries
+# renew their leases a few times per period, so they may run for longer.
+EXECUTION_SLOT_LEASE = int(environ.get("EXECUTION_SLOT_LEASE", 120))
+
+logger = get_logger("[SLOTS]")
+
+# Drop expired leases, then take a slot if one is free
+_ACQUIRE_SCRIPT = redis_client.register_script(
+    """
+    redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", ARGV[1])
+    if redis.call("ZCARD", KEYS[1]) < tonumber(ARGV[2]) then
+        redis.call("ZADD", KEYS[1], ARGV[3], ARGV[4])
+        redis.call("EXPIRE", KEYS[1], ARGV[5])
+        return 1
+    end
+    return 0
+    """
+)
+
+
+class ExecutionSlots:
+    """
+    Limits the number of queries of a catalog running at once for an origin, across
+    all workers. Each running query holds a lease that expires, so the slots of
+    crashed workers are eventually released.
+    """
+
+    def __init__(
+        self,
+        catalog_name: str,
+        origin: ExecutionOrigin,
+        limit: int,
+        lease_seconds: int = EXECUTION_SLOT_LEASE,
+    ) -> None:
+        self.key = get_redis_key("execution_slots", catalog_name, origin)
+        self.limit = limit
+        self.lease_seconds = lease_seconds
+
+    def try_acquire(self, lease_id: str) -> bool:
+        now = time.time()
+        acquired = _ACQUIRE_SCRIPT(
+            keys=[self.key],
+            args=[now, self.limit, now + self.lease_seconds, lease_id, self.lease_seconds],
+        )
+        return bool(acquired)
+
+    def renew(self, lease_id: str) -> bool:
+        """
+        Extend the lease of a running query by `lease_seconds` from now
+
+        Returns:
+            False if the lease had already expired and was released
+        """
+        pipeline = redis_client.pipeline()
+        pipeline.zadd(self.key, {lease_id: time.time() + self.lease_seconds}, xx=True)
+        pipeline.expire(self.key, self.lease_seconds)
+        pipeline.zscore(self.key, lease_id)
+        return pipeline.execute()[-1] is not None
+
+    def release(self, lease_id: str) -> None:
+        redis_client.zrem(self.key, lease_id)
+
+    def in_use(self) -> int:
+        return int(redis_client.zcount(self.key, time.time(), "+inf"))  # type: ignore
+
+
+def get_execution_slots(
+    catalog: Catalog, origin: ExecutionOrigin
+) -> Optional[ExecutionSlots]:
+    """
+    Slots for the origin, if the catalog limits its concurrency
+    """
+    limit = catalog.concurrency.get(origin)
+    if not limit:
+        return None
+    return ExecutionSlots(catalog.name, origin, limit)
+
+
+def get_catalog_semaphore(catalog: Catalog) -> Optional[DistributedSemaphore]:
+    """
+    Semaphore limiting the queries running at once on the catalog database across
+    all origins, if the catalog configures a total concurrency
+    """
+    limit = catalog.concurrency.get("total")
+    if not limit:
+        return None
+    return DistributedSemaphore(
+        f"catalog.{catalog.name}", limit, lease_seconds=EXECUTION_SLOT_LEASE
+    )
+
+
+class Lease(Protocol):
+    @property
+    def lease_seconds(self) -> float: ...
+
+    def renew(self, lease_id: str) -> bool: ...
+
+
+class LeaseRenewal:
+    """
+    Renews the leases held by a running query from a background thread, three
+    times per lease period, until the query has finished
+    """
+
+    def __init__(self, lease_id: str, *leases: Optional[Lease]) -> None:
+        self.lease_id = lease_id
+        self.leases = [lease for lease in leases if lease is not None]
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self, interval: float) -> None:
+        while not self._stopped.wait(interval):
+            for lease in self.leases:
+                try:
+                    if not lease.renew(self.lease_id):
+                        logger.warning(f"Lease '{self.lease_id}' expired while held")
+                except Exception as e:
+                    logger.error(f"Failed to renew lease '{self.lease_id}': {e}")
+
+    def __enter__(self) -> "LeaseRenewal":
+        if self.leases:
+            interval = min(lease.lease_seconds for lease in self.leases) / 3
+            self._thread = threading.Thread(
+                target=self._run, args=(interval,), daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
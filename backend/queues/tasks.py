@@ -1,64 +1,92 @@
+import time
+from os import environ
 from typing import Optional
 import celery
+from celery.exceptions import Ignore
+from celery.concurrency import get_implementation
+from celery.signals import task_postrun, worker_init
 from sqlalchemy.orm import Session
 
-from db.catalog_utils import get_engine
+from db.catalog_utils import get_backend_pid, get_engine
 from executor.models import QueryResults
 from utils.logger import get_logger
 from utils.notify_user import notify_user_on_failure, notify_user_on_success
 from .celery import app
-from sqlalchemy import text, bindparam
+from sqlalchemy import Engine, text, bindparam
 
-from db.db_queries import get_execution_log, save_execution_result, set_execution_status
-from dependencies.db import get_db_session
-from executor.catalog import Catalog
-from utils.rows_to_json import convert_rows_to_serializable
+from db.db_queries import (
+    set_execution_backend_pid,
+    set_execution_logs,
+    transition_execution_status,
+)
+from dependencies.db import db, get_db_session
+from db.models import ExecutionLog
+from executor.catalog import ExecutionLimits
+from queues.routing import ExecutionOrigin, get_execution_queue
+from queues.slots import LeaseRenewal, get_catalog_semaphore, get_execution_slots
+from utils.metrics import metrics
+from utils.parse_catalog import get_catalog
+from utils.rows_to_json import convert_rows_to_serializable, fetch_rows_within_limits
+from utils.semaphore import SemaphoreTimeout
 
 logger = get_logger("[DB-Queue]")
 
+# Seconds before a query waiting for a slot of its catalog is retried
+EXECUTION_SLOT_RETRY_DELAY = 2
+# Seconds a worker waits in line for a connection to the catalog before requeueing,
+# kept short since the worker can't run anything else meanwhile
+CATALOG_SEMAPHORE_TIMEOUT = float(environ.get("CATALOG_SEMAPHORE_TIMEOUT", 1))
+# Seconds a requeued query keeps its place in line for a connection to the catalog
+CATALOG_SEMAPHORE_HOLD = float(environ.get("CATALOG_SEMAPHORE_HOLD", 30))
+# App database connections a worker process may open beyond one per running task
+WORKER_DB_POOL_OVERFLOW = int(environ.get("WORKER_DB_POOL_OVERFLOW", 2))
 
-class ExecuteQueryOp(celery.Task):
-    _db_session: Optional[Session] = None
 
-    @property
-    def db_session(self):
-        if self._db_session is None:
-            with get_db_session() as db_session:
-                self._db_session = db_session
-        return self._db_session
+class ExecuteQueryOp(celery.Task):
+    """
+    Each status transition of an execution is a single UPDATE ... RETURNING, and
+    the returned execution log is used for the rest of the transition instead of
+    being queried again.
 
-    def before_start(self, task_id, args, kwargs):
-        if "execution_log_id" not in kwargs:
-            return
+    The task instance is shared by all the tasks a worker process runs, so the app
+    database session is kept on the request of the running task, which celery keeps
+    per thread or greenlet, and closed once the task has returned.
+    """
 
-        execution_log_id = kwargs["execution_log_id"]
-        set_execution_status(self.db_session, execution_log_id, "RUNNING")
+    @property
+    def db_session(self) -> Session:
+        db_session: Optional[Session] = self.request.get("db_session")
+        if db_session is None:
+            # The worker keeps using the execution logs returned by its updates
+            db_session = get_db_session(expire_on_commit=False)
+            self.request.db_session = db_session
+        return db_session
 
-        logger.info(f"Execution with id '{execution_log_id}' STARTED")
+    def close_db_session(self):
+        db_session: Optional[Session] = self.request.get("db_session")
+        if db_session is not None:
+            self.request.db_session = None
+            db_session.close()
 
     def on_success(self, retval: QueryResults, task_id, args, kwargs):
         if "execution_log_id" not in kwargs:
             return
 
         execution_log_id = kwargs["execution_log_id"]
-        save_execution_result(self.db_session, execution_log_id, retval)
-        set_execution_status(self.db_session, execution_log_id, "SUCCESS")
-
-        logger.info(f"Execution with id '{execution_log_id}' SUCCEEDED")
-
-        # Notify user on success
-        execution_log = get_execution_log(self.db_session, execution_log_id)
-        assert (
-            execution_log is not None
-        ), f"Expected execution log to be present for {execution_log_id}"
-        notify_user_on_success(
-            execution_log_id,
-            retval,
-            execution_log.notify_to,
+        execution_log = transition_execution_status(
+            self.db_session, execution_log_id, "SUCCESS", result=retval
         )
+        if execution_log is None:
+            logger.info(f"Execution with id '{execution_log_id}' was CANCELLED")
+        else:
+            logger.info(f"Execution with id '{execution_log_id}' SUCCEEDED")
 
-        if self._db_session is not None:
-            self._db_session.close()
+            # Notify user on success
+            notify_user_on_success(
+                execution_log_id,
+                retval,
+                execution_log.notify_to,
+            )
 
     def on_failure(self, exc, task_id, args, kwargs, einfo):
 
@@ -69,40 +97,113 @@ class ExecuteQueryOp(celery.Task):
         execution_log_id = kwargs["execution_log_id"]
 
         logger.error(f"Execution with id '{execution_log_id}' FAILED: {exc}")
-        set_execution_status(self.db_session, execution_log_id, "FAILED")
-
-        # Notify user on failure
-        execution_log = get_execution_log(self.db_session, execution_log_id)
-
-        assert (
-            execution_log is not None
-        ), f"Expected execution log to be present for id {execution_log_id}"
-
-        notify_user_on_failure(
-            execution_log_id,
-            execution_log.notify_to,
+        execution_log = transition_execution_status(
+            self.db_session, execution_log_id, "FAILED"
         )
 
-        if self._db_session is not None:
-            self._db_session.close()
-            self._db_session = None
+        # Notify user on failure, unless the execution was cancelled
+        if execution_log is not None:
+            notify_user_on_failure(
+                execution_log_id,
+                execution_log.notify_to,
+            )
 
 
 @app.task(base=ExecuteQueryOp, bind=True)
 def execute_query_op(
-    self: ExecuteQueryOp, execution_log_id: int, catalog_json: dict
+    self: ExecuteQueryOp,
+    execution_log_id: int,
+    catalog_name: str,
+    catalog_version: Optional[str] = None,
+    role: Optional[str] = None,
+    origin: ExecutionOrigin = "interactive",
+    enqueued_at: Optional[float] = None,
 ) -> QueryResults:
-    catalog = Catalog(**catalog_json)
+    catalog = get_catalog(catalog_name, catalog_version)
+    limits = catalog.get_execution_limits(role)
     engine = get_engine(catalog)
     celery.Task.request
 
-    execution_log = get_execution_log(self.db_session, execution_log_id)
-    assert (
-        execution_log is not None
-    ), f"Expected execution log to be present for {execution_log_id}"
-    self.db_session.commit()
+    # Requeue instead of waiting when the catalog is busy, so the worker can run
+    # the queries of other catalogs meanwhile. The execution stays PENDING until
+    # it holds its slots.
+    queue = get_execution_queue(origin)
+    slots = get_execution_slots(catalog, origin)
+    lease_id = str(self.request.id)
+    if slots and not slots.try_acquire(lease_id):
+        metrics.increment(f"execution.{origin}.throttled")
+        raise self.retry(
+            countdown=EXECUTION_SLOT_RETRY_DELAY,
+            max_retries=None,
+            queue=queue.name,
+        )
+
+    # Wait briefly in line for a connection to the catalog database, shared by all
+    # origins. The retries of the task keep its place in line, since they share
+    # its id.
+    semaphore = get_catalog_semaphore(catalog)
+    try:
+        if semaphore:
+            semaphore.acquire(
+                lease_id,
+                timeout=CATALOG_SEMAPHORE_TIMEOUT,
+                hold_place_for=CATALOG_SEMAPHORE_HOLD,
+            )
+    except Exception as e:
+        if slots:
+            slots.release(lease_id)
+        if not isinstance(e, SemaphoreTimeout):
+            raise
+
+        metrics.increment(f"execution.{origin}.throttled")
+        raise self.retry(
+            countdown=EXECUTION_SLOT_RETRY_DELAY,
+            max_retries=None,
+            queue=queue.name,
+        )
+
+    started_at = time.perf_counter()
+    try:
+        execution_log = transition_execution_status(
+            self.db_session, execution_log_id, "RUNNING"
+        )
+
+        # Cancelled before the revoke reached the worker
+        if execution_log is None:
+            logger.info(f"Execution with id '{execution_log_id}' was CANCELLED")
+            raise Ignore()
+
+        logger.info(f"Execution with id '{execution_log_id}' STARTED")
+        if enqueued_at:
+            metrics.observe(
+                f"execution.{origin}.wait_seconds", time.time() - enqueued_at
+            )
 
+        # Queries may run for longer than the leases of crashed workers
+        with LeaseRenewal(lease_id, slots, semaphore):
+            return run_query(self, execution_log, engine, limits)
+    finally:
+        if semaphore:
+            semaphore.release(lease_id)
+        if slots:
+            slots.release(lease_id)
+        metrics.observe(
+            f"execution.{origin}.run_seconds", time.perf_counter() - started_at
+        )
+
+
+def run_query(
+    task: ExecuteQueryOp,
+    execution_log: ExecutionLog,
+    engine: Engine,
+    limits: ExecutionLimits,
+) -> QueryResults:
+    execution_log_id = execution_log.id
     with engine.connect() as connection:
+        set_execution_backend_pid(
+            task.db_session, execution_log_id, get_backend_pid(connection)
+        )
+
         stmt = text(execution_log.query.sqlquery)
         params = execution_log.query_params
 
@@ -113,6 +214,68 @@ def execute_query_op(
                     value.append(None) # empty lists are not supported
                 stmt = stmt.bindparams(bindparam(key, expanding = True))
 
-        result = connection.execute(stmt, params).fetchall()
-        serialized_result = convert_rows_to_serializable(result)
+        # Scoped to the transaction of this execution
+        if limits.statement_timeout:
+            connection.execute(
+                text("SELECT set_config('statement_timeout', :timeout, true)"),
+                {"timeout": str(int(limits.statement_timeout * 1000))},
+            )
+
+        # Stream from a server side cursor, so the rows beyond the limits are never
+        # transferred to the worker
+        result = connection.execution_options(stream_results=True).execute(
+            stmt, params
+        )
+        rows, truncated = fetch_rows_within_limits(
+            result, limits.max_rows, limits.max_result_bytes
+        )
+        if truncated:
+            logger.warning(
+                f"Result of execution '{execution_log_id}' truncated to {len(rows)} rows"
+            )
+            set_execution_logs(
+                task.db_session,
+                execution_log_id,
+                {"truncated": True, "row_count": len(rows), "limits": limits.__dict__},
+            )
+
+        serialized_result = convert_rows_to_serializable(rows)
         return serialized_result
+
+
+def get_worker_pool_size(pool_cls, concurrency: int) -> int:
+    """
+    Number of tasks each process of a worker runs at once
+    """
+    pool_cls = get_implementation(pool_cls)
+    if pool_cls.__module__ in ("celery.concurrency.prefork", "celery.concurrency.solo"):
+        return 1
+    return concurrency
+
+
+@worker_init.connect
+def size_worker_db_pool(sender, **_):
+    # Sent before the pool processes are forked, which inherit the new engine
+    pool_size = get_worker_pool_size(sender.pool_cls, sender.concurrency)
+    db.resize_pool(pool_size, WORKER_DB_POOL_OVERFLOW)
+    logger.info(
+        f"App database pool sized to {pool_size} (+{WORKER_DB_POOL_OVERFLOW}) connections"
+    )
+
+
+@task_postrun.connect
+def close_task_db_session(task, **_):
+    # Also runs for ignored and retried tasks, which skip on_success and on_failure
+    if isinstance(task, ExecuteQueryOp):
+        task.close_db_session()
+
+
+@task_postrun.connect
+def publish_worker_metrics(**_):
+    for name, value in db.get_pool_status().items():
+        metrics.set_gauge(f"app_db.pool.{name}", value)
+
+    try:
+        metrics.publish()
+    except Exception as e:
+        logger.error(f"Failed to publish worker metrics: {e}")
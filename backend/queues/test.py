@@ -0,0 +1,115 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import cast
+from unittest.mock import patch
+
+from celery.exceptions import Ignore
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from .celery import app
+from .slots import LeaseRenewal
+from .tasks import ExecuteQueryOp, get_worker_pool_size
+
+CONCURRENCY = 4
+
+barrier = threading.Barrier(CONCURRENCY, timeout=5)
+
+
+@app.task(base=ExecuteQueryOp, bind=True, name="queues.test.use_db_session")
+def use_db_session(self: ExecuteQueryOp, ignore: bool = False) -> int:
+    db_session = self.db_session
+    db_session.execute(text("SELECT 1"))
+
+    # Every task holds its session while the others run
+    barrier.wait()
+    assert self.db_session is db_session
+    if ignore:
+        raise Ignore()
+    return id(db_session)
+
+
+class TestTaskDbSession(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            f"sqlite:///{os.path.join(self.directory.name, 'app.db')}",
+            pool_size=CONCURRENCY,
+            max_overflow=0,
+        )
+        self.sessions = []
+        SessionLocal = sessionmaker(bind=self.engine)
+
+        def get_db_session(**options):
+            db_session = SessionLocal(**options)
+            self.sessions.append(db_session)
+            return db_session
+
+        patcher = patch("queues.tasks.get_db_session", get_db_session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(self.engine.dispose)
+        barrier.reset()
+
+    def run_tasks(self, **kwargs):
+        with ThreadPoolExecutor(CONCURRENCY) as executor:
+            return list(
+                executor.map(
+                    lambda _: cast(ExecuteQueryOp, use_db_session).apply(kwargs=kwargs),
+                    range(CONCURRENCY),
+                )
+            )
+
+    def test_session_per_concurrent_task(self):
+        results = self.run_tasks()
+
+        self.assertTrue(all(result.successful() for result in results))
+        self.assertEqual(len({result.get() for result in results}), CONCURRENCY)
+        self.assertEqual(len(self.sessions), CONCURRENCY)
+        self.assertEqual(self.engine.pool.checkedout(), 0)  # type: ignore
+
+    def test_session_closed_after_ignored_task(self):
+        self.run_tasks(ignore=True)
+
+        self.assertEqual(len(self.sessions), CONCURRENCY)
+        self.assertFalse(any(session.in_transaction() for session in self.sessions))
+        self.assertEqual(self.engine.pool.checkedout(), 0)  # type: ignore
+
+    def test_worker_pool_size(self):
+        self.assertEqual(get_worker_pool_size("prefork", 8), 1)
+        self.assertEqual(get_worker_pool_size("solo", 8), 1)
+        self.assertEqual(get_worker_pool_size("threads", 8), 8)
+
+
+class FakeLease:
+    lease_seconds = 0.03
+
+    def __init__(self):
+        self.renewed = threading.Event()
+
+    def renew(self, lease_id: str) -> bool:
+        self.renewed.set()
+        return True
+
+
+class TestLeaseRenewal(unittest.TestCase):
+    def test_renews_while_held(self):
+        lease = FakeLease()
+        with LeaseRenewal("task", lease, None) as renewal:
+            self.assertTrue(lease.renewed.wait(1))
+
+        assert renewal._thread is not None
+        self.assertFalse(renewal._thread.is_alive())
+
+    def test_without_leases(self):
+        with LeaseRenewal("task", None) as renewal:
+            self.assertIsNone(renewal._thread)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,62 @@
-from typing import cast
+import time
+from typing import Optional, cast
 from executor.catalog import Catalog
+from queues.celery import app
+from queues.routing import EXECUTION_QUEUES, ExecutionOrigin, get_execution_queue
 from queues.tasks import ExecuteQueryOp, execute_query_op
+from utils.parse_catalog import parsed_catalogs
 
 
-def invoke_execute_query_op(execution_log_id: int, catalog: Catalog):
+def invoke_execute_query_op(
+    execution_log_id: int,
+    catalog: Catalog,
+    role: Optional[str] = None,
+    origin: ExecutionOrigin = "interactive",
+):
+    """
+    Execute a query in the worker, within the execution limits of the catalog for
+    the role of the user. The query is queued by its origin, so that interactive
+    queries don't wait behind long running reports.
+
+    Only the name of the catalog is sent, the worker resolves it from its own copy
+    of the configuration. This keeps the schema and the credentials of the
+    catalog out of the broker.
+    """
     task = cast(ExecuteQueryOp, execute_query_op)
+    queue = get_execution_queue(origin)
     return task.apply_async(
-        kwargs={"execution_log_id": execution_log_id, "catalog_json": catalog.__dict__},
-        serialize="pickle",
+        kwargs={
+            "execution_log_id": execution_log_id,
+            "catalog_name": catalog.name,
+            "catalog_version": parsed_catalogs.version,
+            "role": role,
+            "origin": origin,
+            "enqueued_at": time.time(),
+        },
+        queue=queue.name,
+        serializer="json",
     )
+
+
+def get_execution_queue_depths() -> dict[str, int]:
+    """
+    Number of tasks waiting in each execution queue
+    """
+    depths = {}
+    with app.connection_for_read() as connection:
+        connection.ensure_connection(max_retries=1)
+        channel = connection.default_channel
+        for queue in EXECUTION_QUEUES.values():
+            depths[queue.name] = channel.queue_declare(
+                queue.name, passive=True
+            ).message_count
+    return depths
+
+
+def revoke_execute_query_ops(task_ids: list[str]):
+    """
+    Revoke query executions that are no longer needed. Queued tasks are discarded
+    and running tasks are terminated.
+    """
+    if task_ids:
+        app.control.revoke(task_ids, terminate=True)
@@ -1,15 +1,31 @@
 from dotenv import load_dotenv
 
+from db import async_queries
 from db.models import ExecutionLog, UserSession
-from dependencies.db import get_db_session_from_request
-from queues.typed_tasks import invoke_execute_query_op
+from dependencies.db import (
+    db as database,
+    get_async_db_session,
+    get_db_session_from_request,
+)
+from queues.typed_tasks import get_execution_queue_depths, invoke_execute_query_op
 
 load_dotenv()
 
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from typing import Annotated, Any, Optional, List
 from pydantic import BaseModel
-from fastapi import Body, FastAPI, HTTPException, Depends, Query, Request
+from fastapi import (
+    Body,
+    FastAPI,
+    HTTPException,
+    Depends,
+    Header,
+    Query,
+    Request,
+    Response,
+)
 from starlette.responses import StreamingResponse
 from auth.oauth import OAuth2Phase2Payload
 from dependencies.auth import (
@@ -19,14 +35,19 @@ from dependencies.auth import (
     verify_token,
     auth_handler,
 )
+from utils.etag import compute_etag, etag_matches
 from utils.logger import get_logger
+from utils.metrics import get_published_metrics, metrics
+from agents.clients import close_clients
 from controllers.sql_response import (
     ExecuteQueryRequest,
+    cancel_query_execution,
     chat_history,
     get_saved_queries_user,
     save_query_for_user,
     get_session_history,
     nlq_sse_wrapper,
+    resume_nlq_stream,
     save_fav,
 )
 from fastapi.middleware.cors import CORSMiddleware
@@ -38,6 +59,8 @@ from db.db_queries import (
     ExecutionLogResult,
     create_execution_entry,
     get_dynamic_query_params,
+    get_execution_log,
+    set_execution_task_id,
     share_query_to_users,
     get_type_of_query,
     get_recent_execution_for_query,
@@ -47,20 +70,31 @@ from db.db_queries import (
 from db.db_queries import (
     get_all_user_info,
     get_saved_query_by_id,
-    get_session_for_user,
-    get_exeuction_log_result,
-    create_session,
 )
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from db.models import User
-from utils.parse_catalog import parsed_catalogs
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.parse_catalog import get_table_index, parsed_catalogs
 from executor.models import SqlQueryParams
 
 parsed_catalogs.database_privileges
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the table index before serving the first question
+    await asyncio.to_thread(get_table_index)
+    yield
+    await close_clients()
+    await database.dispose_async_engine()
+
+
 # Create the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Cursor of the next page of a paginated endpoint, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
 app.add_middleware(
     CORSMiddleware,
@@ -68,6 +102,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 # Set up logging configuration
@@ -118,11 +153,39 @@ async def get_login_stratergy(
     return response.__dict__
 
 
+# Disable caching and proxy buffering of event streams
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@app.get("/metrics")
+async def get_metrics(
+    user_info: Annotated[AuthenticatedUserInfo, Depends(get_authenticated_user_info)],
+) -> dict[str, Any]:
+    """
+    Counters, gauges and timings of this server process, e.g. the time spent
+    waiting for the LLM rate limiter (`llm.queue_seconds`), along with the
+    snapshots published by the workers and the depth of the execution queues.
+    Only available to admins.
+    """
+    if user_info.role not in ["SUPER_ADMIN", "ADMIN"]:
+        raise HTTPException(status_code=403, detail="You are not authorized to view metrics")
+
+    snapshot = metrics.snapshot()
+    try:
+        snapshot["workers"] = await asyncio.to_thread(get_published_metrics)
+        snapshot["queues"] = await asyncio.to_thread(get_execution_queue_depths)
+    except Exception as e:
+        logger.error(f"Failed to collect worker metrics: {e}")
+    return snapshot
+
+
 @app.post("/chat")
 async def stream_sql_query_responses(
     chat_request: ChatRequest,
+    async_db: Annotated[AsyncSession, Depends(get_async_db_session)],
     db: Annotated[Session, Depends(get_db_session_from_request)],
     user_info: Annotated[AuthenticatedUserInfo, Depends(get_authenticated_user_info)],
+    last_event_id: Annotated[Optional[str], Header()] = None,
 ) -> StreamingResponse:
     """
     Endpoint to stream SQL query responses as Server-Sent Events (SSE).
@@ -131,30 +194,46 @@ async def stream_sql_query_responses(
 
     Args:
         chat_request (ChatRequest): The request containing the SQL query and optional session_id.
-        db (Session): The database session.
+        async_db (AsyncSession): The database session of the handler.
+        db (Session): The database session of the agent, used by the stream.
         user_info (AuthenticatedUserInfo): The user info extracted from the token after successfully authenticating.
+        last_event_id (str): The id of the last event received, to resume an interrupted stream.
 
     Returns:
         StreamingResponse: The response streamed as Server-Sent Events.
     """
 
+    # Resume the stream without running the query again
+    if last_event_id:
+        resumed_stream = await resume_nlq_stream(last_event_id, user_info.user_id)
+        if resumed_stream:
+            db.close()
+            return StreamingResponse(
+                resumed_stream, media_type="text/event-stream", headers=SSE_HEADERS
+            )
+
     # Dependency check to validate user
 
     # If no session_id is provided, generate a new str for the session
     current_session: Optional[UserSession] = None
     if not chat_request.session_id:
-        current_session = create_session(db, user_info.user_id)
+        current_session = await async_queries.create_session(
+            async_db, user_info.user_id
+        )
     else:
-        current_session = get_session_for_user(
-            db_session=db,
+        current_session = await async_queries.get_session_for_user(
+            db_session=async_db,
             user_id=user_info.user_id,
             session_id=chat_request.session_id,
         )
         session_id = chat_request.session_id
 
     if not current_session:
+        db.close()
         raise HTTPException(status_code=400, detail="Session not found for the user.")
 
+    # The agent lazy loads the turns of the session through its own session
+    current_session = db.merge(current_session, load=False)
     session_id = str(current_session.session_id)
     try:
         # Returning the StreamingResponse with the proper media type for SSE
@@ -164,6 +243,7 @@ async def stream_sql_query_responses(
                 user_info, chat_request.query, current_session, db_session=db
             ),
             media_type="text/event-stream",
+            headers=SSE_HEADERS,
         )
 
         logger.info("Streaming response successfully started.")
@@ -180,14 +260,22 @@ async def stream_sql_query_responses(
 
 @app.get("/fetch_history")
 async def get_chat_history(
-    db: Annotated[Session, Depends(get_db_session_from_request)],
+    db: Annotated[AsyncSession, Depends(get_async_db_session)],
     user_info: Annotated[AuthenticatedUserInfo, Depends(get_authenticated_user_info)],
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
 ) -> List[UserSessionsResponse]:
     """
-    Get chat history for the user
+    Get chat history for the user, most recently active sessions first
+
+    Args:
+        cursor (str): The X-Next-Cursor header of the previous page
+        limit (int): Maximum number of sessions
 
     Returns:
-       Chat history
+       A page of the chat history, with the cursor of the next page in the
+       X-Next-Cursor header
     """
 
     try:
@@ -195,10 +283,17 @@ async def get_chat_history(
         logger.info(f"User chat history for user_id: {user_info.user_id}")
 
         # Create a StreamingResponse for the chat history generator
-        response = get_session_history(db=db, user_id=user_info.user_id)
+        sessions, next_cursor = await get_session_history(
+            db=db, user_id=user_info.user_id, limit=limit, cursor=cursor
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
         logger.info("Chat history for user return successfully!!")
-        return response
+        return sessions
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     except Exception as e:
         logger.error(
@@ -206,52 +301,76 @@ async def get_chat_history(
         )
         raise HTTPException(status_code=500, detail="Failed to stream chat history.")
 
-    finally:
-        db.close()
-
 
 @app.get("/fetch_session_history/{session_id}")
 async def get_session_history_for_user(
     session_id: str,
-    db: Annotated[Session, Depends(get_db_session_from_request)],
+    db: Annotated[AsyncSession, Depends(get_async_db_session)],
     user_info: Annotated[AuthenticatedUserInfo, Depends(get_authenticated_user_info)],
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
 ) -> List[ChatHistoryResponse]:
     """
     Get session id from query params and fetch the session history for the user
 
     Args:
         session_id (str): Session ID
-        db (Session): Database session
+        db (AsyncSession): Database session
         user_id (str): User ID
+        cursor (str): The X-Next-Cursor header of the previous page
+        limit (int): Maximum number of turns, the most recent ones. Without a
+            limit, the complete history is returned
 
     Returns:
-        Session history
+        Session history, with the cursor of the page of older turns in the
+        X-Next-Cursor header
     """
     logger.info(f"Session history for session_id: {session_id}")
     try:
-        response = chat_history(db, session_id, user_info.user_id)
+        history, next_cursor = await chat_history(
+            db, session_id, user_info.user_id, limit=limit, cursor=cursor
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
         logger.info("Session history for session_id return successfully!!")
-        return response
+        return history
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(
             f"Error while retrieving session history for session_id: {session_id}. Error: {str(e)}"
         )
         raise HTTPException(status_code=500, detail="Failed to get session history.")
-    finally:
-        db.close()
 
 
 @app.get("/queries")
 async def get_saved_queries(
-    db: Annotated[Session, Depends(get_db_session_from_request)],
+    db: Annotated[AsyncSession, Depends(get_async_db_session)],
     user_info: Annotated[AuthenticatedUserInfo, Depends(get_authenticated_user_info)],
+    response: Response,
     filter: Optional[str] = Query(None, alias="filter:all"),
+    search: Annotated[Optional[str], Query(max_length=200)] = None,
+    cursor: Optional[str] = None,
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+    if_none_match: Annotated[Optional[str], Header()] = None,
 ) -> List[SavedQueriesResponse]:
     """
 
-    Retrieve saved queries
+    Retrieve saved queries, most recent first
     - For non-SUPERADMIN: returns user's own queries
     - For SUPERADMIN with filter:all: returns all users' queries except SUPERADMIN
+
+    Args:
+        search (str): Text the name or description of the queries must contain
+        cursor (str): The X-Next-Cursor header of the previous page
+        limit (int): Maximum number of queries. Without a limit, all the queries
+            are returned
+
+    Returns:
+        The saved queries, with the cursor of the next page in the X-Next-Cursor
+        header. 304 if they match the If-None-Match header.
     """
 
     try:
@@ -262,12 +381,30 @@ async def get_saved_queries(
         filter = "saved" if not filter else "all"
 
         # Create a StreamingResponse for the chat history generator
-        response = get_saved_queries_user(
-            db=db, user_id=user_info.user_id, filter=filter
+        saved_queries, next_cursor = await get_saved_queries_user(
+            db=db,
+            user_id=user_info.user_id,
+            filter=filter,
+            limit=limit,
+            cursor=cursor,
+            search=search,
         )
 
+        # Revalidated on every use, an unchanged list is not sent again
+        etag = compute_etag(saved_queries, next_cursor)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if next_cursor:
+            headers[NEXT_CURSOR_HEADER] = next_cursor
+
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)  # type: ignore
+        response.headers.update(headers)
+
         logger.info("Return user favorite queries successfully!!")
-        return response
+        return saved_queries
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     except Exception as e:
         logger.error(
@@ -276,8 +413,6 @@ async def get_saved_queries(
         raise HTTPException(
             status_code=500, detail="Failed to return favorite queries."
         )
-    finally:
-        db.close()
 
 
 @app.get("/queries/{sqid}/execution")
@@ -342,7 +477,10 @@ async def execute_saved_query(
             )
         )
 
-        invoke_execute_query_op(execution_log.id, catalog)
+        task = invoke_execute_query_op(
+            execution_log.id, catalog, user_info.role, origin="saved"
+        )
+        set_execution_task_id(db, execution_log.id, task.id)
         return execution_log.to_dict()
     except Exception as e:
         logger.error(
@@ -391,7 +529,7 @@ async def save_favorite_query(
 @app.get("/execution_result/{execution_id}")
 async def get_execution_result_for_id(
     execution_id: int,
-    db: Annotated[Session, Depends(get_db_session_from_request)],
+    db: Annotated[AsyncSession, Depends(get_async_db_session)],
     user_info: Annotated[AuthenticatedUserInfo, Depends(get_authenticated_user_info)],
 ) -> ExecutionLogResult:
     """
@@ -399,7 +537,7 @@ async def get_execution_result_for_id(
 
     Args:
         execution_id (int): Execution Log ID
-        db (Session): Database session
+        db (AsyncSession): Database session
         user_id (str): User ID
 
     Returns:
@@ -407,14 +545,12 @@ async def get_execution_result_for_id(
     """
     logger.info(f"Get execution result for user: {user_info.user_id} is requested!")
     try:
-        response = get_exeuction_log_result(db, execution_id)
+        response = await async_queries.get_exeuction_log_result(db, execution_id)
     except Exception as e:
         logger.error(
             f"Error while retrieving execution result for user: {user_info.user_id}. Error: {str(e)}"
         )
         raise HTTPException(status_code=500, detail="Failed to get execution result.")
-    finally:
-        db.close()
 
     if not response:
         raise HTTPException(status_code=404, detail="Execution log not found.")
@@ -423,6 +559,53 @@ async def get_execution_result_for_id(
     return response
 
 
+@app.delete("/execution/{execution_id}")
+async def cancel_execution(
+    execution_id: int,
+    db: Annotated[Session, Depends(get_db_session_from_request)],
+    user_info: Annotated[AuthenticatedUserInfo, Depends(get_authenticated_user_info)],
+) -> dict[str, Any]:
+    """
+    Cancel a pending or running query execution
+
+    Args:
+        execution_id (int): Execution Log ID
+        db (Session): Database session
+        user_info (str): contains user information
+
+    Returns:
+        The cancelled execution log
+    """
+    logger.info(
+        f"Cancelling execution {execution_id} for user: {user_info.user_id}"
+    )
+    try:
+        execution_log = get_execution_log(db, execution_id)
+        if not execution_log:
+            raise HTTPException(status_code=404, detail="Execution log not found.")
+
+        if execution_log.executed_by != user_info.user_id:
+            raise HTTPException(
+                status_code=403, detail="User doesn't have access to this execution."
+            )
+
+        if not cancel_query_execution(db, execution_log):
+            raise HTTPException(
+                status_code=409, detail="Execution has already finished."
+            )
+
+        return execution_log.to_dict()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(
+            f"Error while cancelling execution for user: {user_info.user_id}. Error: {str(e)}"
+        )
+        raise HTTPException(status_code=500, detail="Failed to cancel execution.")
+    finally:
+        db.close()
+
+
 class SaveQueryRequest(BaseModel):
     name: str
     description: Optional[str] = None
@@ -560,8 +743,8 @@ async def share_query(
     try:
         body = await request.json()
         user_emails = body.get("user_emails")
-        share_query_to_users(db, query_id, user_emails)
-        return {"detail": "Query shared successfully"}
+        result = share_query_to_users(db, query_id, user_emails)
+        return {"detail": "Query shared successfully", **result.model_dump()}
     except:
         raise HTTPException(status_code=500, detail="Failed to share query")
     finally:
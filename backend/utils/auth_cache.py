@@ -0,0 +1,65 @@
+import hashlib
+import time
+from collections import OrderedDict
+from os import environ
+from typing import Generic, Optional, TypeVar
+
+# Maximum number of tokens whose resolved user is cached per process
+AUTH_CACHE_MAX_ENTRIES = int(environ.get("AUTH_CACHE_MAX_ENTRIES", 10000))
+# Seconds a resolved token is cached, at most until the token expires
+AUTH_CACHE_TTL = float(environ.get("AUTH_CACHE_TTL", 5 * 60))
+
+T = TypeVar("T")
+
+
+def hash_token(token: str) -> str:
+    """
+    Key of a token in the cache, so that the tokens themselves aren't kept around
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class AuthCache(Generic[T]):
+    """
+    Bounded in-process cache of the values resolved from access tokens. Entries
+    expire after `ttl` seconds or when their token expires, whichever comes
+    first, and the least recently used entries are evicted beyond `max_entries`.
+    """
+
+    def __init__(
+        self, max_entries: int = AUTH_CACHE_MAX_ENTRIES, ttl: float = AUTH_CACHE_TTL
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, T]] = OrderedDict()
+
+    def get(self, token: str) -> Optional[T]:
+        key = hash_token(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, token: str, value: T, token_expires_at: Optional[float] = None):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+
+        key = hash_token(token)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
@@ -1,4 +1,8 @@
+import asyncio
+import contextvars
 import json
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
 from typing import Callable, Optional
 from db.db_queries import fetch_query_by_value, get_exeuction_log_result, get_recent_execution_for_query
 from dependencies.db import get_db_session
@@ -9,6 +13,14 @@ from utils.redis import get_redis_key, redis_client, REDIS_TTL
 
 logger = get_logger("[CACHING UTILS]")
 
+# Threads of a server process waiting for query executions. They are kept apart
+# from the default executor of the event loop, since each one is held for as long
+# as its query runs.
+QUERY_WAIT_THREADS = int(environ.get("QUERY_WAIT_THREADS", 32))
+_query_wait_executor = ThreadPoolExecutor(
+    QUERY_WAIT_THREADS, thread_name_prefix="query-wait"
+)
+
 
 def save_result_to_redis(
     execution_result: QueryExecutionSuccessResult,
@@ -95,6 +107,28 @@ def get_or_execute_query_result(
     return execution_result
 
 
+async def wait_for_query_result(
+    sql_query: str,
+    catalog: Catalog,
+    execute_query: Callable[[str, bool], QueryExecutionResult],
+    is_background: bool = False,
+) -> QueryExecutionResult:
+    """
+    get_or_execute_query_result in a thread of the query wait pool, so the agent
+    stays cancellable while the query runs
+    """
+    def get_result() -> QueryExecutionResult:
+        return get_or_execute_query_result(
+            sql_query, catalog, execute_query, is_background
+        )
+
+    # Like asyncio.to_thread, the call sees the context variables of the caller
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _query_wait_executor, context.run, get_result
+    )
+
+
 def execute_and_cache_query_result(
     query: str,
     catalog: Catalog,
@@ -0,0 +1,31 @@
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+
+def compute_etag(*payload: Any) -> str:
+    """
+    Weak ETag of the JSON representation of a response
+    """
+    content = json.dumps(jsonable_encoder(payload), sort_keys=True, default=str)
+    return f'W/"{hashlib.sha1(content.encode()).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether the If-None-Match header of a request lists the ETag, i.e. the client
+    already has the response
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    # Weak comparison, the W/ prefix is ignored
+    opaque_tag = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == opaque_tag
+        for tag in if_none_match.split(",")
+    )
@@ -0,0 +1,178 @@
+import functools
+import hashlib
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from os import environ
+from typing import Any, Optional
+
+from utils.redis import get_redis_key, redis_client
+
+# Possible values: redis, disk, none
+LLM_CACHE_BACKEND = environ.get("LLM_CACHE_BACKEND", "redis")
+LLM_CACHE_TTL = int(environ.get("LLM_CACHE_TTL", 24 * 60 * 60))
+LLM_CACHE_MAX_ENTRIES = int(environ.get("LLM_CACHE_MAX_ENTRIES", 10000))
+LLM_CACHE_DIR = environ.get("LLM_CACHE_DIR", ".cache/llm")
+
+
+def get_llm_cache_key(
+    model: str,
+    response_schema: dict[str, Any],
+    messages: list[Any],
+    temperature: float,
+) -> str:
+    """
+    Content address of an LLM call. Any change to the model, the expected response
+    schema, the prompt or the temperature results in a different key.
+    """
+    content = json.dumps(
+        {
+            "model": model,
+            "response_schema": response_schema,
+            "messages": messages,
+            "temperature": temperature,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class LLMCacheBackend(ABC):
+    """
+    Storage for serialized LLM responses, with a TTL and a bounded number of entries
+    """
+
+    def __init__(self, ttl: int, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+
+class RedisLLMCacheBackend(LLMCacheBackend):
+    """
+    Entries expire through redis TTLs. A sorted set tracks insertion order so that the
+    oldest entries are evicted once the cache grows beyond `max_entries`.
+    """
+
+    recency_key = get_redis_key("llm_cache", "recency")
+
+    def get(self, key: str) -> Optional[str]:
+        value = redis_client.get(get_redis_key("llm_cache", key))
+        return str(value) if value else None
+
+    def set(self, key: str, value: str) -> None:
+        pipeline = redis_client.pipeline()
+        pipeline.set(get_redis_key("llm_cache", key), value, ex=self.ttl)
+        pipeline.zadd(self.recency_key, {key: time.time()})
+        # Outlives the entries it tracks by at most the TTL
+        pipeline.expire(self.recency_key, self.ttl)
+        pipeline.zcard(self.recency_key)
+        num_entries = pipeline.execute()[-1]  # type: ignore
+
+        overflow = num_entries - self.max_entries
+        if overflow > 0:
+            evicted: list[tuple[str, float]] = redis_client.zpopmin(  # type: ignore
+                self.recency_key, overflow
+            )
+            redis_client.delete(
+                *[get_redis_key("llm_cache", evicted_key) for evicted_key, _ in evicted]
+            )
+
+
+class DiskLLMCacheBackend(LLMCacheBackend):
+    """
+    One file per entry in a local directory. File modification times are used for
+    both expiry and eviction of the oldest entries.
+
+    The entries are counted as they are written, and the directory is only scanned
+    once they exceed `max_entries`, to evict the oldest entries down to
+    `EVICTION_TARGET` of the limit.
+    """
+
+    EVICTION_TARGET = 0.9
+
+    def __init__(self, directory: str, ttl: int, max_entries: int) -> None:
+        super().__init__(ttl, max_entries)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # Approximate, other processes may write to the same directory
+        self.num_entries = len(self._scan())
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._get_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                self.num_entries -= 1
+                return None
+
+            with open(path, "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        path = self._get_path(key)
+        is_new = not os.path.exists(path)
+        # Each process writes through its own temporary file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+        if is_new:
+            self.num_entries += 1
+        if self.num_entries > self.max_entries:
+            self.evict()
+
+    def _scan(self) -> list[os.DirEntry]:
+        return [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith(".json")
+        ]
+
+    def evict(self) -> None:
+        entries = self._scan()
+        self.num_entries = len(entries)
+        if self.num_entries <= self.max_entries:
+            return
+
+        overflow = self.num_entries - int(self.max_entries * self.EVICTION_TARGET)
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:overflow]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            self.num_entries -= 1
+
+
+@functools.cache
+def get_llm_cache_backend() -> Optional[LLMCacheBackend]:
+    """
+    Returns the LLM cache backend configured through LLM_CACHE_BACKEND, if any
+    """
+    match LLM_CACHE_BACKEND:
+        case "redis":
+            return RedisLLMCacheBackend(LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES)
+        case "disk":
+            return DiskLLMCacheBackend(
+                LLM_CACHE_DIR, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+            )
+        case "none" | "":
+            return None
+        case _:
+            raise ValueError(f"Invalid LLM cache backend: {LLM_CACHE_BACKEND}")
@@ -0,0 +1,123 @@
+import json
+import os
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from os import environ
+from typing import Any
+
+from utils.redis import get_redis_key, redis_client
+
+# Number of most recent observations kept per timing to compute percentiles
+METRICS_WINDOW_SIZE = 1000
+# Minimum seconds between two snapshots published by a worker process
+METRICS_PUBLISH_INTERVAL = float(environ.get("METRICS_PUBLISH_INTERVAL", 10))
+
+
+@dataclass
+class Timing:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    recent: deque[float] = field(
+        default_factory=lambda: deque(maxlen=METRICS_WINDOW_SIZE)
+    )
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def get_percentile(self, percentile: float) -> float:
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        index = min(len(values) - 1, int(round(percentile / 100 * (len(values) - 1))))
+        return values[index]
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.get_percentile(50),
+            "p95": self.get_percentile(95),
+            "p99": self.get_percentile(99),
+            "max": self.max,
+        }
+
+
+class MetricsRegistry:
+    """
+    In-process registry of counters, gauges and timings. Metrics are per process;
+    each server or worker process reports its own values. Worker processes, which
+    don't serve requests, publish their snapshot to redis instead.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._published_at = 0.0
+        self.counters: dict[str, float] = defaultdict(float)
+        self.gauges: dict[str, float] = {}
+        self.timings: dict[str, Timing] = defaultdict(Timing)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def add_to_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = self.gauges.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self.timings[name].observe(value)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "timings": {
+                    name: timing.summary() for name, timing in self.timings.items()
+                },
+            }
+
+    def publish(self, force: bool = False) -> None:
+        """
+        Publish the snapshot of this process to redis, at most once every
+        METRICS_PUBLISH_INTERVAL seconds
+        """
+        now = time.monotonic()
+        if not force and now - self._published_at < METRICS_PUBLISH_INTERVAL:
+            return
+
+        self._published_at = now
+        key = get_redis_key("metrics", f"{socket.gethostname()}:{os.getpid()}")
+        redis_client.set(
+            key,
+            json.dumps(self.snapshot()),
+            ex=max(60, int(METRICS_PUBLISH_INTERVAL * 6)),
+        )
+
+
+def get_published_metrics() -> dict[str, Any]:
+    """
+    Snapshots published by the worker processes, keyed by host and pid
+    """
+    snapshots = {}
+    prefix = get_redis_key("metrics", "")
+    for key in redis_client.scan_iter(match=f"{prefix}*"):
+        snapshot = redis_client.get(key)
+        if snapshot:
+            snapshots[str(key).removeprefix(prefix)] = json.loads(str(snapshot))
+    return snapshots
+
+
+metrics = MetricsRegistry()
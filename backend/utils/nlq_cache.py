@@ -0,0 +1,220 @@
+import hashlib
+import json
+import math
+import re
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, is_dataclass
+from os import environ
+from typing import Any, Optional
+
+from utils.logger import get_logger
+from utils.redis import get_redis_key, redis_client
+from utils.table_index import tokenize
+
+logger = get_logger("[NLQ CACHE]")
+
+NLQ_CACHE_ENABLED = environ.get("NLQ_CACHE_ENABLED", "true").lower() == "true"
+NLQ_CACHE_TTL = int(environ.get("NLQ_CACHE_TTL", 24 * 60 * 60))
+NLQ_CACHE_MAX_ENTRIES = int(environ.get("NLQ_CACHE_MAX_ENTRIES", 500))
+
+# Similarity lookups are disabled unless a threshold in (0, 1] is configured
+NLQ_CACHE_SIMILARITY_THRESHOLD = float(
+    environ.get("NLQ_CACHE_SIMILARITY_THRESHOLD", 0)
+)
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class CachedNLQResult:
+    """
+    A previously successful run of the agentic loop for a question
+    """
+
+    nlq: str
+    intent: str
+    catalog: str
+    tables: list[str]
+    sql: str
+    cached_at: float = 0.0
+
+
+def normalize_nlq(nlq: str) -> str:
+    """
+    Normalize a question so that trivially different phrasings share a cache entry
+    """
+    nlq = _PUNCTUATION.sub(" ", nlq.lower())
+    return _WHITESPACE.sub(" ", nlq).strip()
+
+
+def get_nlq_similarity(nlq_a: str, nlq_b: str) -> float:
+    """
+    Cosine similarity between the bag-of-words vectors of two questions
+    """
+    terms_a = Counter(tokenize(nlq_a))
+    terms_b = Counter(tokenize(nlq_b))
+    if not terms_a or not terms_b:
+        return 0.0
+
+    dot = sum(count * terms_b[term] for term, count in terms_a.items())
+    norm_a = math.sqrt(sum(count * count for count in terms_a.values()))
+    norm_b = math.sqrt(sum(count * count for count in terms_b.values()))
+    return dot / (norm_a * norm_b)
+
+
+def get_scopes_hash(scopes: Any) -> str:
+    """
+    Stable hash of the row scopes of a user, the generated SQL embeds their values
+    """
+    scopes_json = json.dumps(
+        scopes,
+        sort_keys=True,
+        default=lambda value: asdict(value) if is_dataclass(value) else str(value),  # type: ignore
+    )
+    return hashlib.sha256(scopes_json.encode("utf-8")).hexdigest()[:16]
+
+
+def _get_cache_keys(role: str, scopes: Any, catalog_version: str) -> tuple[str, str]:
+    """
+    Entries are scoped by role and row scopes so that a cached query is never
+    offered to a user it was not generated for, and by the catalog version so that
+    they are dropped whenever catalogs.json changes.
+    """
+    scopes_hash = get_scopes_hash(scopes)
+    entries_key = get_redis_key(
+        "nlq_cache", role, scopes_hash, catalog_version, "entries"
+    )
+    recency_key = get_redis_key(
+        "nlq_cache", role, scopes_hash, catalog_version, "recency"
+    )
+    return entries_key, recency_key
+
+
+def _get_entry_field(normalized_nlq: str) -> str:
+    return hashlib.sha256(normalized_nlq.encode("utf-8")).hexdigest()
+
+
+def _parse_entry(entry_json: Optional[str]) -> Optional[CachedNLQResult]:
+    if not entry_json:
+        return None
+
+    entry = CachedNLQResult(**json.loads(entry_json))
+    if time.time() - entry.cached_at > NLQ_CACHE_TTL:
+        return None
+    return entry
+
+
+def get_cached_nlq_result(
+    nlq: str, role: str, scopes: Any, catalog_version: str
+) -> Optional[CachedNLQResult]:
+    """
+    Look up a previous successful result for the question. Exact matches on the
+    normalized question are tried first, followed by a similarity search if enabled.
+    """
+    if not NLQ_CACHE_ENABLED:
+        return None
+
+    normalized_nlq = normalize_nlq(nlq)
+    entries_key, _ = _get_cache_keys(role, scopes, catalog_version)
+
+    try:
+        entry = _parse_entry(
+            str(redis_client.hget(entries_key, _get_entry_field(normalized_nlq)) or "")
+        )
+        if entry:
+            logger.info(f"Exact cache hit for '{normalized_nlq}'")
+            return entry
+
+        if NLQ_CACHE_SIMILARITY_THRESHOLD <= 0:
+            return None
+
+        best_entry: Optional[CachedNLQResult] = None
+        best_similarity = NLQ_CACHE_SIMILARITY_THRESHOLD
+        for entry_json in redis_client.hvals(entries_key):  # type: ignore
+            candidate = _parse_entry(entry_json)
+            if not candidate:
+                continue
+
+            similarity = get_nlq_similarity(normalized_nlq, candidate.nlq)
+            if similarity >= best_similarity:
+                best_entry, best_similarity = candidate, similarity
+
+        if best_entry:
+            logger.info(
+                f"Similarity cache hit for '{normalized_nlq}' "
+                f"with '{best_entry.nlq}' ({best_similarity:.2f})"
+            )
+        return best_entry
+
+    except Exception as e:
+        logger.error(f"Error while looking up the nlq cache: {e}")
+        return None
+
+
+def save_nlq_result(
+    nlq: str,
+    role: str,
+    scopes: Any,
+    catalog_version: str,
+    intent: str,
+    catalog: str,
+    tables: list[str],
+    sql: str,
+) -> None:
+    """
+    Save a successful result, evicting the least recently saved entries of the role and scopes
+    beyond NLQ_CACHE_MAX_ENTRIES
+    """
+    if not NLQ_CACHE_ENABLED:
+        return
+
+    normalized_nlq = normalize_nlq(nlq)
+    entries_key, recency_key = _get_cache_keys(role, scopes, catalog_version)
+    field = _get_entry_field(normalized_nlq)
+    entry = CachedNLQResult(
+        nlq=normalized_nlq,
+        intent=intent,
+        catalog=catalog,
+        tables=tables,
+        sql=sql,
+        cached_at=time.time(),
+    )
+
+    try:
+        pipeline = redis_client.pipeline()
+        pipeline.hset(entries_key, field, json.dumps(asdict(entry)))
+        pipeline.zadd(recency_key, {field: entry.cached_at})
+        pipeline.expire(entries_key, NLQ_CACHE_TTL)
+        pipeline.expire(recency_key, NLQ_CACHE_TTL)
+        pipeline.execute()
+
+        overflow = redis_client.zcard(recency_key) - NLQ_CACHE_MAX_ENTRIES  # type: ignore
+        if overflow > 0:
+            evicted = [
+                evicted_field
+                for evicted_field, _ in redis_client.zpopmin(recency_key, overflow)  # type: ignore
+            ]
+            redis_client.hdel(entries_key, *evicted)
+
+    except Exception as e:
+        logger.error(f"Error while saving to the nlq cache: {e}")
+
+
+def invalidate_nlq_result(
+    entry: CachedNLQResult, role: str, scopes: Any, catalog_version: str
+) -> None:
+    """
+    Drop a cached result, e.g. when it no longer executes successfully. The entry
+    is dropped under the question it was saved for, which differs from the asked
+    question on a similarity hit.
+    """
+    entries_key, recency_key = _get_cache_keys(role, scopes, catalog_version)
+    field = _get_entry_field(entry.nlq)
+
+    try:
+        redis_client.hdel(entries_key, field)
+        redis_client.zrem(recency_key, field)
+    except Exception as e:
+        logger.error(f"Error while invalidating the nlq cache: {e}")
@@ -0,0 +1,30 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+# Page size of the paginated endpoints, unless the request asks for another
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Opaque cursor pointing after the row with the given sort key
+    """
+    payload = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Optional[list[Any]]:
+    """
+    The sort key a cursor points after, or None if the cursor is malformed
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        return None
+    return values if isinstance(values, list) else None
@@ -1,12 +1,16 @@
 from dataclasses import dataclass
+from functools import lru_cache
+import hashlib
 import json
-from typing import Any, List
+import threading
+from typing import Any, List, Optional
 from jsonschema import exceptions, Draft202012Validator
 from referencing import Registry, Resource
 from referencing.jsonschema import DRAFT202012
 from rbac.check_permissions import RoleTablePrivileges
 from executor.catalog import Catalog
 from utils.logger import get_logger
+from utils.table_index import TableIndex, load_table_index
 
 logger = get_logger("[CATALOG]")
 
@@ -34,6 +38,15 @@ schema_registry = Registry().with_resources(
 catalogs_validator = Draft202012Validator(catalogs_schema, registry=schema_registry)
 roles_validator = Draft202012Validator(roles_schema, registry=schema_registry)
 
+
+@lru_cache(maxsize=64)
+def is_valid_role(role: str) -> bool:
+    """
+    Validate a role against the roles schema, once per role
+    """
+    return roles_validator.is_valid(role)
+
+
 TablePrivilagesMap = dict[str, List[RoleTablePrivileges]]
 
 
@@ -42,18 +55,22 @@ class ParsedCatalogConfiguration:
     catalogs: List[Catalog]
     database_privileges: dict[str, TablePrivilagesMap]
     json_schema: dict[str, dict[str, Any]]
+    version: str
 
 
 def parse_catalog_configuration() -> ParsedCatalogConfiguration:
     """
     Parse the database schema and permission info from the catalogs.json file
 
-    Returns: ParsedCatalogConfiguration, containing the parsed catalogs and database privileges
+    Returns: ParsedCatalogConfiguration, containing the parsed catalogs, database privileges
+    and a version hash of the configuration
 
     """
     # Load the catalog definitions
     with open("catalogs.json", "r") as f:
-        catalog_defs: dict[str, Any] = json.load(f)
+        catalog_json = f.read()
+
+    catalog_defs: dict[str, Any] = json.loads(catalog_json)
 
     # Validate the database schema
     try:
@@ -76,6 +93,8 @@ def parse_catalog_configuration() -> ParsedCatalogConfiguration:
                 provider=dbinfo["connection"]["provider"],
                 schema=dbinfo["tables"],
                 connection_params=dbinfo["connection"],
+                limits=dbinfo.get("limits", {}),
+                concurrency=dbinfo.get("concurrency", {}),
             )
         )
 
@@ -102,7 +121,57 @@ def parse_catalog_configuration() -> ParsedCatalogConfiguration:
         catalogs=catalogs,
         database_privileges=database_privileges,
         json_schema=catalog_defs.get("json_schemas", {}),
+        version=hashlib.sha256(catalog_json.encode("utf-8")).hexdigest()[:12],
     )
 
 
 parsed_catalogs = parse_catalog_configuration()
+
+# Only the server retrieves tables, so the workers never build the index
+_table_index: Optional[TableIndex] = None
+_table_index_lock = threading.Lock()
+
+
+def get_table_index() -> TableIndex:
+    """
+    The table index of the loaded catalogs, built on first use
+    """
+    global _table_index
+    if _table_index is None:
+        with _table_index_lock:
+            if _table_index is None:
+                _table_index = load_table_index(parsed_catalogs.catalogs)
+    return _table_index
+
+
+# Versions requested by tasks that a reload did not produce, e.g. because the
+# catalogs.json of the worker differs from the one of the server. They are not
+# reloaded again.
+_tried_versions: set[str] = set()
+_reload_lock = threading.Lock()
+
+
+def get_catalog(name: str, version: Optional[str] = None) -> Catalog:
+    """
+    Look up a catalog of the loaded configuration. If the configuration has
+    changed since `version`, e.g. a task queued by a newer server, the
+    configuration is reloaded first, once per version.
+    """
+    if version and version != parsed_catalogs.version and version not in _tried_versions:
+        with _reload_lock:
+            if version != parsed_catalogs.version and version not in _tried_versions:
+                logger.info(
+                    f"Catalog configuration {version} requested, reloading {parsed_catalogs.version}"
+                )
+                _tried_versions.add(version)
+                # Update in place, so all importers of parsed_catalogs see the new configuration
+                parsed_catalogs.__dict__.update(parse_catalog_configuration().__dict__)
+                if version != parsed_catalogs.version:
+                    logger.warning(
+                        f"Catalog configuration {parsed_catalogs.version} differs from the requested {version}"
+                    )
+
+    catalog = next((c for c in parsed_catalogs.catalogs if c.name == name), None)
+    if not catalog:
+        raise KeyError(f"Catalog '{name}' not found")
+    return catalog
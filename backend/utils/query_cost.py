@@ -0,0 +1,200 @@
+import hashlib
+import json
+import threading
+from dataclasses import asdict, dataclass, field
+from os import environ
+from typing import Any, Optional
+
+import sqlglot
+from sqlalchemy import Engine, text
+
+from db.catalog_utils import get_engine
+from executor.catalog import Catalog, ExecutionLimits
+from utils.logger import get_logger
+from utils.redis import get_redis_key, redis_client
+
+logger = get_logger("[QUERY COST]")
+
+QUERY_PLAN_CACHE_TTL = int(environ.get("QUERY_PLAN_CACHE_TTL", 10 * 60))
+
+# Plan nodes reading a whole table
+SCAN_NODE_TYPES = ("Seq Scan", "Parallel Seq Scan")
+
+# Engines the queries are planned with, by catalog and connection parameters
+_explain_engines: dict[tuple[str, str], Engine] = {}
+_explain_engines_lock = threading.Lock()
+
+
+@dataclass
+class PlanSummary:
+    """
+    Planner estimates for a query, from EXPLAIN (FORMAT JSON)
+    """
+
+    total_cost: float
+    plan_rows: int
+    # Tables read with a sequential scan without any filter, with their row estimate
+    unfiltered_scans: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class QueryCostCheckResult:
+    """
+    A query rejected by the cost gate, along with the reason for the healing prompt
+    """
+
+    reason: str
+    summary: PlanSummary
+
+    def __str__(self) -> str:
+        return f"Query is too expensive: {self.reason}"
+
+
+def normalize_sql(sql_query: str) -> str:
+    """
+    Normalize a query so that formatting differences share a cached plan
+    """
+    try:
+        return sqlglot.transpile(sql_query, read="postgres", write="postgres")[0]
+    except Exception:
+        return " ".join(sql_query.split()).rstrip(";")
+
+
+def summarize_plan(plan: dict[str, Any]) -> PlanSummary:
+    """
+    Summarize the root node of a JSON query plan
+    """
+    summary = PlanSummary(
+        total_cost=float(plan.get("Total Cost", 0)),
+        plan_rows=int(plan.get("Plan Rows", 0)),
+    )
+
+    nodes = [plan]
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get("Plans", []))
+
+        if node.get("Node Type") in SCAN_NODE_TYPES and "Filter" not in node:
+            table = node.get("Relation Name", "")
+            rows = int(node.get("Plan Rows", 0))
+            summary.unfiltered_scans[table] = max(
+                rows, summary.unfiltered_scans.get(table, 0)
+            )
+
+    return summary
+
+
+def get_explain_engine(catalog: Catalog) -> Engine:
+    """
+    Engine of a catalog shared by all its EXPLAINs, so that they reuse pooled
+    connections. The engine is replaced when the connection of the catalog changes.
+    """
+    key = (catalog.name, json.dumps(catalog.connection_params, sort_keys=True))
+    engine = _explain_engines.get(key)
+    if engine is not None:
+        return engine
+
+    with _explain_engines_lock:
+        engine = _explain_engines.get(key)
+        if engine is None:
+            for stale_key in [k for k in _explain_engines if k[0] == catalog.name]:
+                _explain_engines.pop(stale_key).dispose()
+
+            engine = get_engine(catalog)
+            _explain_engines[key] = engine
+    return engine
+
+
+def explain_query(catalog: Catalog, sql_query: str) -> PlanSummary:
+    """
+    Get the planner estimates for a query from the catalog database. The query is
+    planned but not executed.
+    """
+    engine = get_explain_engine(catalog)
+    with engine.connect() as connection:
+        result = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql_query}"))
+        plan = result.scalar_one()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return summarize_plan(plan[0]["Plan"])
+
+
+def get_plan_summary(catalog: Catalog, sql_query: str) -> PlanSummary:
+    """
+    Planner estimates for a query, cached per normalized query
+    """
+    normalized_sql = normalize_sql(sql_query)
+    key = get_redis_key(
+        "query_plans",
+        catalog.name,
+        hashlib.sha256(normalized_sql.encode("utf-8")).hexdigest(),
+    )
+
+    try:
+        cached = redis_client.get(key)
+        if cached:
+            return PlanSummary(**json.loads(str(cached)))
+    except Exception as e:
+        logger.error(f"Error while reading cached plan: {e}")
+
+    summary = explain_query(catalog, sql_query)
+
+    try:
+        redis_client.set(key, json.dumps(asdict(summary)), ex=QUERY_PLAN_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Error while caching plan: {e}")
+
+    return summary
+
+
+def check_plan_cost(
+    summary: PlanSummary, limits: ExecutionLimits
+) -> Optional[QueryCostCheckResult]:
+    """
+    Compare the planner estimates against the limits of the role
+    """
+    if limits.max_plan_cost is not None and summary.total_cost > limits.max_plan_cost:
+        return QueryCostCheckResult(
+            f"estimated cost {summary.total_cost:.0f} exceeds {limits.max_plan_cost:.0f}",
+            summary,
+        )
+
+    if limits.max_plan_rows is not None and summary.plan_rows > limits.max_plan_rows:
+        return QueryCostCheckResult(
+            f"estimated {summary.plan_rows} rows exceed {limits.max_plan_rows}",
+            summary,
+        )
+
+    if limits.max_unfiltered_scan_rows is not None:
+        for table, rows in summary.unfiltered_scans.items():
+            if rows > limits.max_unfiltered_scan_rows:
+                return QueryCostCheckResult(
+                    f"reads all {rows} rows of '{table}' without a filter",
+                    summary,
+                )
+
+    return None
+
+
+def check_query_cost(
+    catalog: Catalog, sql_query: str, limits: ExecutionLimits
+) -> Optional[QueryCostCheckResult]:
+    """
+    Preflight check of a query against the cost limits of the role. The check is
+    skipped when no cost limit is configured, and lets the query through if the
+    plan can't be obtained.
+    """
+    if not limits.has_cost_limits() or catalog.provider != "postgres":
+        return None
+
+    try:
+        summary = get_plan_summary(catalog, sql_query)
+    except Exception as e:
+        logger.warning(f"Skipping cost check, failed to explain query: {e}")
+        return None
+
+    result = check_plan_cost(summary, limits)
+    if result:
+        logger.warning(f"Rejected query: {result}")
+    return result
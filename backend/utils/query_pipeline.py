@@ -1,12 +1,17 @@
 from dataclasses import dataclass, field
-from typing import List, Optional, cast
+from typing import Callable, List, Optional, cast
 from sqlalchemy.orm import Session
-from db.db_queries import create_execution_entry, get_or_create_query
+from db.db_queries import (
+    create_execution_entry,
+    get_or_create_query,
+    set_execution_task_id,
+)
 from dependencies.db import get_db_session
 from executor.models import QueryResults
 from queues.typed_tasks import invoke_execute_query_op
 from utils.logger import get_logger
 from utils.parse_catalog import parsed_catalogs
+from utils.query_cost import check_query_cost
 from executor.catalog import Catalog
 from executor.result import QueryExecutionFailureResult, QueryExecutionResult, QueryExecutionSuccessResult
 from rbac.check_permissions import ColumnScope, PrivilageCheckResult, check_query_privilages
@@ -21,6 +26,8 @@ class QueryExecutionPipeline:
     user_id: str
     active_role: str
     scopes: dict[str, List[ColumnScope]]
+    # Called with the id of the execution log of each submitted query
+    on_execution_submitted: Optional[Callable[[int], None]] = field(default=None)
     _db_session: Optional[Session] = field(default=None)
 
     @property
@@ -56,6 +63,18 @@ class QueryExecutionPipeline:
                 recoverable=True,
             )
 
+        # Reject expensive queries before they occupy a worker and a connection
+        cost_check_result = check_query_cost(
+            self.catalog,
+            sql_query,
+            self.catalog.get_execution_limits(self.active_role),
+        )
+        if cost_check_result:
+            return QueryExecutionFailureResult(
+                reason=cost_check_result,
+                recoverable=True,
+            )
+
         try:
             # Create Execution Log
             saved_query = get_or_create_query(
@@ -65,7 +84,14 @@ class QueryExecutionPipeline:
                 self.db_session, str(self.user_id), str(saved_query.sqid)
             )
 
-            execution_result = invoke_execute_query_op(execution_entry.id, self.catalog)
+            execution_result = invoke_execute_query_op(
+                execution_entry.id, self.catalog, self.active_role, origin="interactive"
+            )
+            set_execution_task_id(
+                self.db_session, execution_entry.id, execution_result.id
+            )
+            if self.on_execution_submitted:
+                self.on_execution_submitted(execution_entry.id)
 
             if is_background:
                 return execution_entry
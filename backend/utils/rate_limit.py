@@ -0,0 +1,84 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from utils.logger import get_logger
+from utils.metrics import metrics
+
+logger = get_logger("[RATE LIMIT]")
+
+# Waits longer than this are logged as throttling
+THROTTLE_LOG_THRESHOLD = 1.0
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of up to `capacity`
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class RateLimiter:
+    """
+    Limits the number of concurrent calls and, optionally, their rate. The time spent
+    waiting for a slot is recorded as `<name>.queue_seconds` so that throttling is
+    visible in the metrics.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        rate: float = 0,
+        burst: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # A bucket holding less than one token never allows a call
+        self.bucket = (
+            TokenBucket(rate, max(1.0, burst or rate)) if rate > 0 else None
+        )
+
+    @asynccontextmanager
+    async def limit(self):
+        start = time.perf_counter()
+        metrics.add_to_gauge(f"{self.name}.queued", 1)
+        try:
+            if self.bucket:
+                await self.bucket.acquire()
+            await self.semaphore.acquire()
+        finally:
+            metrics.add_to_gauge(f"{self.name}.queued", -1)
+
+        wait = time.perf_counter() - start
+        metrics.observe(f"{self.name}.queue_seconds", wait)
+        if wait > THROTTLE_LOG_THRESHOLD:
+            metrics.increment(f"{self.name}.throttled")
+            logger.warning(f"{self.name} call was throttled for {wait:.2f}s")
+
+        metrics.add_to_gauge(f"{self.name}.in_flight", 1)
+        try:
+            yield
+        finally:
+            metrics.add_to_gauge(f"{self.name}.in_flight", -1)
+            self.semaphore.release()
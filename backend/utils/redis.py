@@ -14,7 +14,20 @@ redis_client = Redis(
 
 
 def get_redis_key(
-    kind: Optional[Literal["samples", "categorical", "query_results"]] = None,
+    kind: Optional[
+        Literal[
+            "samples",
+            "categorical",
+            "query_results",
+            "nlq_cache",
+            "llm_cache",
+            "sse_events",
+            "query_plans",
+            "execution_slots",
+            "semaphores",
+            "metrics",
+        ]
+    ] = None,
     *argv: str,
 ) -> str:
     """
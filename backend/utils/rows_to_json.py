@@ -5,7 +5,10 @@ import numpy as np
 from typing import Any, Optional, Sequence
 from pandas.io.parquet import json
 from sqlalchemy import UUID
-from sqlalchemy.engine import Row
+from sqlalchemy.engine import Result, Row
+
+# Number of rows fetched from the cursor at a time
+FETCH_BATCH_SIZE = 1000
 
 
 def convert_rows_to_serializable(rows: Sequence[Row[Any]]) -> list[dict[str, Any]]:
@@ -51,3 +54,35 @@ def convert_rows_to_json(rows: Sequence[Row[Any]]) -> Optional[str]:
 
     records = convert_rows_to_serializable(rows)
     return json.dumps(records)
+
+
+def fetch_rows_within_limits(
+    result: Result[Any],
+    max_rows: Optional[int] = None,
+    max_result_bytes: Optional[int] = None,
+) -> tuple[list[Row[Any]], bool]:
+    """
+    Fetch the rows of a result in batches, stopping once `max_rows` rows or
+    about `max_result_bytes` bytes of JSON values have been read. With a server side cursor the
+    rows beyond the limits are never transferred.
+
+    Returns:
+        The fetched rows, and whether the result was truncated
+    """
+    rows: list[Row[Any]] = []
+    result_bytes = 0
+    try:
+        while batch := result.fetchmany(FETCH_BATCH_SIZE):
+            for row in batch:
+                if max_rows is not None and len(rows) >= max_rows:
+                    return rows, True
+
+                if max_result_bytes is not None:
+                    result_bytes += len(json.dumps(tuple(row), default=str))
+                    if result_bytes > max_result_bytes:
+                        return rows, True
+
+                rows.append(row)
+        return rows, False
+    finally:
+        result.close()
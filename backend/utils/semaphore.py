@@ -0,0 +1,187 @@
+import random
+import time
+from typing import Optional
+
+from utils.logger import get_logger
+from utils.metrics import metrics
+from utils.redis import get_redis_key, redis_client
+
+logger = get_logger("[SEMAPHORE]")
+
+# Seconds between two attempts of a waiter to acquire the semaphore
+SEMAPHORE_POLL_INTERVAL = 0.1
+
+# Queue a waiter with the next ticket. Tickets are handed out in order, which makes
+# the semaphore fair: waiters acquire it in the order they arrived.
+_ENQUEUE_SCRIPT = redis_client.register_script(
+    """
+    local ticket = redis.call("INCR", KEYS[3])
+    redis.call("ZADD", KEYS[1], "NX", ticket, ARGV[1])
+    redis.call("ZADD", KEYS[2], ARGV[2], ARGV[1])
+    for i = 1, 3 do
+        redis.call("EXPIRE", KEYS[i], ARGV[3])
+    end
+    return ticket
+    """
+)
+
+# Drop the expired leases and waiters, then move the waiter to the holders if it is
+# among the first waiters for the free slots
+_ACQUIRE_SCRIPT = redis_client.register_script(
+    """
+    local now = tonumber(ARGV[2])
+    redis.call("ZREMRANGEBYSCORE", KEYS[4], "-inf", now)
+    local expired = redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", now)
+    if #expired > 0 then
+        redis.call("ZREM", KEYS[1], unpack(expired))
+        redis.call("ZREM", KEYS[2], unpack(expired))
+    end
+
+    if not redis.call("ZSCORE", KEYS[1], ARGV[1]) then
+        return -1
+    end
+    redis.call("ZADD", KEYS[2], ARGV[3], ARGV[1])
+
+    local free = tonumber(ARGV[5]) - redis.call("ZCARD", KEYS[4])
+    if redis.call("ZRANK", KEYS[1], ARGV[1]) < free then
+        redis.call("ZREM", KEYS[1], ARGV[1])
+        redis.call("ZREM", KEYS[2], ARGV[1])
+        redis.call("ZADD", KEYS[4], ARGV[4], ARGV[1])
+        redis.call("EXPIRE", KEYS[4], ARGV[6])
+        return 1
+    end
+    return 0
+    """
+)
+
+
+class SemaphoreTimeout(Exception):
+    """
+    The semaphore could not be acquired in time
+    """
+
+
+class DistributedSemaphore:
+    """
+    A fair semaphore shared by all processes through redis. Holders take a lease that
+    expires after `lease_seconds`, and waiters must keep polling to stay in the
+    queue, so neither a crashed holder nor a crashed waiter blocks the others
+    forever.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        lease_seconds: int,
+        waiter_timeout: float = 10,
+    ) -> None:
+        self.name = name
+        self.limit = limit
+        self.lease_seconds = lease_seconds
+        self.waiter_timeout = waiter_timeout
+        self.waiters_key = get_redis_key("semaphores", name, "waiters")
+        self.waiters_seen_key = get_redis_key("semaphores", name, "waiters_seen")
+        self.counter_key = get_redis_key("semaphores", name, "counter")
+        self.holders_key = get_redis_key("semaphores", name, "holders")
+
+    def _try_acquire(self, lease_id: str) -> int:
+        now = time.time()
+        return int(
+            _ACQUIRE_SCRIPT(
+                keys=[
+                    self.waiters_key,
+                    self.waiters_seen_key,
+                    self.counter_key,
+                    self.holders_key,
+                ],
+                args=[
+                    lease_id,
+                    now,
+                    now + self.waiter_timeout,
+                    now + self.lease_seconds,
+                    self.limit,
+                    self.lease_seconds,
+                ],
+            )  # type: ignore
+        )
+
+    def _enqueue(self, lease_id: str) -> None:
+        _ENQUEUE_SCRIPT(
+            keys=[self.waiters_key, self.waiters_seen_key, self.counter_key],
+            args=[lease_id, time.time() + self.waiter_timeout, self.lease_seconds],
+        )
+
+    def acquire(
+        self,
+        lease_id: str,
+        timeout: Optional[float] = None,
+        hold_place_for: Optional[float] = None,
+    ) -> None:
+        """
+        Wait for a slot, in the order of arrival. If `hold_place_for` is given, a
+        waiter that times out keeps its place in line for that many seconds, so it
+        can come back with the same `lease_id` later, e.g. from a retried task.
+
+        Raises:
+            SemaphoreTimeout: if no slot was free within `timeout` seconds
+        """
+        start = time.monotonic()
+        self._enqueue(lease_id)
+        metrics.add_to_gauge(f"{self.name}.waiting", 1)
+        try:
+            while True:
+                acquired = self._try_acquire(lease_id)
+                if acquired == 1:
+                    break
+
+                # Dropped from the queue after a long pause, e.g. a blocked process
+                if acquired == -1:
+                    self._enqueue(lease_id)
+
+                if timeout is not None and time.monotonic() - start > timeout:
+                    if hold_place_for:
+                        self._hold_place(lease_id, hold_place_for)
+                    else:
+                        self._leave(lease_id)
+                    metrics.increment(f"{self.name}.timeouts")
+                    raise SemaphoreTimeout(
+                        f"Timed out waiting for {self.name} after {timeout}s"
+                    )
+
+                time.sleep(SEMAPHORE_POLL_INTERVAL * random.uniform(0.5, 1.5))
+        finally:
+            metrics.add_to_gauge(f"{self.name}.waiting", -1)
+
+        wait = time.monotonic() - start
+        metrics.observe(f"{self.name}.wait_seconds", wait)
+        logger.debug(f"Acquired {self.name} after {wait:.2f}s")
+
+    def _hold_place(self, lease_id: str, seconds: float) -> None:
+        redis_client.zadd(
+            self.waiters_seen_key, {lease_id: time.time() + seconds}, xx=True
+        )
+
+    def _leave(self, lease_id: str) -> None:
+        pipeline = redis_client.pipeline()
+        pipeline.zrem(self.waiters_key, lease_id)
+        pipeline.zrem(self.waiters_seen_key, lease_id)
+        pipeline.execute()
+
+    def renew(self, lease_id: str) -> bool:
+        """
+        Extend the lease of a holder by `lease_seconds` from now
+
+        Returns:
+            False if the lease had already expired and was released
+        """
+        pipeline = redis_client.pipeline()
+        pipeline.zadd(
+            self.holders_key, {lease_id: time.time() + self.lease_seconds}, xx=True
+        )
+        pipeline.expire(self.holders_key, self.lease_seconds)
+        pipeline.zscore(self.holders_key, lease_id)
+        return pipeline.execute()[-1] is not None
+
+    def release(self, lease_id: str) -> None:
+        redis_client.zrem(self.holders_key, lease_id)
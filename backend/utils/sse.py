@@ -0,0 +1,359 @@
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from os import environ
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Optional, Set
+
+from utils.logger import get_logger
+from utils.metrics import metrics
+from utils.redis import get_redis_key, redis_client
+
+logger = get_logger("[SSE]")
+
+# Seconds without events after which a keep-alive comment is sent
+SSE_KEEPALIVE_INTERVAL = float(environ.get("SSE_KEEPALIVE_INTERVAL", 15))
+# Seconds for which the events of a stream are kept for resuming
+SSE_BUFFER_TTL = int(environ.get("SSE_BUFFER_TTL", 10 * 60))
+# Maximum number of events waiting to be written to the client
+SSE_QUEUE_SIZE = int(environ.get("SSE_QUEUE_SIZE", 64))
+# Interval at which a resumed stream polls for new events
+SSE_RESUME_POLL_INTERVAL = float(environ.get("SSE_RESUME_POLL_INTERVAL", 0.2))
+# Seconds to wait for a client to resume a disconnected stream before it is cancelled
+SSE_RESUME_GRACE_PERIOD = float(environ.get("SSE_RESUME_GRACE_PERIOD", 15))
+# TOKEN events are buffered in batches of up to this many events, or this many
+# seconds, other events are buffered right away
+SSE_BUFFER_BATCH_SIZE = int(environ.get("SSE_BUFFER_BATCH_SIZE", 32))
+SSE_BUFFER_FLUSH_INTERVAL = float(environ.get("SSE_BUFFER_FLUSH_INTERVAL", 0.5))
+# Seconds without a heartbeat of its producer after which a resumed stream is ended,
+# e.g. because the server process producing it crashed
+SSE_PRODUCER_TIMEOUT = float(
+    environ.get("SSE_PRODUCER_TIMEOUT", 3 * SSE_KEEPALIVE_INTERVAL)
+)
+
+
+# Producers of streams whose client disconnected, kept referenced until they finish
+_detached_producers: Set[asyncio.Task] = set()
+
+
+def encode_sse_event(
+    data: str, event: Optional[str] = None, id: Optional[str] = None
+) -> str:
+    """
+    Encode a server-sent event. Multi-line data is split into multiple data fields.
+    """
+    lines = []
+    if id is not None:
+        lines.append(f"id: {id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+def encode_sse_comment(comment: str) -> str:
+    return f": {comment}\n\n"
+
+
+def get_event_id(stream_id: str, seq: int) -> str:
+    return f"{stream_id}:{seq}"
+
+
+def parse_event_id(event_id: str) -> Optional[tuple[str, int]]:
+    """
+    Split the id of an event into the id of its stream and its sequence number
+    """
+    stream_id, _, seq = event_id.rpartition(":")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+class SSEEventBuffer:
+    """
+    Events of a stream stored in redis, so that a client can resume the stream from
+    the last event it received after a reconnect. Only the producer writes the meta
+    of the stream, the resumed clients only record when they last read it.
+    """
+
+    def __init__(self, stream_id: str) -> None:
+        self.stream_id = stream_id
+        self.events_key = get_redis_key("sse_events", stream_id, "events")
+        self.meta_key = get_redis_key("sse_events", stream_id, "meta")
+        self.read_at_key = get_redis_key("sse_events", stream_id, "read_at")
+
+    def _set_meta(self, mapping: dict[str, Any]) -> None:
+        # Every write refreshes the TTL, a stream may outlive SSE_BUFFER_TTL
+        pipeline = redis_client.pipeline()
+        pipeline.hset(self.meta_key, mapping=mapping)
+        pipeline.expire(self.meta_key, SSE_BUFFER_TTL)
+        pipeline.execute()
+
+    def open(self, owner: str) -> None:
+        self._set_meta({"owner": owner, "done": 0, "heartbeat_at": time.time()})
+
+    def heartbeat(self) -> None:
+        self._set_meta({"heartbeat_at": time.time()})
+
+    def append(self, events: list[tuple[str, str]]) -> None:
+        pipeline = redis_client.pipeline()
+        pipeline.rpush(
+            self.events_key,
+            *(json.dumps({"kind": kind, "data": data}) for kind, data in events),
+        )
+        pipeline.expire(self.events_key, SSE_BUFFER_TTL)
+        pipeline.expire(self.meta_key, SSE_BUFFER_TTL)
+        pipeline.execute()
+
+    def discard(self) -> None:
+        redis_client.delete(self.meta_key, self.events_key, self.read_at_key)
+
+    def close(self) -> None:
+        self._set_meta({"done": 1})
+
+    def get_owner(self) -> Optional[str]:
+        owner = redis_client.hget(self.meta_key, "owner")
+        return str(owner) if owner else None
+
+    def is_done(self) -> bool:
+        """
+        Whether no more events will be appended: the producer closed the stream, or
+        its meta expired or its heartbeat stopped
+        """
+        meta: dict[str, str] = redis_client.hgetall(self.meta_key)  # type: ignore
+        if not meta or meta.get("done") == "1":
+            return True
+        heartbeat_at = float(meta.get("heartbeat_at") or 0)
+        return time.time() - heartbeat_at > SSE_PRODUCER_TIMEOUT
+
+    def mark_read(self) -> None:
+        """
+        Record that a resumed client is following the stream
+        """
+        redis_client.set(self.read_at_key, time.time(), ex=SSE_BUFFER_TTL)
+
+    def get_read_at(self) -> float:
+        return float(redis_client.get(self.read_at_key) or 0)  # type: ignore
+
+    def read_after(self, seq: int) -> list[tuple[int, str, str]]:
+        """
+        Events with a sequence number greater than `seq`
+        """
+        events = redis_client.lrange(self.events_key, seq + 1, -1)
+        result = []
+        for offset, event_json in enumerate(events):  # type: ignore
+            event = json.loads(event_json)
+            result.append((seq + 1 + offset, event["kind"], event["data"]))
+        return result
+
+    def poll(self, seq: int) -> tuple[bool, list[tuple[int, str, str]]]:
+        """
+        Mark the stream as read, and return whether it is done along with the
+        events after `seq`. Completion is checked before reading, so no event is
+        missed in between.
+        """
+        self.mark_read()
+        done = self.is_done()
+        return done, self.read_after(seq)
+
+
+@dataclass
+class SSEErrorEvent:
+    kind: str
+    message: str
+
+
+def get_default_error_event(_: Exception) -> SSEErrorEvent:
+    return SSEErrorEvent(kind="ERROR", message="The request failed unexpectedly")
+
+
+class SSEStream:
+    """
+    Writes the events produced by an agent as server-sent events. The producer and
+    the writer are connected by a bounded queue, so a slow client slows down the
+    producer instead of growing the memory of the server. Every event is also
+    buffered in redis, which lets a client that lost the connection resume the
+    stream with the Last-Event-ID header. Redis is written from a thread, so the
+    event loop never waits on it.
+
+    If the events fail, the event returned by `error_event` is sent before the
+    stream ends, so the client can tell a failure from completion.
+    """
+
+    def __init__(
+        self,
+        events: AsyncIterator[Any],
+        owner: str,
+        error_event: Callable[[Exception], Any] = get_default_error_event,
+    ) -> None:
+        self.stream_id = uuid.uuid4().hex
+        self.events = events
+        self.owner = owner
+        self.error_event = error_event
+        self.buffer: Optional[SSEEventBuffer] = SSEEventBuffer(self.stream_id)
+        self.queue = asyncio.Queue[Optional[tuple[int, str, str]]](SSE_QUEUE_SIZE)
+        self.detached = False
+        self.seq = 0
+        # Events not written to redis yet
+        self.pending: list[tuple[str, str]] = []
+        self.flushed_at = time.monotonic()
+
+    async def _call_buffer(self, fn: Callable[[SSEEventBuffer], None]) -> None:
+        """
+        Buffering is best effort. If redis fails, the stream is still written to the
+        client but can no longer be resumed.
+        """
+        buffer = self.buffer
+        if not buffer:
+            return
+
+        try:
+            await asyncio.to_thread(fn, buffer)
+        except Exception as e:
+            logger.error(f"Disabling resume for stream {self.stream_id}: {e}")
+            self.buffer = None
+            try:
+                await asyncio.to_thread(buffer.discard)
+            except Exception:
+                pass
+
+    async def buffer_event(self, kind: str, data: str) -> None:
+        self.pending.append((kind, data))
+        if (
+            kind == "TOKEN"
+            and len(self.pending) < SSE_BUFFER_BATCH_SIZE
+            and time.monotonic() - self.flushed_at < SSE_BUFFER_FLUSH_INTERVAL
+        ):
+            return
+        await self.flush()
+
+    async def flush(self) -> None:
+        events, self.pending = self.pending, []
+        self.flushed_at = time.monotonic()
+        if events:
+            await self._call_buffer(lambda buffer: buffer.append(events))
+
+    async def publish(self, event: Any) -> None:
+        kind = event.kind
+        data = json.dumps(event.__dict__)
+        seq = self.seq
+        self.seq += 1
+
+        await self.buffer_event(kind, data)
+        if not self.detached:
+            await self.queue.put((seq, kind, data))
+
+    async def heartbeat(self) -> None:
+        """
+        Tell the resumed clients the producer is alive while no events are produced
+        """
+        while self.buffer:
+            await asyncio.sleep(SSE_KEEPALIVE_INTERVAL)
+            await self._call_buffer(lambda buffer: buffer.heartbeat())
+
+    async def produce(self) -> None:
+        await self._call_buffer(lambda buffer: buffer.open(self.owner))
+        heartbeat = asyncio.create_task(self.heartbeat())
+        try:
+            async for event in self.events:
+                await self.publish(event)
+        except Exception as e:
+            logger.error(f"Error while producing events for {self.stream_id}: {e}")
+            await self.publish(self.error_event(e))
+        finally:
+            heartbeat.cancel()
+            await self.flush()
+            await self._call_buffer(lambda buffer: buffer.close())
+            if not self.detached:
+                await self.queue.put(None)
+
+    def detach(self) -> None:
+        """
+        Stop writing to the client. The producer keeps buffering events in redis for
+        a resumed stream.
+        """
+        self.detached = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    async def write(self) -> AsyncGenerator[str, None]:
+        producer = asyncio.create_task(self.produce())
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(
+                        self.queue.get(), timeout=SSE_KEEPALIVE_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    yield encode_sse_comment("keep-alive")
+                    continue
+
+                if item is None:
+                    break
+
+                seq, kind, data = item
+                yield encode_sse_event(
+                    data, event=kind, id=get_event_id(self.stream_id, seq)
+                )
+        finally:
+            if not producer.done():
+                self.detach()
+                metrics.increment("sse.detached")
+                watchdog = asyncio.create_task(self.cancel_if_abandoned(producer))
+                for task in (producer, watchdog):
+                    _detached_producers.add(task)
+                    task.add_done_callback(_detached_producers.discard)
+
+    async def cancel_if_abandoned(self, producer: asyncio.Task) -> None:
+        """
+        Cancel the producer of a detached stream, unless a client resumes the stream
+        within SSE_RESUME_GRACE_PERIOD seconds and keeps following it
+        """
+        while not producer.done():
+            detached_at = time.time()
+            await asyncio.sleep(SSE_RESUME_GRACE_PERIOD)
+            if producer.done():
+                return
+
+            try:
+                buffer = self.buffer
+                is_followed = bool(
+                    buffer
+                    and await asyncio.to_thread(buffer.get_read_at) >= detached_at
+                )
+            except Exception as e:
+                logger.error(f"Error while checking stream {self.stream_id}: {e}")
+                is_followed = False
+
+            if not is_followed:
+                logger.info(f"Cancelling abandoned stream {self.stream_id}")
+                producer.cancel()
+                return
+
+
+async def resume_sse_stream(stream_id: str, last_seq: int) -> AsyncIterator[str]:
+    """
+    Replay the buffered events after `last_seq`, and keep following the stream until
+    its producer has finished or stopped sending heartbeats
+    """
+    buffer = SSEEventBuffer(stream_id)
+    metrics.increment("sse.resumed")
+    idle = 0.0
+    while True:
+        done, events = await asyncio.to_thread(buffer.poll, last_seq)
+        for seq, kind, data in events:
+            yield encode_sse_event(data, event=kind, id=get_event_id(stream_id, seq))
+            last_seq = seq
+
+        if done:
+            break
+
+        if events:
+            idle = 0.0
+        elif idle >= SSE_KEEPALIVE_INTERVAL:
+            yield encode_sse_comment("keep-alive")
+            idle = 0.0
+
+        await asyncio.sleep(SSE_RESUME_POLL_INTERVAL)
+        idle += SSE_RESUME_POLL_INTERVAL
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from os import environ
+from typing import Any, Iterable, List, Optional
+
+from executor.catalog import Catalog
+from utils.logger import get_logger
+
+logger = get_logger("[TABLE INDEX]")
+
+TABLE_INDEX_PATH = environ.get("TABLE_INDEX_PATH", ".cache/table_index.json")
+TABLE_INDEX_TOP_K = int(environ.get("TABLE_INDEX_TOP_K", 20))
+
+# Bump whenever tokenization changes, so that persisted indexes are rebuilt
+INDEX_FORMAT_VERSION = 1
+
+# Table names carry most of the signal, so they are weighted above descriptions
+TABLE_NAME_WEIGHT = 3
+COLUMN_NAME_WEIGHT = 2
+
+STOPWORDS = frozenset(
+    [
+        "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "get",
+        "give", "has", "have", "how", "i", "in", "is", "it", "list", "many",
+        "me", "much", "of", "on", "or", "per", "show", "that", "the", "their",
+        "this", "to", "was", "were", "what", "which", "who", "with", "all",
+    ]
+)
+
+_CAMEL_CASE_BOUNDARY = re.compile(r"([a-z0-9])([A-Z])")
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lowercase terms. Identifiers like `worker_id` or `projectId` are
+    split into their parts and trailing plurals are stripped, so that "workers"
+    matches the `worker` table.
+    """
+    text = _CAMEL_CASE_BOUNDARY.sub(r"\1 \2", text).lower()
+
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+
+    return terms
+
+
+def get_table_text_terms(table_name: str, table_info: dict[str, Any]) -> list[str]:
+    """
+    Get the weighted terms describing a table from its catalog definition
+    """
+    terms = tokenize(table_name) * TABLE_NAME_WEIGHT
+    terms += tokenize(table_info.get("description") or "")
+
+    for column in table_info.get("columns", []):
+        terms += tokenize(column.get("name", "")) * COLUMN_NAME_WEIGHT
+        terms += tokenize(column.get("description") or "")
+
+    return terms
+
+
+def get_table_digest(table_name: str, table_info: dict[str, Any]) -> str:
+    """
+    Hash of the parts of a table definition that contribute to the index
+    """
+    content = {
+        "name": table_name,
+        "description": table_info.get("description"),
+        "columns": [
+            {"name": column.get("name"), "description": column.get("description")}
+            for column in table_info.get("columns", [])
+        ],
+    }
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+@dataclass
+class TableDocument:
+    catalog: str
+    table: str
+    digest: str
+    terms: dict[str, int]
+    length: int
+
+
+@dataclass
+class TableSearchResult:
+    table: str
+    score: float
+
+
+@dataclass
+class TableIndex:
+    """
+    Okapi BM25 index over the tables of all catalogs. Pure python, so it works
+    offline and without any model downloads.
+    """
+
+    documents: dict[str, TableDocument] = field(default_factory=dict)
+    k1: float = 1.5
+    b: float = 0.75
+    _doc_freq: dict[str, dict[str, int]] = field(default_factory=dict, repr=False)
+    _num_docs: dict[str, int] = field(default_factory=dict, repr=False)
+    _avg_length: dict[str, float] = field(default_factory=dict, repr=False)
+
+    @staticmethod
+    def document_key(catalog_name: str, table_name: str) -> str:
+        return f"{catalog_name}.{table_name}"
+
+    def refresh_statistics(self) -> None:
+        """
+        Recompute the per catalog document frequencies and average document lengths
+        """
+        doc_freq: dict[str, dict[str, int]] = {}
+        lengths: dict[str, list[int]] = {}
+
+        for document in self.documents.values():
+            catalog_freq = doc_freq.setdefault(document.catalog, {})
+            for term in document.terms:
+                catalog_freq[term] = catalog_freq.get(term, 0) + 1
+            lengths.setdefault(document.catalog, []).append(document.length)
+
+        self._doc_freq = doc_freq
+        self._num_docs = {catalog: len(values) for catalog, values in lengths.items()}
+        self._avg_length = {
+            catalog: sum(values) / len(values) for catalog, values in lengths.items()
+        }
+
+    def sync(self, catalogs: Iterable[Catalog]) -> int:
+        """
+        Bring the index in line with the given catalogs. Only tables whose definition
+        changed since the last build are re-tokenized.
+
+        Returns: number of tables that were (re)indexed or removed
+        """
+        documents: dict[str, TableDocument] = {}
+        changes = 0
+
+        for catalog in catalogs:
+            for table_name, table_info in catalog.schema.items():
+                key = self.document_key(catalog.name, table_name)
+                digest = get_table_digest(table_name, table_info)
+
+                existing = self.documents.get(key)
+                if existing and existing.digest == digest:
+                    documents[key] = existing
+                    continue
+
+                terms = get_table_text_terms(table_name, table_info)
+                documents[key] = TableDocument(
+                    catalog=catalog.name,
+                    table=table_name,
+                    digest=digest,
+                    terms=dict(Counter(terms)),
+                    length=len(terms),
+                )
+                changes += 1
+
+        changes += len(self.documents.keys() - documents.keys())
+        self.documents = documents
+        self.refresh_statistics()
+        return changes
+
+    def search(
+        self, query: str, catalog_name: str, top_k: int = TABLE_INDEX_TOP_K
+    ) -> List[TableSearchResult]:
+        """
+        Rank the tables of a catalog against the query. Tables without any matching
+        term are not returned.
+        """
+        query_terms = set(tokenize(query))
+        doc_freq = self._doc_freq.get(catalog_name, {})
+        avg_length = self._avg_length.get(catalog_name, 0.0) or 1.0
+        num_docs = self._num_docs.get(catalog_name, 0)
+
+        results: list[TableSearchResult] = []
+        for document in self.documents.values():
+            if document.catalog != catalog_name:
+                continue
+
+            score = 0.0
+            for term in query_terms:
+                term_freq = document.terms.get(term)
+                if not term_freq:
+                    continue
+
+                idf = math.log(
+                    1 + (num_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5)
+                )
+                norm = self.k1 * (1 - self.b + self.b * document.length / avg_length)
+                score += idf * term_freq * (self.k1 + 1) / (term_freq + norm)
+
+            if score > 0:
+                results.append(TableSearchResult(table=document.table, score=score))
+
+        results.sort(key=lambda result: result.score, reverse=True)
+        return results[:top_k]
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        data = {
+            "version": INDEX_FORMAT_VERSION,
+            "documents": {
+                key: asdict(document) for key, document in self.documents.items()
+            },
+        }
+
+        # Write to a temporary file of this process first, so concurrent readers never
+        # see a partial index and concurrent writers don't write to the same file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str) -> "TableIndex":
+        with open(path, "r") as f:
+            data = json.load(f)
+
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            logger.info("Persisted table index has an old format, rebuilding")
+            return TableIndex()
+
+        documents = {
+            key: TableDocument(**document)
+            for key, document in data.get("documents", {}).items()
+        }
+        return TableIndex(documents=documents)
+
+
+def load_table_index(
+    catalogs: List[Catalog], path: Optional[str] = TABLE_INDEX_PATH
+) -> TableIndex:
+    """
+    Load the persisted table index and incrementally update it for the current catalogs.
+    The index is written back to disk only when some table changed.
+    """
+    start = time.perf_counter()
+
+    index = TableIndex()
+    if path and os.path.exists(path):
+        try:
+            index = TableIndex.load(path)
+        except Exception as e:
+            logger.warning(f"Failed to load table index from {path}, rebuilding: {e}")
+            index = TableIndex()
+
+    changes = index.sync(catalogs)
+
+    if path and changes > 0:
+        try:
+            index.save(path)
+        except Exception as e:
+            logger.warning(f"Failed to persist table index to {path}: {e}")
+
+    logger.info(
+        f"Table index ready with {len(index.documents)} tables ({changes} changed) "
+        f"in {(time.perf_counter() - start) * 1000:.1f}ms"
+    )
+    return index
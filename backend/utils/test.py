@@ -0,0 +1,562 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, cast
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine, text
+
+from executor.catalog import Catalog, ExecutionLimits
+from rbac.check_permissions import ColumnScope
+from .auth_cache import AuthCache, hash_token
+from .cache import wait_for_query_result
+from .etag import compute_etag, etag_matches
+from .metrics import MetricsRegistry, metrics
+from . import parse_catalog
+from .parse_catalog import is_valid_role
+from .pagination import decode_cursor, encode_cursor
+from .rate_limit import RateLimiter, TokenBucket
+from .sse import SSEEventBuffer, SSEStream, encode_sse_event, parse_event_id
+from .nlq_cache import (
+    CachedNLQResult,
+    get_cached_nlq_result,
+    get_nlq_similarity,
+    get_scopes_hash,
+    invalidate_nlq_result,
+    normalize_nlq,
+)
+from .query_cost import (
+    check_plan_cost,
+    get_explain_engine,
+    normalize_sql,
+    summarize_plan,
+)
+from .rows_to_json import fetch_rows_within_limits
+from .table_index import TableIndex, load_table_index, tokenize
+
+
+def make_catalog(tables: dict[str, dict]) -> Catalog:
+    return Catalog(
+        name="test_db",
+        description="Test database",
+        provider="postgres",
+        schema=tables,
+    )
+
+
+def make_table(description: str, *columns: str) -> dict:
+    return {
+        "description": description,
+        "columns": [
+            {"name": column, "type": "TEXT", "constraints": ""} for column in columns
+        ],
+        "permissions": [],
+    }
+
+
+class TestTableIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = make_catalog(
+            {
+                "worker": make_table(
+                    "Stores information about the workers", "id", "full_name", "project_id"
+                ),
+                "project": make_table("Projects run on the platform", "id", "name"),
+                "payment": make_table(
+                    "Payouts made to the workers", "id", "worker_id", "amount"
+                ),
+                "language": make_table("Supported languages", "id", "code"),
+            }
+        )
+
+    def test_tokenize_splits_identifiers(self):
+        self.assertEqual(tokenize("workerId project_names"), ["worker", "id", "project", "name"])
+
+    def test_search_ranks_relevant_table_first(self):
+        index = TableIndex()
+        index.sync([self.catalog])
+
+        results = index.search("How much was paid to workers as payouts?", "test_db")
+        self.assertEqual(results[0].table, "payment")
+        self.assertNotIn("language", [result.table for result in results])
+
+    def test_search_respects_top_k(self):
+        index = TableIndex()
+        index.sync([self.catalog])
+
+        results = index.search("worker project", "test_db", top_k=1)
+        self.assertEqual(len(results), 1)
+
+    def test_search_unknown_catalog(self):
+        index = TableIndex()
+        index.sync([self.catalog])
+
+        self.assertEqual(index.search("worker", "unknown_db"), [])
+
+    def test_sync_only_reindexes_changed_tables(self):
+        index = TableIndex()
+        self.assertEqual(index.sync([self.catalog]), 4)
+        self.assertEqual(index.sync([self.catalog]), 0)
+
+        self.catalog.schema["language"] = make_table("Languages", "id", "iso_code")
+        del self.catalog.schema["project"]
+        self.assertEqual(index.sync([self.catalog]), 2)
+        self.assertNotIn("test_db.project", index.documents)
+
+    def test_persisted_index_is_reused(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "index.json")
+            load_table_index([self.catalog], path)
+            self.assertTrue(os.path.exists(path))
+
+            index = TableIndex.load(path)
+            self.assertEqual(index.sync([self.catalog]), 0)
+            self.assertEqual(
+                index.search("payouts", "test_db")[0].table,
+                "payment",
+            )
+
+
+class TestNLQCache(unittest.TestCase):
+
+    def test_normalize_nlq(self):
+        self.assertEqual(
+            normalize_nlq("  Active workers, per project   this WEEK? "),
+            "active workers per project this week",
+        )
+
+    def test_identical_questions_are_similar(self):
+        self.assertAlmostEqual(
+            get_nlq_similarity(
+                "active workers per project this week",
+                "Active Workers per Project this week!",
+            ),
+            1.0,
+        )
+
+    def test_different_questions_are_not_similar(self):
+        self.assertLess(
+            get_nlq_similarity(
+                "active workers per project this week",
+                "active workers per project this month",
+            ),
+            0.9,
+        )
+        self.assertEqual(get_nlq_similarity("payouts", "languages"), 0.0)
+
+    def test_scopes_hash(self):
+        project_a = {"worker": [ColumnScope(table="worker", column="project_id", value="a")]}
+        project_b = {"worker": [ColumnScope(table="worker", column="project_id", value="b")]}
+        self.assertEqual(get_scopes_hash(project_a), get_scopes_hash(dict(project_a)))
+        self.assertNotEqual(get_scopes_hash(project_a), get_scopes_hash(project_b))
+        self.assertNotEqual(get_scopes_hash(project_a), get_scopes_hash({}))
+
+    def test_similarity_hit_invalidates_matched_entry(self):
+        cached = CachedNLQResult(
+            nlq="active workers per project",
+            intent="",
+            catalog="test_db",
+            tables=["worker"],
+            sql="SELECT 1",
+            cached_at=time.time(),
+        )
+
+        with patch("utils.nlq_cache.redis_client") as redis, patch(
+            "utils.nlq_cache.NLQ_CACHE_SIMILARITY_THRESHOLD", 0.5
+        ):
+            redis.hget.return_value = None
+            redis.hvals.return_value = [json.dumps(cached.__dict__)]
+            entry = get_cached_nlq_result(
+                "active workers per project today", "ADMIN", {}, "v1"
+            )
+            assert entry is not None
+            asked_field = redis.hget.call_args.args[1]
+
+            invalidate_nlq_result(entry, "ADMIN", {}, "v1")
+            deleted_field = redis.hdel.call_args.args[1]
+            self.assertNotEqual(deleted_field, asked_field)
+
+            # The deleted field is the one the cached question is looked up with
+            get_cached_nlq_result(cached.nlq, "ADMIN", {}, "v1")
+            self.assertEqual(redis.hget.call_args.args[1], deleted_field)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrency_is_limited(self):
+        limiter = RateLimiter("test_concurrency", max_concurrency=2)
+        in_flight = 0
+        max_in_flight = 0
+
+        async def call():
+            nonlocal in_flight, max_in_flight
+            async with limiter.limit():
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        self.assertEqual(max_in_flight, 2)
+
+        queue_time = metrics.snapshot()["timings"]["test_concurrency.queue_seconds"]
+        self.assertEqual(queue_time["count"], 6)
+        self.assertGreater(queue_time["max"], 0)
+
+    async def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+        start = time.perf_counter()
+        for _ in range(4):
+            await bucket.acquire()
+        self.assertGreaterEqual(time.perf_counter() - start, 0.025)
+
+    async def test_fractional_rate(self):
+        limiter = RateLimiter("test_fractional_rate", max_concurrency=4, rate=0.5)
+        self.assertEqual(limiter.bucket and limiter.bucket.capacity, 1.0)
+
+        async def call():
+            async with limiter.limit():
+                pass
+
+        await asyncio.wait_for(call(), timeout=1)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_snapshot(self):
+        registry = MetricsRegistry()
+        registry.increment("requests")
+        registry.increment("requests")
+        registry.set_gauge("queued", 3)
+        for value in range(1, 101):
+            registry.observe("latency", value)
+
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["counters"]["requests"], 2)
+        self.assertEqual(snapshot["gauges"]["queued"], 3)
+        self.assertEqual(snapshot["timings"]["latency"]["p50"], 51)
+        self.assertEqual(snapshot["timings"]["latency"]["max"], 100)
+
+
+class TestPagination(unittest.TestCase):
+
+    def test_cursor_round_trip(self):
+        last_active_at = datetime(2026, 10, 19, 9, 30, 15, 123456)
+        cursor = encode_cursor(last_active_at, "a1b2c3")
+        self.assertEqual(
+            decode_cursor(cursor), [last_active_at.isoformat(), "a1b2c3"]
+        )
+
+    def test_malformed_cursor(self):
+        self.assertIsNone(decode_cursor("not a cursor"))
+        self.assertIsNone(decode_cursor(encode_cursor()[:-2] + "!!"))
+
+
+class TestAuthCache(unittest.TestCase):
+
+    def test_entries_are_keyed_by_token_hash(self):
+        cache = AuthCache[str](max_entries=10, ttl=60)
+        cache.set("token", "user")
+        self.assertEqual(cache.get("token"), "user")
+        self.assertIsNone(cache.get("other-token"))
+        self.assertEqual(list(cache._entries), [hash_token("token")])
+
+    def test_entries_expire_with_the_token(self):
+        cache = AuthCache[str](max_entries=10, ttl=60)
+        cache.set("expired", "user", token_expires_at=time.time() - 1)
+        cache.set("valid", "user", token_expires_at=time.time() + 3600)
+        self.assertIsNone(cache.get("expired"))
+        self.assertEqual(cache.get("valid"), "user")
+
+        with patch("utils.auth_cache.time.time", return_value=time.time() + 61):
+            self.assertIsNone(cache.get("valid"))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = AuthCache[str](max_entries=2, ttl=60)
+        cache.set("a", "user-a")
+        cache.set("b", "user-b")
+        cache.get("a")
+        cache.set("c", "user-c")
+        self.assertEqual(cache.get("a"), "user-a")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "user-c")
+
+    def test_known_users_are_upserted_once_off_the_loop(self):
+        from dependencies import auth
+
+        loop_thread = threading.get_ident()
+        upsert_threads = []
+
+        def upsert_user(user_id, name, email):
+            upsert_threads.append(threading.get_ident())
+            return auth.User(user_id=user_id, name=name, email=email)
+
+        known_users = AuthCache[bool](max_entries=10, ttl=60)
+        with patch.object(auth, "known_users_cache", known_users), patch.object(
+            auth, "upsert_user", side_effect=upsert_user
+        ):
+            asyncio.run(auth.get_user("user", "name", None))
+            user = asyncio.run(auth.get_user("user", "name", None))
+
+        self.assertEqual(user.user_id, "user")
+        self.assertEqual(len(upsert_threads), 1)
+        self.assertNotEqual(upsert_threads[0], loop_thread)
+
+    def test_role_validation(self):
+        self.assertTrue(is_valid_role("ADMIN"))
+        self.assertFalse(is_valid_role("ROOT"))
+
+
+class TestCatalogReload(unittest.TestCase):
+
+    def test_each_version_is_reloaded_once(self):
+        name = parse_catalog.parsed_catalogs.catalogs[0].name
+        parse = parse_catalog.parse_catalog_configuration
+        with patch.object(
+            parse_catalog, "parse_catalog_configuration", side_effect=parse
+        ) as reload, patch.object(parse_catalog, "_tried_versions", set()):
+            for _ in range(3):
+                parse_catalog.get_catalog(name, "other-version")
+            parse_catalog.get_catalog(name, parse_catalog.parsed_catalogs.version)
+
+        self.assertEqual(reload.call_count, 1)
+
+
+class TestQueryWait(unittest.IsolatedAsyncioTestCase):
+
+    async def test_waits_run_in_their_own_pool(self):
+        def get_result(*_):
+            return threading.current_thread().name
+
+        with patch("utils.cache.get_or_execute_query_result", get_result):
+            thread_name = await wait_for_query_result(
+                "SELECT 1", make_catalog({}), lambda *_: cast(Any, None)
+            )
+
+        self.assertTrue(str(thread_name).startswith("query-wait"))
+
+
+class TestETag(unittest.TestCase):
+
+    def test_etag_changes_with_content(self):
+        page = [{"id": 2, "name": "Workers"}, {"id": 1, "name": "Payments"}]
+        self.assertEqual(compute_etag(page, None), compute_etag(list(page), None))
+        self.assertNotEqual(compute_etag(page, None), compute_etag(page[:1], None))
+        self.assertNotEqual(compute_etag(page, None), compute_etag(page, "cursor"))
+
+    def test_if_none_match(self):
+        etag = compute_etag(["query"])
+        self.assertTrue(etag_matches(etag, etag))
+        self.assertTrue(etag_matches(f'"other", {etag.removeprefix("W/")}', etag))
+        self.assertTrue(etag_matches("*", etag))
+        self.assertFalse(etag_matches('W/"other"', etag))
+        self.assertFalse(etag_matches(None, etag))
+
+
+@dataclass
+class SampleEvent:
+    kind: str
+    status: str
+
+
+class TestSSE(unittest.IsolatedAsyncioTestCase):
+
+    def test_encode_event(self):
+        self.assertEqual(
+            encode_sse_event("a\nb", event="UPDATE", id="s:1"),
+            "id: s:1\nevent: UPDATE\ndata: a\ndata: b\n\n",
+        )
+
+    def test_parse_event_id(self):
+        self.assertEqual(parse_event_id("abc:12"), ("abc", 12))
+        self.assertIsNone(parse_event_id("abc"))
+        self.assertIsNone(parse_event_id(":1"))
+
+    async def test_stream_writes_events_in_order_with_keep_alives(self):
+        async def events():
+            yield SampleEvent(kind="UPDATE", status="first")
+            await asyncio.sleep(0.05)
+            yield SampleEvent(kind="UPDATE", status="second")
+
+        with patch("utils.sse.SSE_KEEPALIVE_INTERVAL", 0.01):
+            stream = SSEStream(events(), owner="user")
+            frames = [frame async for frame in stream.write()]
+
+        events_frames = [frame for frame in frames if frame.startswith("id:")]
+        self.assertEqual(len(events_frames), 2)
+        self.assertIn(f"id: {stream.stream_id}:0\n", events_frames[0])
+        self.assertIn('"status": "second"', events_frames[1])
+        self.assertIn(": keep-alive\n\n", frames)
+
+    async def test_slow_client_applies_backpressure(self):
+        produced = 0
+
+        async def events():
+            nonlocal produced
+            for i in range(100):
+                produced += 1
+                yield SampleEvent(kind="UPDATE", status=str(i))
+
+        with patch("utils.sse.SSE_QUEUE_SIZE", 4):
+            stream = SSEStream(events(), owner="user")
+            writer = stream.write()
+            await anext(writer)
+            await asyncio.sleep(0.01)
+            self.assertLess(produced, 10)
+            await writer.aclose()
+
+    async def test_failure_ends_with_error_event(self):
+        async def events():
+            yield SampleEvent(kind="UPDATE", status="first")
+            raise RuntimeError("agent failed")
+
+        stream = SSEStream(events(), owner="user")
+        frames = [frame async for frame in stream.write()]
+
+        self.assertEqual(len(frames), 2)
+        self.assertIn("event: ERROR\n", frames[1])
+
+    async def test_token_events_are_buffered_in_batches(self):
+        batches = []
+
+        async def events():
+            for index in range(10):
+                yield SampleEvent(kind="TOKEN", status=str(index))
+            yield SampleEvent(kind="UPDATE", status="done")
+
+        with patch.multiple(
+            "utils.sse.SSEEventBuffer",
+            open=lambda *_: None,
+            close=lambda *_: None,
+            append=lambda _, events: batches.append([kind for kind, _ in events]),
+        ), patch("utils.sse.SSE_BUFFER_BATCH_SIZE", 4):
+            stream = SSEStream(events(), owner="user")
+            frames = [frame async for frame in stream.write()]
+
+        self.assertEqual(len(frames), 11)
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 3])
+        self.assertEqual(batches[-1][-1], "UPDATE")
+
+    def test_stream_of_dead_producer_is_done(self):
+        buffer = SSEEventBuffer("stream")
+        with patch("utils.sse.redis_client") as redis:
+            redis.hgetall.return_value = {"done": "0", "heartbeat_at": str(time.time())}
+            self.assertFalse(buffer.is_done())
+
+            # Crashed before closing the stream
+            redis.hgetall.return_value = {"done": "0", "heartbeat_at": "0"}
+            self.assertTrue(buffer.is_done())
+
+            # Meta expired, and reading doesn't recreate it
+            redis.hgetall.return_value = {}
+            self.assertTrue(buffer.is_done())
+            buffer.mark_read()
+            redis.hset.assert_not_called()
+
+
+class TestExecutionLimits(unittest.TestCase):
+
+    def test_role_limits_override_catalog_limits(self):
+        catalog = make_catalog({})
+        catalog.limits = {
+            "statement_timeout": 60,
+            "max_rows": 100,
+            "roles": {"ADMIN": {"statement_timeout": 600, "max_rows": None}},
+        }
+
+        limits = catalog.get_execution_limits("COORDINATOR")
+        self.assertEqual((limits.statement_timeout, limits.max_rows), (60, 100))
+
+        limits = catalog.get_execution_limits("ADMIN")
+        self.assertEqual((limits.statement_timeout, limits.max_rows), (600, None))
+
+    def test_fetch_rows_within_limits(self):
+        engine = create_engine("sqlite://")
+        query = text(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 50)"
+            " SELECT i, 'row' AS label FROM n"
+        )
+
+        with engine.connect() as connection:
+            rows, truncated = fetch_rows_within_limits(connection.execute(query))
+            self.assertEqual((len(rows), truncated), (50, False))
+
+            rows, truncated = fetch_rows_within_limits(
+                connection.execute(query), max_rows=10
+            )
+            self.assertEqual((len(rows), truncated), (10, True))
+
+            rows, truncated = fetch_rows_within_limits(
+                connection.execute(query), max_result_bytes=50
+            )
+            self.assertTrue(truncated)
+            self.assertLess(len(rows), 10)
+
+
+class TestQueryCost(unittest.TestCase):
+
+    PLAN = {
+        "Node Type": "Hash Join",
+        "Total Cost": 25000.5,
+        "Plan Rows": 1000,
+        "Plans": [
+            {
+                "Node Type": "Seq Scan",
+                "Relation Name": "worker",
+                "Plan Rows": 500000,
+            },
+            {
+                "Node Type": "Seq Scan",
+                "Relation Name": "project",
+                "Plan Rows": 200,
+                "Filter": "(project.status = 'active')",
+            },
+        ],
+    }
+
+    def test_summarize_plan(self):
+        summary = summarize_plan(self.PLAN)
+        self.assertEqual(summary.total_cost, 25000.5)
+        self.assertEqual(summary.plan_rows, 1000)
+        self.assertEqual(summary.unfiltered_scans, {"worker": 500000})
+
+    def test_check_plan_cost(self):
+        summary = summarize_plan(self.PLAN)
+        self.assertIsNone(check_plan_cost(summary, ExecutionLimits()))
+        self.assertIsNone(check_plan_cost(summary, ExecutionLimits(max_plan_cost=1e5)))
+
+        result = check_plan_cost(summary, ExecutionLimits(max_plan_cost=1000))
+        self.assertIsNotNone(result)
+
+        result = check_plan_cost(
+            summary, ExecutionLimits(max_unfiltered_scan_rows=100000)
+        )
+        assert result is not None
+        self.assertIn("worker", result.reason)
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("select id\n  from   worker;"),
+            normalize_sql("SELECT id FROM worker"),
+        )
+
+    def test_explain_engine_is_reused(self):
+        catalog = make_catalog({})
+        catalog.name = "explain_db"
+        catalog.connection_params = {"host": "localhost", "dbname": "a"}
+
+        with patch("utils.query_cost.get_engine", side_effect=lambda _: MagicMock()):
+            engine = get_explain_engine(catalog)
+            self.assertIs(get_explain_engine(catalog), engine)
+
+            # A reloaded catalog pointing to another database gets a new engine
+            catalog.connection_params = {"host": "localhost", "dbname": "b"}
+            self.assertIsNot(get_explain_engine(catalog), engine)
+            cast(MagicMock, engine).dispose.assert_called_once()
@@ -50,11 +50,20 @@ const AddQuery = ({
       );
 
       if (response.status == 200) {
-        toast({
-          title: "Query added successfully",
-          description: "The Query has been added and shared with the specified users",
-          status: "success",
-        });
+        const { emails_not_found: emailsNotFound = [] } = await response.json();
+        if (emailsNotFound.length > 0) {
+          toast({
+            title: "Query added",
+            description: `The query was not shared with: ${emailsNotFound.join(", ")}. No users found.`,
+            status: "warning",
+          });
+        } else {
+          toast({
+            title: "Query added successfully",
+            description: "The Query has been added and shared with the specified users",
+            status: "success",
+          });
+        }
         setAddedParamsList([]);
       } else {
         const errorData = await response.json();
@@ -35,6 +35,8 @@ type NavBarProps = {
   setNavOpen: (arg: (prev: boolean) => boolean) => void;
   history: HistoryItem[];
   getAllHistory: (url: string) => void;
+  historyCursor: string | null;
+  getMoreHistory: () => void;
   savedQueries: SavedQuery[];
   getAllSavedQueries: (url: string) => void;
   setConversationStarted: (arg: boolean) => void;
@@ -57,6 +59,8 @@ const NavBar = ({
   setNavOpen,
   history,
   getAllHistory,
+  historyCursor,
+  getMoreHistory,
   savedQueries,
   getAllSavedQueries,
   setConversationStarted,
@@ -196,6 +200,18 @@ const NavBar = ({
                 No chat history available.
               </Text>
             )}
+            {historyCursor && (
+              <Text
+                pl={2}
+                py={3}
+                fontSize="sm"
+                color="gray.400"
+                sx={chatHistoryStyles}
+                onClick={getMoreHistory}
+              >
+                Load more
+              </Text>
+            )}
           </AccordionPanel>
         </AccordionItem>
 
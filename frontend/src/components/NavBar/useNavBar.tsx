@@ -32,6 +32,8 @@ export type ExecutionResponse = {
 const useNavBar = (name?: string, description?: string) => {
   const [navOpen, setNavOpen] = useState(true);
   const [history, setHistory] = useState<HistoryItem[]>([]);
+  // Cursor of the next page of the history, null on the last page
+  const [historyCursor, setHistoryCursor] = useState<string | null>(null);
   const [savedQueries, setSavedQueries] = useState<SavedQueryDataInterface[]>(
     [],
   );
@@ -45,17 +47,34 @@ const useNavBar = (name?: string, description?: string) => {
     Record<string, unknown>[]
   >([]);
 
+  async function fetchHistoryPage(url: string) {
+    const response = await fetch(url, {
+      method: "GET",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      credentials: "include",
+    });
+    const data: HistoryItem[] = await response.json();
+    setHistoryCursor(response.headers.get("X-Next-Cursor"));
+    return data;
+  }
+
   async function getAllHistory(url: string) {
     try {
-      const response = await fetch(url, {
-        method: "GET",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        credentials: "include",
-      });
-      const data = await response.json();
-      setHistory(data);
+      setHistory(await fetchHistoryPage(url));
+    } catch (error) {
+      console.error(error);
+    }
+  }
+
+  async function getMoreHistory() {
+    if (!historyCursor) return;
+    try {
+      const data = await fetchHistoryPage(
+        `${BACKEND_URL}/fetch_history?cursor=${encodeURIComponent(historyCursor)}`,
+      );
+      setHistory((prev) => [...prev, ...data]);
     } catch (error) {
       console.error(error);
     }
@@ -142,6 +161,8 @@ const useNavBar = (name?: string, description?: string) => {
     history,
     setHistory,
     getAllHistory,
+    historyCursor,
+    getMoreHistory,
     savedQueries,
     getAllSavedQueries,
     saveQuery,
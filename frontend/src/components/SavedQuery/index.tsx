@@ -115,6 +115,11 @@ const SavedQuery = ({
       console.error("Error executing query:", execution_log.logs);
       toastExecutionFailure();
       setIsFetching(false);
+      return;
+    }
+
+    if (execution_log.status === "CANCELLED") {
+      setIsFetching(false);
     }
   }, [executionResponse]);
 
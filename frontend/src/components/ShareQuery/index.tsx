@@ -59,11 +59,20 @@ const ShareQuery = ({
       );
 
       if (response.ok) {
-        toast({
-          title: "Query shared successfully",
-          description: `The query has been shared with the specified users.`,
-          status: "success",
-        });
+        const { emails_not_found: emailsNotFound = [] } = await response.json();
+        if (emailsNotFound.length > 0) {
+          toast({
+            title: "Query shared partially",
+            description: `No users found for: ${emailsNotFound.join(", ")}`,
+            status: "warning",
+          });
+        } else {
+          toast({
+            title: "Query shared successfully",
+            description: `The query has been shared with the specified users.`,
+            status: "success",
+          });
+        }
         setShareInputValue("");
       } else {
         const errorData = await response.json();
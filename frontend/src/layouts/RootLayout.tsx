@@ -23,6 +23,8 @@ const RootLayout = () => {
     history,
     setHistory,
     getAllHistory,
+    historyCursor,
+    getMoreHistory,
     savedQueries,
     getAllSavedQueries,
     navOpen,
@@ -51,6 +53,8 @@ const RootLayout = () => {
               setNavOpen={setNavOpen}
               history={history}
               getAllHistory={getAllHistory}
+              historyCursor={historyCursor}
+              getMoreHistory={getMoreHistory}
               savedQueries={savedQueries}
               getAllSavedQueries={getAllSavedQueries}
               setConversationStarted={setConversationStarted}
@@ -17,6 +17,10 @@ import BotGreeting from "../../components/BotGreeting";
 import CFImage from "../../components/CloudflareImage";
 import { BACKEND_URL } from "../../config";
 import MemoizedMessage from "../../components/MemoizedMessage";
+import { parseSSEFrames } from "./sse";
+
+// Number of times an interrupted response is resumed before giving up
+const MAX_RESUME_ATTEMPTS = 3;
 
 export type Message = {
   id: number;
@@ -65,6 +69,11 @@ export type NLQUpdateEvent = (
       kind: "UPDATE";
       status: string;
     }
+  | {
+      kind: "TOKEN";
+      stage: "INTENT" | "ANSWER";
+      delta: string;
+    }
   | {
       kind: "RESPONSE";
       type: "TEXT" | "ERROR";
@@ -72,10 +81,21 @@ export type NLQUpdateEvent = (
     }
   | {
       kind: "RESPONSE";
-      type: "TABLE";
-      payload: Record<string, string>[];
+      type: "TABLE_START";
+      columns: string[];
+      row_count: number;
       query: string;
     }
+  | {
+      kind: "RESPONSE";
+      type: "TABLE_ROWS";
+      rows: Record<string, string>[];
+    }
+  | {
+      kind: "RESPONSE";
+      type: "TABLE_END";
+      row_count: number;
+    }
 ) & {
   session_id: string;
   sql_query_id?: string;
@@ -146,63 +166,102 @@ export function ChatBot({
 
       try {
         let updatedSessionId = id;
-        const reader = await postChat(`${BACKEND_URL}/chat`);
-        const decoder = new TextDecoder();
-        let done = false;
+        // Partial LLM output streamed for each stage
+        const streamedTokens = { INTENT: "", ANSWER: "" };
+        // Rows of the table result received so far
+        let tableRows: Record<string, string>[] = [];
+        let lastEventId: string | undefined;
+        let completed = false;
 
-        while (!done) {
-          if (!reader) throw new Error("Reader is undefined");
-          const { value, done: readerDone } = await reader.read();
-          done = readerDone;
+        const handleEvent = (parsedChunk: NLQUpdateEvent) => {
+          updatedSessionId = parsedChunk.session_id ?? updatedSessionId;
+          if (parsedChunk.kind === "UPDATE") {
+            botMessage.message = parsedChunk.status;
+            botMessage.type = "text";
+            botMessage.kind = "UPDATE";
+          } else if (parsedChunk.kind === "TOKEN") {
+            streamedTokens[parsedChunk.stage] += parsedChunk.delta;
+            botMessage.message = streamedTokens[parsedChunk.stage];
+            botMessage.type = "text";
+            botMessage.kind = parsedChunk.stage === "ANSWER" ? "TEXT" : "UPDATE";
+          } else if (parsedChunk.kind === "RESPONSE") {
+            if (parsedChunk.type === "TEXT") {
+              botMessage.message = parsedChunk.payload;
+              botMessage.type = "text";
+              botMessage.kind = "TEXT";
+              completed = true;
+            } else if (parsedChunk.type === "TABLE_START") {
+              tableRows = [];
+              botMessage.query = parsedChunk.query;
+              botMessage.sql_query_id = parsedChunk.sql_query_id;
+              botMessage.turn_id = parsedChunk.turn_id;
+            } else if (parsedChunk.type === "TABLE_ROWS") {
+              tableRows = [...tableRows, ...parsedChunk.rows];
+              botMessage.message = tableRows;
+              botMessage.type = "table";
+              botMessage.kind = "TABLE";
+            } else if (parsedChunk.type === "TABLE_END") {
+              if (parsedChunk.row_count === 0) {
+                botMessage.message = "No data found";
+                botMessage.type = "error";
+                botMessage.kind = "TEXT";
+              }
+              completed = true;
+            } else if (parsedChunk.type === "ERROR") {
+              botMessage.message = parsedChunk.payload;
+              botMessage.type = "error";
+              completed = true;
+            }
+          }
+          setMessages((prevMessages) => {
+            if (prevMessages[prevMessages.length - 1].role === "bot") {
+              const updatedMessages = [...prevMessages];
+              updatedMessages[updatedMessages.length - 1] = {
+                ...botMessage,
+              };
+              return [...updatedMessages];
+            }
+            return [...prevMessages, botMessage];
+          });
+          setIsFetching(false);
+        };
+
+        // If the connection drops before the response is complete, resume the
+        // stream from the last received event
+        for (let attempt = 0; !completed; attempt++) {
+          try {
+            const reader = await postChat(`${BACKEND_URL}/chat`, lastEventId);
+            if (!reader) throw new Error("Reader is undefined");
+
+            const decoder = new TextDecoder();
+            let buffer = "";
+            let done = false;
 
-          if (value) {
-            const chunk = decoder.decode(value, { stream: true });
-            try {
-              const parsedChunk = JSON.parse(chunk) as NLQUpdateEvent;
-              updatedSessionId = parsedChunk.session_id;
-              if (parsedChunk.kind === "UPDATE") {
-                botMessage.message = parsedChunk.status;
-                botMessage.type = "text";
-                botMessage.kind = "UPDATE";
-              } else if (parsedChunk.kind === "RESPONSE") {
-                if (parsedChunk.type === "TEXT") {
-                  botMessage.message = parsedChunk.payload;
-                  botMessage.type = "text";
-                  botMessage.kind = "TEXT";
-                } else if (parsedChunk.type === "TABLE") {
-                  if (parsedChunk.payload.length === 0) {
-                    botMessage.message = "No data found";
-                    botMessage.type = "error";
-                    botMessage.kind = "TEXT";
-                  } else {
-                    botMessage.message = parsedChunk.payload;
-                    botMessage.query = parsedChunk.query;
-                    botMessage.type = "table";
-                    botMessage.kind = "TABLE";
-                    botMessage.sql_query_id = parsedChunk.sql_query_id;
-                    botMessage.turn_id = parsedChunk.turn_id;
-                  }
-                } else if (parsedChunk.type === "ERROR") {
-                  botMessage.message = parsedChunk.payload;
-                  botMessage.type = "error";
+            while (!done) {
+              const { value, done: readerDone } = await reader.read();
+              done = readerDone;
+              if (!value) continue;
+
+              buffer += decoder.decode(value, { stream: true });
+              const { frames, rest } = parseSSEFrames(buffer);
+              buffer = rest;
+
+              for (const frame of frames) {
+                lastEventId = frame.id ?? lastEventId;
+                try {
+                  handleEvent(JSON.parse(frame.data) as NLQUpdateEvent);
+                } catch (error) {
+                  console.error("Failed to parse event", error);
+                  setIsFetching(false);
                 }
               }
-              setMessages((prevMessages) => {
-                if (prevMessages[prevMessages.length - 1].role === "bot") {
-                  const updatedMessages = [...prevMessages];
-                  updatedMessages[updatedMessages.length - 1] = {
-                    ...botMessage,
-                  };
-                  return [...updatedMessages];
-                }
-                return [...prevMessages, botMessage];
-              });
-              setIsFetching(false);
-            } catch (error) {
-              console.error("Failed to parse JSON chunk", error);
-              setIsFetching(false);
             }
+          } catch (error) {
+            if (!lastEventId || attempt >= MAX_RESUME_ATTEMPTS) throw error;
+            console.warn("Connection lost, resuming the response", error);
           }
+
+          if (!lastEventId || attempt >= MAX_RESUME_ATTEMPTS) break;
         }
         setId(updatedSessionId);
       } catch (error) {
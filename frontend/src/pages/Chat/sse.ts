@@ -0,0 +1,43 @@
+export type SSEFrame = {
+  id?: string;
+  event?: string;
+  data: string;
+};
+
+/**
+ * Split the text received from an event stream into complete frames. The
+ * incomplete remainder is returned to be prepended to the next chunk.
+ */
+export function parseSSEFrames(buffer: string): {
+  frames: SSEFrame[];
+  rest: string;
+} {
+  const parts = buffer.split("\n\n");
+  const rest = parts.pop() ?? "";
+  const frames: SSEFrame[] = [];
+
+  for (const part of parts) {
+    const frame: SSEFrame = { data: "" };
+    const data: string[] = [];
+
+    for (const line of part.split("\n")) {
+      // Comments, e.g. keep-alives
+      if (line.startsWith(":")) continue;
+
+      const separator = line.indexOf(":");
+      const field = separator === -1 ? line : line.slice(0, separator);
+      let value = separator === -1 ? "" : line.slice(separator + 1);
+      if (value.startsWith(" ")) value = value.slice(1);
+
+      if (field === "id") frame.id = value;
+      else if (field === "event") frame.event = value;
+      else if (field === "data") data.push(value);
+    }
+
+    if (data.length === 0) continue;
+    frame.data = data.join("\n");
+    frames.push(frame);
+  }
+
+  return { frames, rest };
+}
@@ -1,9 +1,11 @@
 function useChat({ input, id }: { input: string; id: string }) {
-  async function postChat(url: string) {
+  async function postChat(url: string, lastEventId?: string) {
     const response = await fetch(url, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        // Resume an interrupted stream instead of running the query again
+        ...(lastEventId ? { "Last-Event-ID": lastEventId } : {}),
       },
       credentials: "include",
       body: JSON.stringify({